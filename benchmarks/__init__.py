@@ -0,0 +1,2 @@
+# Benchmarks for the proxy hot paths. Run from the repo root, e.g.
+#   python -m benchmarks.bench_detectors
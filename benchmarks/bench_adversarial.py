@@ -0,0 +1,116 @@
+"""
+Adversarial / fuzz inputs for the detectors: default vs. hardened patterns.
+
+The default patterns are only run up to --default-max chars (they are
+quadratic on several of these inputs); the hardened ones run up to --max and
+should show a flat ms-per-MB column, i.e. linear scan time.
+
+    python -m benchmarks.bench_adversarial [--max 10000000] [--fuzz 200]
+"""
+
+import argparse
+import random
+import time
+
+from proxy import detectors
+from proxy.detectors import detect_all, set_hardened
+from proxy.policy import decide
+
+from .corpus import CORPORA
+
+
+def _fill(unit: str, n: int, tail: str = "") -> str:
+    return (unit * (n // len(unit) + 1))[: max(0, n - len(tail))] + tail
+
+
+# Each targets a specific backtracking path in the default patterns
+ADVERSARIAL = {
+    "alnum_run": lambda n: _fill("a", n, " x@y.com"),                 # EMAIL_RE local part, API_KEY_RE
+    "dash_run_dots": lambda n: _fill("a-", n // 2) + "." + _fill("b-", n // 2, "."),   # JWT_RE lookaheads
+    "digit_parts": lambda n: _fill("1111111111.", n),                  # JWT_RE letter lookahead
+    "title_case": lambda n: _fill("Aaaa ", n, "Co"),                   # COMPANY_RE name words
+    "local_run_at": lambda n: _fill("a", n, "@x"),                     # EMAIL_RE without a TLD
+    "dotted_domain": lambda n: "q@" + _fill("a.", n - 2),              # EMAIL_RE domain
+    "base64ish": lambda n: _fill("QUJD+/ZGVm-_", n),                   # mixed word / non-word
+}
+
+FUZZ_ALPHABET = "aZ09._-+@:/ \n"
+
+
+def _time(text: str) -> float:
+    t0 = time.perf_counter()
+    detect_all(text)
+    return time.perf_counter() - t0
+
+
+def _sizes(limit: int) -> list[int]:
+    out, n = [], 10_000
+    while n <= limit:
+        out.append(n)
+        n *= 10
+    return out
+
+
+def run_adversarial(max_size: int, default_max: int) -> None:
+    print(f"{'input':<14} {'chars':>10} {'default ms':>11} {'hardened ms':>12} {'hardened ms/MB':>15}")
+    for name, gen in ADVERSARIAL.items():
+        for n in _sizes(max_size):
+            text = gen(n)
+            dflt = "-"
+            if n <= default_max:
+                set_hardened(False)
+                dflt = f"{_time(text) * 1000:.1f}"
+            set_hardened(True)
+            hard = _time(text)
+            print(f"{name:<14} {n:>10} {dflt:>11} {hard * 1000:>12.1f} {hard * 1000 / (n / 1e6):>15.1f}")
+    set_hardened(False)
+
+
+def run_fuzz(rounds: int, seed: int = 7) -> None:
+    # random short-alphabet strings: hardened must stay fast, and agree with
+    # the defaults on ordinary corpora
+    rng = random.Random(seed)
+    set_hardened(True)
+    worst = 0.0
+    for _ in range(rounds):
+        text = "".join(rng.choices(FUZZ_ALPHABET, k=rng.randint(1_000, 100_000)))
+        worst = max(worst, _time(text) / len(text) * 1e6)
+    print(f"fuzz: {rounds} inputs, worst {worst * 1000:.1f} ms/MB (hardened)")
+
+    for name, gen in CORPORA.items():
+        text = gen(200_000)
+        set_hardened(True)
+        hard = detect_all(text)
+        set_hardened(False)
+        same = hard == detect_all(text)
+        print(f"corpus {name:<10} hardened == default: {same}")
+
+
+def run_budget(size: int) -> None:
+    # a scan budget turns a slow scan into a block (block/strict) or warn (warn)
+    text = ADVERSARIAL["digit_parts"](size)
+    set_hardened(True)
+    for mode in ("warn", "block"):
+        t0 = time.perf_counter()
+        d = decide(mode, "text", "", text, budget_s=0.05)
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"budget 50 ms, mode={mode:<5} -> {d['action']:<6} in {ms:.1f} ms  {d.get('notify', {}).get('message', '')}")
+    set_hardened(False)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--max", type=int, default=10_000_000)
+    ap.add_argument("--default-max", type=int, default=10_000)
+    ap.add_argument("--fuzz", type=int, default=200)
+    args = ap.parse_args()
+
+    if not detectors.HARDENED_PATTERNS:
+        raise SystemExit("hardened patterns need Python 3.11+")
+    run_adversarial(args.max, args.default_max)
+    run_fuzz(args.fuzz)
+    run_budget(min(args.max, 10_000_000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Bursts of /inspect calls: one request per payload vs. one /inspect/batch.
+
+Each burst is `--burst` payloads (mostly small pings and short prompts, like
+page load / upload flows). "individual" fires them as concurrent /inspect
+requests, "batch" sends them as one array. Reports items/s and burst
+latency per decide backend, and checks the batch answers match the
+individual ones.
+
+    python -m benchmarks.bench_batch [--burst 8] [--bursts 200] [--backends inline,thread]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from .corpus import pii_dense
+from .harness import percentile, proxy_server
+
+URL = "https://chatgpt.com/backend-api/conversation"
+
+
+def burst(i: int, n: int) -> list[dict]:
+    out = []
+    for k in range(n):
+        if k % 4 == 0:
+            text = pii_dense(2000, seed=i * n + k)
+        else:
+            text = f"ping {i}-{k} from tab, mail me at user{k}@example.org"
+        body = json.dumps({"messages": [{"content": {"parts": [text]}}], "n": i})
+        out.append({"url": URL + ("/prepare" if k % 4 == 3 else ""), "bodyKind": "json", "mode": "warn",
+                    "body": body, "sendId": f"{i}-{k}", "tabId": 1})
+    return out
+
+
+async def run(base: str, bursts: list[list[dict]], batch: bool) -> tuple[float, list[float], list]:
+    import httpx
+
+    lat, answers = [], []
+    limits = httpx.Limits(max_connections=64, max_keepalive_connections=64)
+    async with httpx.AsyncClient(timeout=60, limits=limits) as c:
+        t0 = time.perf_counter()
+        for items in bursts:
+            t = time.perf_counter()
+            if batch:
+                r = await c.post(base + "/inspect/batch", json=items)
+                answers.extend(x["decision"] for x in r.json())
+            else:
+                rs = await asyncio.gather(*(c.post(base + "/inspect", json=p) for p in items))
+                answers.extend(r.json() for r in rs)
+            lat.append(time.perf_counter() - t)
+        wall = time.perf_counter() - t0
+    return wall, lat, answers
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--burst", type=int, default=8, help="payloads per burst")
+    ap.add_argument("--bursts", type=int, default=200)
+    ap.add_argument("--backends", default="inline,thread")
+    args = ap.parse_args()
+
+    bursts = [burst(i, args.burst) for i in range(args.bursts)]
+    items = args.burst * args.bursts
+    print(f"{args.bursts} bursts of {args.burst} payloads")
+    print(f"{'backend':<8} {'mode':<11} {'items/s':>8} {'burst p50 ms':>13} {'burst p99 ms':>13} {'same':>5}")
+    for backend in args.backends.split(","):
+        # decision cache off: every payload gets decided
+        with proxy_server({"PP_DECIDE_BACKEND": backend, "PP_DECISION_CACHE": "0", "PP_LOG_MODE": "async"}) as base:
+            asyncio.run(run(base, bursts[:5], False))     # warm up
+            wall_i, lat_i, ans_i = asyncio.run(run(base, bursts, False))
+            wall_b, lat_b, ans_b = asyncio.run(run(base, bursts, True))
+        for name, wall, lat in (("individual", wall_i, lat_i), ("batch", wall_b, lat_b)):
+            same = "" if name == "individual" else ("yes" if ans_b == ans_i else "NO")
+            print(f"{backend:<8} {name:<11} {items / wall:>8.0f} {percentile(lat, 50) * 1000:>13.2f} "
+                  f"{percentile(lat, 99) * 1000:>13.2f} {same:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+policy._json_declares_or_embeds_binary on image-laden multimodal payloads,
+against the previous recursive classifier (kept verbatim below).
+
+Payloads: chat bodies with data-URL images and raw base64 attachments of a
+few MB, base64 text that isn't an image, attachment records, and JSON nested
+deeper than the recursion limit. Also checks on random trees that both
+classifiers agree (the deep payloads only work with the new one).
+
+    python -m benchmarks.bench_binary [--mb 4] [--check 3000]
+"""
+
+import argparse
+import base64
+import json
+import random
+import sys
+import time
+
+from proxy import policy
+from proxy.policy import _json_declares_or_embeds_binary as classify
+
+from .corpus import MAGIC_HEADERS
+
+_DATA_URL_RE, _SUSPECT_KEYS, _BINARY_EXTS = policy._DATA_URL_RE, policy._SUSPECT_KEYS, policy._BINARY_EXTS
+_BASE64_SNIFFERS, _mime_is_binary, _has_binary_magic = policy._BASE64_SNIFFERS, policy._mime_is_binary, policy._has_binary_magic
+
+
+# ---- previous implementation ----
+
+def _legacy_is_probably_base64(s):
+    import re
+    if len(s) < 128:
+        return False
+    if not re.fullmatch(r"[A-Za-z0-9+/=\s]+", s):
+        return False
+    if s.count("=") > 2:
+        return False
+    return True
+
+
+def _legacy_b64_to_bytes(s):
+    import binascii
+    try:
+        return binascii.a2b_base64(s)
+    except Exception:
+        return None
+
+
+def legacy(obj):
+    if isinstance(obj, str):
+        m = _DATA_URL_RE.match(obj.strip())
+        if m:
+            b = _legacy_b64_to_bytes(m.group(2))
+            return bool(b and _has_binary_magic(b))
+        if _legacy_is_probably_base64(obj):
+            for _, pat in _BASE64_SNIFFERS:
+                if pat.search(obj):
+                    return True
+            b = _legacy_b64_to_bytes(obj)
+            return bool(b and _has_binary_magic(b))
+        return False
+    if isinstance(obj, list):
+        return any(legacy(v) for v in obj)
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            kl = k.lower()
+            if legacy(v):
+                return True
+            if kl not in _SUSPECT_KEYS:
+                continue
+            if kl in {"attachments", "files", "file_ids", "fileids", "file_id", "upload_id",
+                      "asset_pointer", "assetpointer", "file_token", "filetoken",
+                      "image", "image_url", "imageurl", "media", "payload", "blob"}:
+                return True
+            if kl in {"mime", "mime_type", "mimetype", "content_type"} and isinstance(v, str):
+                if _mime_is_binary(v):
+                    return True
+            if kl == "type" and isinstance(v, str) and v.lower() in {
+                "input_image", "image", "input_audio", "audio", "input_video", "video", "file"
+            }:
+                return True
+            if kl in {"filename", "file_name"} and isinstance(v, str) and v.lower().endswith(_BINARY_EXTS):
+                return True
+            if kl in {"url", "src"} and isinstance(v, str):
+                vl = v.lower()
+                if vl.startswith(("blob:", "file:")) or vl.endswith(_BINARY_EXTS):
+                    return True
+            if isinstance(v, dict):
+                mt = v.get("mime") or v.get("mime_type") or v.get("mimetype") or v.get("content_type") or v.get("mimeType")
+                if isinstance(mt, str) and _mime_is_binary(mt):
+                    return True
+                fn = v.get("filename") or v.get("file_name")
+                if isinstance(fn, str) and fn.lower().endswith(_BINARY_EXTS):
+                    return True
+                u = v.get("url") or v.get("src")
+                if isinstance(u, str):
+                    ul = u.lower()
+                    if ul.startswith(("blob:", "file:")) or ul.endswith(_BINARY_EXTS):
+                        return True
+        return False
+    return False
+
+
+# ---- payloads ----
+
+_MAGIC = MAGIC_HEADERS
+
+
+def b64_blob(n_bytes: int, magic: str = "png", *, rng: random.Random, wrap: bool = False) -> str:
+    raw = _MAGIC[magic] + rng.randbytes(max(0, n_bytes - len(_MAGIC[magic])))
+    s = base64.b64encode(raw).decode()
+    if wrap:
+        s = "\n".join(s[i:i + 76] for i in range(0, len(s), 76))
+    return s
+
+
+def _msg(parts) -> dict:
+    return {"id": "m1", "author": {"role": "user"},
+            "content": {"content_type": "multimodal_text", "parts": parts}, "metadata": {}}
+
+
+def payloads(mb: float) -> dict:
+    rng = random.Random(1)
+    n = int(mb * 1024 * 1024)
+    text = "please describe this picture and summarise the attached report " * 4
+    deep: object = "leaf"
+    for _ in range(sys.getrecursionlimit() * 2):
+        deep = {"x": [deep]}
+    return {
+        "data_url_png": {"messages": [_msg([text, "data:image/png;base64," + b64_blob(n, "png", rng=rng)])]},
+        "raw_b64_jpeg": {"messages": [_msg([text, b64_blob(n, "jpeg", rng=rng, wrap=True)])]},
+        "b64_not_image": {"messages": [_msg([text, b64_blob(n, "none", rng=rng)])]},
+        "typed_part": {"messages": [_msg([{"type": "input_image", "image_url": "data:image/png;base64,"
+                                           + b64_blob(n, "png", rng=rng)}, text])]},
+        "asset_pointer": {"messages": [_msg([text, {"content_type": "image_asset_pointer",
+                                                    "asset_pointer": "file-service://file-abc"}] * 20)]},
+        "text_only": {"messages": [_msg([text * 200]) for _ in range(50)]},
+        "deep_nesting": {"messages": [_msg([deep])]},
+    }
+
+
+def random_tree(rng: random.Random, depth: int = 0):
+    r = rng.random()
+    if depth > 4 or r < 0.35:
+        return rng.choice((
+            lambda: "just text",
+            lambda: "x" * rng.randint(100, 300),
+            lambda: "data:image/%s;base64," % rng.choice(("png", "jpeg")) + b64_blob(rng.randint(1, 400), rng.choice(list(_MAGIC)), rng=rng),
+            lambda: "  data:application/pdf;base64," + b64_blob(rng.randint(1, 400), rng.choice(list(_MAGIC)), rng=rng),
+            lambda: b64_blob(rng.randint(90, 600), rng.choice(list(_MAGIC)), rng=rng, wrap=rng.random() < 0.5),
+            lambda: b64_blob(rng.randint(90, 600), "none", rng=rng) + "=" * rng.randint(0, 3),
+            # broken padding: the old full decode fails, so no magic match
+            lambda: b64_blob(rng.randint(90, 600), rng.choice(list(_MAGIC)), rng=rng)[:-rng.randint(1, 3)],
+            lambda: "data:application/zip;base64," + b64_blob(rng.randint(1, 300), rng.choice(("zip", "png")), rng=rng)[:rng.randint(1, 40)]
+            + rng.choice(("", "=", "==", " \n")),
+            lambda: rng.choice(("\u00a0", "\x1c", "\t", "\u2028", "é", "")).join(
+                (" data:image/png;base64," * rng.randint(0, 1), b64_blob(rng.randint(90, 300), "png", rng=rng), " ")),
+            lambda: rng.choice(("image/png", "text/plain", "a.PNG", "notes.txt", "blob:x", "https://x/y.pdf", "input_image")),
+            lambda: rng.randint(0, 9),
+            lambda: None,
+        ))()
+    if r < 0.65:
+        return [random_tree(rng, depth + 1) for _ in range(rng.randint(0, 4))]
+    keys = ("text", "parts", "content", "type", "mime", "mimeType", "filename", "url", "src", "meta",
+            "fileId", "attachments", "name", "data")
+    return {rng.choice(keys): random_tree(rng, depth + 1) for _ in range(rng.randint(0, 4))}
+
+
+def check(trials: int) -> None:
+    rng = random.Random(0)
+    hits = 0
+    for i in range(trials):
+        tree = random_tree(rng)
+        a, b = legacy(tree), classify(tree)
+        if a != b:
+            raise AssertionError(f"classifiers disagree on trial {i}: {json.dumps(tree)[:300]}")
+        hits += a
+    print(f"equivalence: {trials} random trees, same verdict ({hits} binary)\n")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mb", type=float, default=4, help="size of each embedded attachment")
+    ap.add_argument("--check", type=int, default=3000)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    if args.check:
+        check(args.check)
+
+    print(f"{'payload':<15} {'MB':>6} {'old ms':>9} {'new ms':>9} {'verdict':>8}")
+    for name, obj in payloads(args.mb).items():
+        size = len(json.dumps(obj)) / 1e6 if name != "deep_nesting" else 0.0
+        res = {}
+        for label, fn in (("old", legacy), ("new", classify)):
+            best = None
+            try:
+                for _ in range(args.repeat):
+                    t0 = time.perf_counter()
+                    verdict = fn(obj)
+                    took = time.perf_counter() - t0
+                    best = took if best is None else min(best, took)
+                res[label] = (f"{best * 1000:.2f}", verdict)
+            except RecursionError:
+                res[label] = ("Recursion", None)
+        print(f"{name:<15} {size:>6.1f} {res['old'][0]:>9} {res['new'][0]:>9} {str(res['new'][1]):>8}")
+
+
+if __name__ == "__main__":
+    main()
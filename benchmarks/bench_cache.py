@@ -0,0 +1,67 @@
+"""
+/inspect decision cache: cost of a hit vs. a miss, in-process.
+
+Replays a trace where each conversation body is sent a few times (retry,
+prepare, regenerate) and compares decide() on every request against
+decision_key() + DecisionCache lookups. Cached decisions are checked to be
+identical to freshly computed ones.
+
+    python -m benchmarks.bench_cache [--turns 5,50,200] [--repeats 4]
+"""
+
+import argparse
+import json
+import time
+
+from proxy.cache import DecisionCache, decision_key
+from proxy.policy import decide
+
+from .corpus import chatgpt_conversation
+from .harness import percentile
+
+URL = "https://chatgpt.com/backend-api/conversation"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", default="5,50,200", help="conversation lengths, comma separated")
+    ap.add_argument("--repeats", type=int, default=4, help="times each body is re-sent")
+    ap.add_argument("--bodies", type=int, default=20, help="distinct bodies per length")
+    args = ap.parse_args()
+
+    print(f"{'turns':>5} {'KB':>6} {'miss p50 ms':>12} {'hit p50 us':>11} {'hit p99 us':>11} "
+          f"{'uncached s':>11} {'cached s':>9} {'hit rate':>9} {'same':>5}")
+    for turns in (int(x) for x in args.turns.split(",")):
+        bodies = [json.dumps(chatgpt_conversation(turns, seed=s)) for s in range(args.bodies)]
+        trace = [b for b in bodies for _ in range(args.repeats)]
+        kb = sum(map(len, bodies)) / len(bodies) / 1024
+
+        t0 = time.perf_counter()
+        ref = [decide("warn", "json", URL, b) for b in trace]
+        uncached = time.perf_counter() - t0
+
+        cache = DecisionCache()
+        miss, hit, out = [], [], []
+        t0 = time.perf_counter()
+        for b in trace:
+            t = time.perf_counter()
+            key = decision_key("warn", "json", None, None, b)
+            d = cache.get(key)
+            if d is None:
+                d = decide("warn", "json", URL, b)
+                cache.put(key, d)
+                miss.append(time.perf_counter() - t)
+            else:
+                hit.append(time.perf_counter() - t)
+            out.append(d)
+        cached = time.perf_counter() - t0
+
+        same = out == ref
+        st = cache.stats()
+        print(f"{turns:>5} {kb:>6.0f} {percentile(miss, 50) * 1000:>12.2f} {percentile(hit, 50) * 1e6:>11.1f} "
+              f"{percentile(hit, 99) * 1e6:>11.1f} {uncached:>11.2f} {cached:>9.2f} {st['hit_rate']:>9.2f} "
+              f"{'yes' if same else 'NO':>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Whole-string redact_text vs. chunked iter_redacted on multi-MB pastes.
+
+For each size: wall time, time to first output, and peak traced memory
+(tracemalloc, so absolute times are inflated for both). The "same" column
+checks the chunked output and tags against redact_text's; the equivalence
+tests proper are in tests/test_chunked.py.
+
+    python -m benchmarks.bench_chunked [--sizes 1,4,16]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from proxy import transformers
+from proxy.transformers import iter_redacted, split_text
+
+from .corpus import pii_dense
+
+
+def whole(text: str):
+    # the plain path, regardless of CHUNKED_MIN_CHARS
+    old, transformers.CHUNKED_MIN_CHARS = transformers.CHUNKED_MIN_CHARS, len(text) + 1
+    try:
+        tags: list[str] = []
+        return transformers.redact_text(text, tags), tags
+    finally:
+        transformers.CHUNKED_MIN_CHARS = old
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1,4,16", help="MB, comma separated")
+    args = ap.parse_args()
+
+    print(f"{'MB':>4} {'mode':<8} {'total ms':>9} {'first out ms':>13} {'peak MB':>8} {'same':>5}")
+    for mb in (float(x) for x in args.sizes.split(",")):
+        text = pii_dense(int(mb * 1024 * 1024), ratio=0.05)
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        ref, ref_tags = whole(text)
+        total = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{mb:>4g} {'whole':<8} {total * 1000:>9.0f} {total * 1000:>13.0f} {peak / 1e6:>8.1f} {'':>5}")
+
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        first = None
+        tags: list[str] = []
+        same = True
+        pos = 0
+        for piece in iter_redacted(split_text(text), tags):
+            if first is None:
+                first = time.perf_counter() - t0
+            # compare as we go instead of keeping the output
+            same = same and ref[pos:pos + len(piece)] == piece
+            pos += len(piece)
+        total = time.perf_counter() - t0
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        same = same and pos == len(ref) and tags == ref_tags
+        print(f"{mb:>4g} {'chunked':<8} {total * 1000:>9.0f} {(first or 0) * 1000:>13.1f} {peak / 1e6:>8.1f} "
+              f"{'yes' if same else 'NO':>5}")
+
+
+if __name__ == "__main__":
+    main()
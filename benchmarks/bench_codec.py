@@ -0,0 +1,89 @@
+"""
+JSON codecs on ChatGPT-shaped conversation payloads: stdlib vs. proxy.codec
+(orjson / msgspec when installed). Also checks that dumps_compact is
+byte-identical to the stdlib contract on every payload and on edge cases.
+
+    python -m benchmarks.bench_codec [--turns 10,100,500] [--repeat 20]
+"""
+
+import argparse
+import json
+import time
+
+from proxy import codec
+from proxy.transformers import json_transform, redact_text
+
+from .corpus import chatgpt_conversation
+
+EDGE_CASES = [
+    {"f": [1e16, 2.5e-05, 0.1, -0.0, 1e22, 123456789.123]},
+    {"s": "\x00\x1f\x7f  é 😀 \"\\/"},
+    {"big": 123456789012345678901234567890},
+    {"nan": float("nan"), "inf": float("inf")},
+    {"lone": "\ud800"},
+    [],
+    "plain",
+    None,
+]
+
+
+def _std_dumps(o):
+    return json.dumps(o, ensure_ascii=False, separators=(",", ":"))
+
+
+def _shout(s: str, tags: list) -> str:
+    # a transform that changes every string, so every body is re-serialised
+    return redact_text(s, tags) + "!"
+
+
+def check_identical(objs) -> int:
+    fast = codec.BACKEND
+    for o in objs:
+        if codec.dumps_compact(o) != _std_dumps(o):
+            raise AssertionError(f"codec.dumps_compact diverges on {_std_dumps(o)[:80]!r}")
+        text = json.dumps(o, ensure_ascii=False)
+        got = json_transform(text, _shout)
+        codec.set_backend("json")
+        try:
+            expected = json_transform(text, _shout)
+        finally:
+            codec.set_backend(fast)
+        if got != expected:
+            raise AssertionError(f"json_transform output diverges on {text[:80]!r}")
+    return len(objs)
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--turns", default="10,100,500")
+    ap.add_argument("--repeat", type=int, default=20)
+    args = ap.parse_args()
+
+    payloads = {int(t): chatgpt_conversation(int(t)) for t in args.turns.split(",")}
+    n = check_identical(EDGE_CASES + list(payloads.values()))
+    print(f"codec backend: {codec.BACKEND}; {n} payloads byte-identical to stdlib")
+
+    print(f"{'turns':>6} {'KB':>8} {'json.loads':>11} {'codec.loads':>12} {'json.dumps':>11} {'codec.dumps':>12}   (ms)")
+    for turns, obj in payloads.items():
+        text = _std_dumps(obj)
+        raw = text.encode()
+        r = [
+            _best(lambda: json.loads(raw), args.repeat),
+            _best(lambda: codec.loads(raw), args.repeat),
+            _best(lambda: _std_dumps(obj), args.repeat),
+            _best(lambda: codec.dumps_compact(obj), args.repeat),
+        ]
+        print(f"{turns:>6} {len(raw) / 1024:>8.1f} " + " ".join(f"{x * 1000:>11.3f}" for x in r))
+
+
+if __name__ == "__main__":
+    main()
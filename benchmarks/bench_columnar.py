@@ -0,0 +1,149 @@
+"""
+Dashboard history queries: JSONL row-by-row vs. the Parquet columnar store.
+
+Builds a rotated, gzip-segmented log (default 1M events over 7 days) and
+times, per dashboard window:
+
+  - pandas:   the old load_events_grouped (json.loads per line, groupby with
+              Python lambdas), if pandas is installed
+  - jsonl:    LiveAggregates folding every line
+  - columnar: ColumnarHistory over the compacted Parquet files (cold cache)
+
+plus the one-off compaction cost. Totals are checked against LiveAggregates.
+
+    python -m benchmarks.bench_columnar [--events 1000000] [--days 7]
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from dashboard.aggregates import LiveAggregates
+from dashboard.columnar import ColumnarHistory, compact
+from proxy.eventlog import EventLogger, iter_lines
+
+WINDOWS = {"1h": 3600, "24h": 86400, "all": None}
+
+
+def build_log(path: str, events: int, days: float) -> None:
+    rng = random.Random(0)
+    lg = EventLogger(path, max_queue=events + 1, batch_size=4096, rotate_bytes=16 << 20).start()
+    now = time.time()
+    step = days * 86400 / events
+    for i in range(events):
+        action = rng.choice(("allow", "allow", "modify", "block"))
+        lg.log({
+            "ts": now - (events - i) * step, "route": "/backend-api/conversation",
+            "duration_ms": rng.random() * 5, "status": 403 if action == "block" else 200,
+            "detected": rng.choice(([], [], ["email"], ["phone"], ["email", "api_key"])),
+            "context": "fetch", "body_kind": "json", "action": action, "mode": "warn",
+            "send_id": f"s-{i // 3}", "tab_id": (i // 3) % 7,
+        })
+    lg.close(timeout=600)
+    lg.rotate()     # writer stopped: close the live file so everything is history
+
+
+def pandas_grouped(path: str, start_ts):
+    # the pre-incremental dashboard query, kept as the baseline
+    import pandas as pd
+
+    raw = []
+    for i, line in enumerate(iter_lines(path, start_ts)):
+        obj = json.loads(line)
+        ts = obj.get("ts", time.time())
+        if start_ts is not None and ts < start_ts:
+            continue
+        raw.append({"send_id": obj.get("send_id") or f"_no_send_id_{i}", "tab_id": obj.get("tab_id"),
+                    "ts": pd.to_datetime(ts, unit="s"), "route": obj.get("route") or "",
+                    "duration_ms": float(obj.get("duration_ms", 0) or 0), "status": obj.get("status", 200),
+                    "action": (obj.get("action") or "").lower(), "detected_list": obj.get("detected", [])})
+    if not raw:
+        return None
+    df = pd.DataFrame(raw)
+
+    def actions_join(s):
+        out = []
+        for a in s.tolist():
+            if a and a not in out:
+                out.append(a)
+        return ",".join(out)
+
+    return (
+        df.sort_values("ts").groupby(["send_id", "tab_id"], dropna=False, as_index=False).agg(
+            first_ts=("ts", "min"), last_ts=("ts", "max"),
+            route=("route", lambda s: s.value_counts().index[0] if len(s) else ""),
+            duration_ms=("duration_ms", "sum"), final_status=("status", "max"),
+            final_action=("action", lambda s: s.tolist()[-1] if len(s) else ""),
+            actions=("action", actions_join),
+            detected=("detected_list", lambda d: ",".join(sorted({x for lst in d for x in lst}))),
+        )
+    )
+
+
+def _timed(fn):
+    t = time.perf_counter()
+    out = fn()
+    return out, (time.perf_counter() - t) * 1000
+
+
+def run(events: int, days: float, skip_pandas: bool) -> None:
+    tmp = tempfile.mkdtemp(prefix="pp-bench-col-")
+    try:
+        path = os.path.join(tmp, "events.jsonl")
+        _, ms = _timed(lambda: build_log(path, events, days))
+        segs = [f for f in os.listdir(tmp) if f.endswith(".gz")]
+        print(f"built {events} events in {len(segs)} segments ({ms / 1000:.1f}s)")
+
+        _, ms = _timed(lambda: compact(path))
+        pq_mb = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp) if f.endswith(".parquet")) / 1e6
+        gz_mb = sum(os.path.getsize(os.path.join(tmp, f)) for f in segs) / 1e6
+        print(f"compaction {ms:.0f} ms  (gzip {gz_mb:.1f} MB -> parquet {pq_mb:.1f} MB)\n")
+
+        if importlib.util.find_spec("pandas") is None:
+            skip_pandas = True
+
+        print(f"{'window':<7} {'sends':>9} {'pandas ms':>10} {'jsonl ms':>10} {'columnar ms':>12} {'same':>5}")
+        now = time.time()
+        for name, secs in WINDOWS.items():
+            start = None if secs is None else now - secs
+            start = None if start is None else (start // 60) * 60   # bucket-aligned
+            p_ms = float("nan")
+            if not skip_pandas:
+                _, p_ms = _timed(lambda: pandas_grouped(path, start))
+
+            def jsonl():
+                agg = LiveAggregates(path, since_ts=start, max_groups=events)
+                agg.refresh()
+                return agg.summary(start), agg.latency_buckets(start)
+
+            def col():
+                hist = ColumnarHistory(path)
+                s = hist.summary(start)
+                b = hist.latency_buckets(start)
+                hist.recent(30, start)
+                return s, b
+
+            (js, jb), j_ms = _timed(jsonl)
+            (cs, cb), c_ms = _timed(col)
+            same = js == cs and jb.keys() == cb.keys()
+            print(f"{name:<7} {cs['sends']:>9} {p_ms:>10.0f} {j_ms:>10.0f} {c_ms:>12.1f} {'yes' if same else 'NO':>5}")
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=1_000_000)
+    ap.add_argument("--days", type=float, default=7)
+    ap.add_argument("--skip-pandas", action="store_true")
+    args = ap.parse_args()
+    run(args.events, args.days, args.skip_pandas)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+N concurrent /inspect clients against a locally started proxy, once per
+decide() backend (PP_DECIDE_BACKEND). Reports throughput and p50/p99.
+
+    python -m benchmarks.bench_concurrency [--clients 32] [--requests 20] [--large-kb 256]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from .corpus import pii_dense
+from .harness import proxy_server, summarize
+
+
+def _payloads(large_kb: int) -> list[dict]:
+    small = {"url": "https://chatgpt.com/backend-api/conversation", "bodyKind": "json",
+             "body": json.dumps({"messages": [{"content": {"parts": ["hi, mail me at a@b.co"]}}]})}
+    large = {"url": "https://chatgpt.com/backend-api/conversation", "bodyKind": "json",
+             "body": json.dumps({"messages": [{"content": {"parts": [pii_dense(large_kb * 1024)]}}]})}
+    # mostly small traffic with a steady share of large pastes
+    return [large if i % 4 == 0 else small for i in range(8)]
+
+
+async def _client(base: str, payloads: list[dict], n: int, out: list[float]) -> None:
+    async with httpx.AsyncClient(timeout=120) as c:
+        for i in range(n):
+            p = payloads[i % len(payloads)]
+            t0 = time.perf_counter()
+            r = await c.post(base + "/inspect", json={**p, "mode": "warn"})
+            r.raise_for_status()
+            out.append(time.perf_counter() - t0)
+
+
+async def _run(base: str, clients: int, per_client: int, payloads: list[dict]) -> dict:
+    lat: list[float] = []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(base, payloads, per_client, lat) for _ in range(clients)))
+    return summarize(lat, time.perf_counter() - t0)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--clients", type=int, default=32)
+    ap.add_argument("--requests", type=int, default=20, help="requests per client")
+    ap.add_argument("--large-kb", type=int, default=256)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--backends", default="inline,thread,process")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    payloads = _payloads(args.large_kb)
+    results = {}
+    for backend in args.backends.split(","):
+        env = {"PP_DECIDE_BACKEND": backend, "PP_DECIDE_WORKERS": str(args.workers)}
+        with proxy_server(env) as base:
+            results[backend] = asyncio.run(_run(base, args.clients, args.requests, payloads))
+
+    if args.json:
+        print(json.dumps(results))
+        return
+    print(f"{'backend':<8} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p99 ms':>9}")
+    for backend, r in results.items():
+        print(f"{backend:<8} {r['requests']:>9} {r['rps']:>8} {r['p50_ms']:>9} {r['p99_ms']:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Incremental conversation-aware inspection (proxy/conversations.py).
+
+Replays a synthetic chat where turn t re-posts all t messages so far, and
+runs decide() on every body three ways: full rescan, per-string memo only,
+and memo + per-conversation message index (tab_id passed). Reports total
+time, per-turn latency growth and index memory, and checks all decisions are
+identical, including on turns where an old message is edited in place.
+
+    python -m benchmarks.bench_conversation [--turns 200] [--chars 400]
+"""
+
+import argparse
+import json
+import random
+import time
+
+from proxy.conversations import CONVERSATIONS, configure_conversations
+from proxy.policy import decide
+from proxy.transformers import configure_redact_memo
+
+from .corpus import chatgpt_conversation, pii_dense
+
+URL = "https://chatgpt.com/backend-api/conversation"
+
+
+def bodies(turns: int, chars: int, seed: int = 1) -> list[str]:
+    rng = random.Random(seed)
+    full = chatgpt_conversation(turns, seed=seed, chars_per_turn=chars)
+    out = []
+    for t in range(1, turns + 1):
+        conv = {**full, "messages": [dict(m) for m in full["messages"][:t]]}
+        if t % 25 == 12:
+            # edit an old message without changing its id
+            i = rng.randrange(t)
+            m = conv["messages"][i] = {**conv["messages"][i]}
+            m["content"] = {"content_type": "text", "parts": [pii_dense(chars, seed=t, ratio=0.05)]}
+        if t % 40 == 20:
+            # a float the fast codec prints differently (forces the exact slow path)
+            conv["messages"][-1] = {**conv["messages"][-1], "create_time": 1.5e300}
+        out.append(json.dumps(conv))
+    return out
+
+
+def run(trace: list[str], *, memo: bool, index: bool) -> tuple[list[float], list]:
+    configure_redact_memo((32 << 20) if memo else 0)
+    configure_conversations((64 << 20) if index else 0, 1024, 1800.0)
+    times, out = [], []
+    for b in trace:
+        t0 = time.perf_counter()
+        out.append(decide("warn", "json", URL, b, tab_id=7))
+        times.append(time.perf_counter() - t0)
+    return times, out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=200)
+    ap.add_argument("--chars", type=int, default=400, help="characters per message")
+    args = ap.parse_args()
+
+    trace = bodies(args.turns, args.chars)
+    print(f"{args.turns} turns, {sum(map(len, trace)) / 1e6:.1f} MB of request bodies in total")
+    ref_t, ref = run(trace, memo=False, index=False)
+    rows = [("full rescan", ref_t, True)]
+    for name, memo, index in (("memo", True, False), ("memo+index", True, True)):
+        t, out = run(trace, memo=memo, index=index)
+        rows.append((name, t, out == ref))
+        if index:
+            st = CONVERSATIONS.stats()
+
+    q = args.turns // 4
+    print(f"{'mode':<12} {'total s':>8} {'turn ' + str(q) + ' ms':>11} {'last turn ms':>13} {'same':>5}")
+    for name, t, same in rows:
+        print(f"{name:<12} {sum(t):>8.2f} {t[q - 1] * 1000:>11.2f} {t[-1] * 1000:>13.2f} {'yes' if same else 'NO':>5}")
+    print(f"index: {st['messages']} messages, {st['bytes'] / 1024:.0f} KB, hit rate {st['hit_rate']:.3f}")
+
+    configure_redact_memo(32 << 20)
+    configure_conversations(64 << 20, 1024, 1800.0)
+
+
+if __name__ == "__main__":
+    main()
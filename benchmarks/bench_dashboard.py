@@ -0,0 +1,93 @@
+"""
+Dashboard refresh cost as the event log grows.
+
+Builds a synthetic events.jsonl (default 5M lines) in steps and at each
+checkpoint reports:
+
+  - full:   a fresh LiveAggregates reading the whole log, i.e. what every
+            rerun cost when the dashboard re-parsed the file from scratch
+  - refresh: a long-lived LiveAggregates after ~1000 more lines were appended,
+            which is what a rerun costs now
+
+    python -m benchmarks.bench_dashboard [--lines 5000000] [--append 1000] [--dir /tmp/x]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from dashboard.aggregates import LiveAggregates
+
+ROUTES = ("/backend-api/conversation", "/backend-api/files", "/backend-api/f/conversation")
+DETECTED = ('[]', '[]', '[]', '["email"]', '["phone"]', '["email","api_key"]')
+ACTIONS = ("allow", "allow", "modify", "block")
+
+
+def _lines(rng: random.Random, start: int, n: int, t0: float):
+    # ~3 events per send, spread over a handful of tabs
+    for i in range(start, start + n):
+        action = ACTIONS[rng.randrange(len(ACTIONS))]
+        yield (
+            f'{{"ts": {t0 + i * 0.01:.3f}, "route": "{ROUTES[i % 3]}", "duration_ms": {rng.random() * 5:.3f}, '
+            f'"status": {403 if action == "block" else 200}, "detected": {DETECTED[rng.randrange(len(DETECTED))]}, '
+            f'"context": "fetch", "body_kind": "json", "action": "{action}", "mode": "warn", '
+            f'"send_id": "s-{i // 3}", "tab_id": {(i // 3) % 7}}}\n'
+        )
+
+
+def append(path: str, rng: random.Random, start: int, n: int, t0: float) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(_lines(rng, start, n, t0))
+
+
+def run(total: int, extra: int, workdir: str, checkpoints: int) -> None:
+    path = os.path.join(workdir, "events.jsonl")
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(0)
+    t0 = time.time() - total * 0.01
+    sizes = sorted({max(extra, total // 10 ** k) for k in range(checkpoints - 1, -1, -1)})
+
+    live = LiveAggregates(path)
+    written = 0
+    print(f"{'log lines':>10} {'log MB':>8} {'full ms':>10} {'refresh ms':>11} {'new lines':>10}")
+    for size in sizes:
+        append(path, rng, written, size - written, t0)
+        written = size
+        live.refresh()                      # catch up (not timed)
+
+        t = time.perf_counter()
+        LiveAggregates(path).refresh()
+        full = time.perf_counter() - t
+
+        append(path, rng, written, extra, t0)
+        written += extra
+        t = time.perf_counter()
+        n = live.refresh()
+        inc = time.perf_counter() - t
+        mb = os.path.getsize(path) / 1e6
+        print(f"{written:>10} {mb:>8.1f} {full * 1000:>10.1f} {inc * 1000:>11.2f} {n:>10}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=5_000_000)
+    ap.add_argument("--append", type=int, default=1000, help="lines appended before each timed refresh")
+    ap.add_argument("--checkpoints", type=int, default=4, help="log sizes, each 10x the previous")
+    ap.add_argument("--dir", default=None, help="where to build the log (default: a temp dir)")
+    args = ap.parse_args()
+
+    workdir = args.dir or tempfile.mkdtemp(prefix="pp-bench-dash-")
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        run(args.lines, args.append, workdir, args.checkpoints)
+    finally:
+        if args.dir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
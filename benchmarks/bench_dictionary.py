@@ -0,0 +1,120 @@
+"""
+Dictionary detector (detectors.Dictionary, Aho-Corasick) at 1k/10k/100k terms.
+
+Build time and scan time per backend (pure Python, and pyahocorasick when
+installed) on prose with some of the terms sprinkled in, next to the naive
+alternative: one IGNORECASE regex alternation wrapped in \\b, longest term
+first. The regex is only timed up to --regex-max terms (it gets slow to
+compile and to scan well before 100k).
+
+Every size is checked first: both backends and the regex find the same
+spans, with and without whole_words.
+
+    python -m benchmarks.bench_dictionary [--terms 1000,10000,100000] [--kb 256] [--reps 3]
+"""
+
+import argparse
+import random
+import re
+import time
+
+from proxy.detectors import Dictionary, ahocorasick
+
+from .corpus import prose
+
+
+def make_terms(n: int, seed: int = 1) -> list[str]:
+    """Made-up customer/project names, one to three words, no duplicates."""
+    rng = random.Random(seed)
+    syl = ["ka", "lo", "mi", "ra", "tu", "zen", "vor", "qua", "ix", "bel", "dor", "an", "shi", "pe"]
+    out: set[str] = set()
+    while len(out) < n:
+        words = ["".join(rng.choice(syl) for _ in range(rng.randint(2, 4))).capitalize()
+                 for _ in range(rng.randint(1, 3))]
+        out.add(" ".join(words))
+    return sorted(out)
+
+
+def make_text(terms: list[str], n_chars: int, seed: int = 1) -> str:
+    # prose with a term (in random case) roughly every 200 chars
+    rng = random.Random(seed)
+    parts = []
+    size = 0
+    base = prose(n_chars, seed=seed).split(" ")
+    for i, w in enumerate(base):
+        parts.append(w)
+        size += len(w) + 1
+        if i % 30 == 0:
+            t = rng.choice(terms)
+            parts.append(t.upper() if rng.random() < 0.3 else t.lower())
+        if size >= n_chars:
+            break
+    return " ".join(parts)
+
+
+def regex_for(terms: list[str], whole_words: bool = True) -> re.Pattern:
+    alt = "|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True))
+    return re.compile(r"\b(?:%s)\b" % alt if whole_words else "(?:%s)" % alt, re.IGNORECASE)
+
+
+def _best(fn, reps: int) -> float:
+    best = float("inf")
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--terms", default="1000,10000,100000", help="dictionary sizes")
+    ap.add_argument("--kb", type=int, default=256, help="text size in KB")
+    ap.add_argument("--reps", type=int, default=3)
+    ap.add_argument("--regex-max", type=int, default=10000, help="largest dictionary to time the regex on")
+    args = ap.parse_args()
+
+    backends = ["python"] + (["pyahocorasick"] if ahocorasick is not None else [])
+    if ahocorasick is None:
+        print("pyahocorasick not installed: pure Python backend only")
+
+    print(f"{'terms':>8} {'backend':>14} {'build ms':>10} {'scan ms':>9} {'MB/s':>7} {'hits':>6}")
+    for n in (int(x) for x in args.terms.split(",")):
+        terms = make_terms(n, seed=n)
+        text = make_text(terms, args.kb * 1024, seed=n)
+        mb = len(text) / 1e6
+
+        dicts, build = {}, {}
+        for be in backends:
+            dicts[be], build[be] = _timed(lambda: Dictionary(terms, backend=be))
+        rx, rx_build = (_timed(lambda: regex_for(terms)) if n <= args.regex_max else (None, 0.0))
+
+        # equivalence: backends agree with each other and with the regex
+        spans = dicts["python"](text)
+        for be in backends[1:]:
+            assert dicts[be](text) == spans, f"{be} disagrees with the python backend at {n} terms"
+            for ww in (True, False):
+                a = Dictionary(terms, backend="python", whole_words=ww)
+                assert Dictionary(terms, backend=be, whole_words=ww)(text[:20000]) == a(text[:20000])
+        if rx is not None:
+            assert [m.span() for m in rx.finditer(text)] == spans, f"regex disagrees at {n} terms"
+            assert [m.span() for m in regex_for(terms, False).finditer(text[:20000])] == \
+                Dictionary(terms, backend="python", whole_words=False)(text[:20000])
+
+        for be, d in dicts.items():
+            t = _best(lambda: d(text), args.reps)
+            print(f"{n:>8} {be:>14} {build[be] * 1e3:>10.1f} {t * 1e3:>9.1f} {mb / t:>7.1f} {len(spans):>6}")
+        if rx is not None:
+            t = _best(lambda: list(rx.finditer(text)), args.reps)
+            print(f"{n:>8} {'regex':>14} {rx_build * 1e3:>10.1f} {t * 1e3:>9.1f} {mb / t:>7.1f} {len(spans):>6}")
+    print("checks: backends and regex alternation find identical spans: ok")
+
+
+if __name__ == "__main__":
+    main()
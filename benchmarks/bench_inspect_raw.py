@@ -0,0 +1,106 @@
+"""
+/inspect (JSON envelope) vs. /inspect/raw (body as-is, metadata in headers).
+
+For each prompt size: bytes on the wire each way, p50 latency over HTTP
+against a locally started proxy (decision cache off, distinct bodies so the
+scan isn't skipped), and the in-process cost of the envelope itself (decode
+the envelope, re-encode the decision) next to the raw path's UTF-8
+decode/encode. Checks both endpoints return the same decision.
+
+    python -m benchmarks.bench_inspect_raw [--sizes 4,64,1024,8192] [--requests 20]
+"""
+
+import argparse
+import json
+import time
+from urllib.parse import quote, unquote
+
+from proxy import codec
+
+from .corpus import chatgpt_conversation
+from .harness import percentile, proxy_server
+
+URL = "https://chatgpt.com/backend-api/conversation"
+
+
+def bodies(kb: int, n: int) -> list[str]:
+    # one message of `kb` KB with ~3% PII, distinct per request
+    return [json.dumps(chatgpt_conversation(1, seed=s, chars_per_turn=kb * 1024)) for s in range(n)]
+
+
+def envelope(body: str) -> bytes:
+    return codec.dumps_compact({"url": URL, "bodyKind": "json", "mode": "warn", "context": "fetch",
+                                "body": body, "sendId": "s1", "tabId": 7}).encode()
+
+
+def raw_headers() -> dict:
+    return {"Content-Type": "text/plain; charset=utf-8", "X-PP-Url": quote(URL, safe=""), "X-PP-Mode": "warn",
+            "X-PP-Body-Kind": "json", "X-PP-Send-Id": "s1", "X-PP-Tab-Id": "7"}
+
+
+def in_process(body: str, redacted: str, repeat: int = 5) -> tuple[float, float]:
+    """(envelope, raw) seconds spent on transport encoding alone, best of `repeat`."""
+    decision = {"action": "modify", "body": redacted, "notify": {"message": "x"}, "detected": ["email"]}
+    env = envelope(body)
+    best_env = best_raw = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        codec.loads(env)["body"]
+        codec.dumps_compact(decision).encode()
+        best_env = min(best_env, time.perf_counter() - t0)
+        raw = body.encode()
+        t0 = time.perf_counter()
+        raw.decode("utf-8")
+        redacted.encode("utf-8")
+        best_raw = min(best_raw, time.perf_counter() - t0)
+    return best_env, best_raw
+
+
+def main() -> None:
+    import httpx
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="4,64,1024,8192", help="prompt size in KB, comma separated")
+    ap.add_argument("--requests", type=int, default=20, help="requests per size and endpoint")
+    args = ap.parse_args()
+
+    rows = []
+    with proxy_server({"PP_DECISION_CACHE": "0", "PP_REDACT_MEMO_MB": "0", "PP_CONV_INDEX_MB": "0"}) as base:
+        with httpx.Client(timeout=120) as c:
+            for kb in (int(x) for x in args.sizes.split(",")):
+                n = max(3, args.requests if kb < 1024 else args.requests // 4)
+                bs = bodies(kb, n)
+                lat_env, lat_raw, same = [], [], True
+                bytes_env = bytes_raw = [0, 0]
+                for i, b in enumerate(bs):
+                    env = envelope(b)
+                    t0 = time.perf_counter()
+                    r1 = c.post(base + "/inspect", content=env, headers={"Content-Type": "application/json"})
+                    lat_env.append(time.perf_counter() - t0)
+                    raw = b.encode()
+                    t0 = time.perf_counter()
+                    r2 = c.post(base + "/inspect/raw", content=raw, headers=raw_headers())
+                    lat_raw.append(time.perf_counter() - t0)
+
+                    d = r1.json()
+                    action = r2.headers["x-pp-action"]
+                    detected = [t for t in r2.headers.get("x-pp-detected", "").split(",") if t]
+                    notify = unquote(r2.headers.get("x-pp-notify", ""))
+                    same = same and d["action"] == action and d.get("detected", []) == detected \
+                        and d.get("body", "") == r2.text and (d.get("notify") or {}).get("message", "") == notify
+                    if i == 0:
+                        bytes_env = [len(env), len(r1.content)]
+                        bytes_raw = [len(raw), len(r2.content)]
+                        cpu_env, cpu_raw = in_process(b, d.get("body", b))
+                rows.append((kb, bytes_env, bytes_raw, lat_env, lat_raw, cpu_env, cpu_raw, same))
+
+    print(f"{'KB':>5} {'endpoint':<12} {'req KB':>8} {'resp KB':>8} {'p50 ms':>8} {'encode ms':>10} {'same':>5}")
+    for kb, be, br, le, lr, ce, cr, same in rows:
+        print(f"{kb:>5} {'/inspect':<12} {be[0] / 1024:>8.1f} {be[1] / 1024:>8.1f} {percentile(le, 50) * 1000:>8.2f} "
+              f"{ce * 1000:>10.2f}")
+        print(f"{'':>5} {'/inspect/raw':<12} {br[0] / 1024:>8.1f} {br[1] / 1024:>8.1f} {percentile(lr, 50) * 1000:>8.2f} "
+              f"{cr * 1000:>10.2f} {'yes' if same else 'NO':>5}")
+
+
+if __name__ == "__main__":
+    main()
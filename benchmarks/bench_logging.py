@@ -0,0 +1,107 @@
+"""
+Cost of event logging on the /inspect hot path.
+
+  - micro: per-call cost of the old open/append/close vs. EventLogger.log()
+  - http (--http): /inspect p50/p99 with PP_LOG_MODE=off|sync|async against a
+    locally started proxy
+
+    python -m benchmarks.bench_logging [--events 20000] [--http --clients 16 --requests 50]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from proxy import codec
+from proxy.eventlog import EventLogger
+
+from .harness import percentile
+
+EVENT = {
+    "ts": 1718000000.5, "route": "/backend-api/conversation", "duration_ms": 1.23, "status": 200,
+    "detected": ["email"], "context": "fetch", "url": "https://chatgpt.com/backend-api/conversation",
+    "body_kind": "json", "content_type": None, "filename": None, "action": "modify",
+    "mode": "warn", "send_id": "s-1", "tab_id": 7,
+}
+
+
+def _sync_append(path: str, obj: dict) -> None:
+    # the pre-EventLogger log_event
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(codec.dumps_line(obj) + "\n")
+
+
+def run_micro(events: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = []
+        for name in ("sync", "async"):
+            path = os.path.join(tmp, name, "events.jsonl")
+            lat = []
+            lg = EventLogger(path, max_queue=events + 1).start() if name == "async" else None
+            t0 = time.perf_counter()
+            for _ in range(events):
+                t = time.perf_counter()
+                if lg is not None:
+                    lg.log(EVENT)
+                else:
+                    _sync_append(path, EVENT)
+                lat.append(time.perf_counter() - t)
+            hot = time.perf_counter() - t0
+            if lg is not None:
+                lg.close()
+            total = time.perf_counter() - t0
+            with open(path, encoding="utf-8") as f:
+                written = sum(1 for _ in f)
+            rows.append((name, hot, total, percentile(lat, 50), percentile(lat, 99), written))
+    print(f"{'writer':<7} {'hot path ms':>12} {'incl. flush ms':>15} {'p50 us':>8} {'p99 us':>8} {'written':>8}")
+    for name, hot, total, p50, p99, written in rows:
+        print(f"{name:<7} {hot * 1000:>12.1f} {total * 1000:>15.1f} {p50 * 1e6:>8.1f} {p99 * 1e6:>8.1f} {written:>8}")
+
+
+def run_http(clients: int, per_client: int) -> None:
+    import httpx
+
+    from .harness import proxy_server, summarize
+
+    payload = {"url": "https://chatgpt.com/backend-api/conversation", "bodyKind": "json", "mode": "warn",
+               "body": json.dumps({"messages": [{"content": {"parts": ["mail a@b.co please"]}}]})}
+
+    async def client(base, out):
+        async with httpx.AsyncClient(timeout=60) as c:
+            for _ in range(per_client):
+                t0 = time.perf_counter()
+                (await c.post(base + "/inspect", json=payload)).raise_for_status()
+                out.append(time.perf_counter() - t0)
+
+    async def run(base):
+        lat = []
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client(base, lat) for _ in range(clients)))
+        return summarize(lat, time.perf_counter() - t0)
+
+    print(f"{'log mode':<8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode in ("off", "sync", "async"):
+        with proxy_server({"PP_LOG_MODE": mode}) as base:
+            r = asyncio.run(run(base))
+        print(f"{mode:<8} {r['rps']:>8} {r['p50_ms']:>8} {r['p99_ms']:>8}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--events", type=int, default=20_000)
+    ap.add_argument("--http", action="store_true")
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=50)
+    args = ap.parse_args()
+
+    run_micro(args.events)
+    if args.http:
+        run_http(args.clients, args.requests)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Per-string redaction memo (transformers.REDACT_MEMO) on a growing chat.
+
+Replays a synthetic conversation where turn t re-posts all t messages so
+far, the way the web app resends history, and runs decide() on every body
+with the memo off and on. Reports total time, memo hit rate, the scan time
+the hits stood in for, and checks the decisions are identical.
+
+    python -m benchmarks.bench_memo [--turns 200] [--chars 400] [--memo-mb 32]
+"""
+
+import argparse
+import json
+import time
+
+from proxy.policy import decide
+from proxy.transformers import REDACT_MEMO, configure_redact_memo
+
+from .corpus import chatgpt_conversation
+
+URL = "https://chatgpt.com/backend-api/conversation"
+
+
+def run(bodies: list[str], memo_bytes: int) -> tuple[list[float], list, dict]:
+    configure_redact_memo(memo_bytes)
+    REDACT_MEMO.hits = REDACT_MEMO.misses = REDACT_MEMO.evictions = 0
+    REDACT_MEMO.saved_s = 0.0
+    times, out = [], []
+    for b in bodies:
+        t0 = time.perf_counter()
+        out.append(decide("warn", "json", URL, b))
+        times.append(time.perf_counter() - t0)
+    return times, out, REDACT_MEMO.stats()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=200)
+    ap.add_argument("--chars", type=int, default=400, help="characters per message")
+    ap.add_argument("--memo-mb", type=float, default=32)
+    args = ap.parse_args()
+
+    bodies = [json.dumps(chatgpt_conversation(t, chars_per_turn=args.chars)) for t in range(1, args.turns + 1)]
+    mb = sum(map(len, bodies)) / 1e6
+    print(f"{args.turns} turns, {mb:.1f} MB of request bodies in total")
+
+    base, ref, _ = run(bodies, 0)
+    memo_bytes = int(args.memo_mb * 1024 * 1024)
+    took, out, st = run(bodies, memo_bytes)
+    configure_redact_memo(32 << 20)
+
+    print(f"{'memo':<5} {'total s':>8} {'last turn ms':>13} {'hit rate':>9} {'saved s':>8} {'entries':>8} {'KB':>7} {'same':>5}")
+    print(f"{'off':<5} {sum(base):>8.2f} {base[-1] * 1000:>13.2f}")
+    print(f"{'on':<5} {sum(took):>8.2f} {took[-1] * 1000:>13.2f} {st['hit_rate']:>9.3f} {st['saved_ms'] / 1000:>8.2f} "
+          f"{st['entries']:>8} {st['bytes'] / 1024:>7.0f} {'yes' if out == ref else 'NO':>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+What /metrics bookkeeping costs per /inspect request.
+
+  - micro: one request's worth of recording (stage histograms, counters,
+    endpoint latency) in a tight loop, from 1 and 8 threads
+  - http (--http): small-body /inspect p50 with PP_METRICS=0 vs 1
+
+    python -m benchmarks.bench_metrics [--n 200000] [--http --requests 2000]
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+
+from proxy import metrics
+
+from .harness import proxy_server, summarize
+
+
+def one_request() -> None:
+    metrics.observe_stages({"binary_check": 0.00002, "json_parse": 0.00001, "redaction": 0.0003})
+    metrics.REQUESTS.inc("modify", "warn", metrics.route_label("/backend-api/conversation"))
+    metrics.DETECTIONS.inc("email")
+    metrics.STAGE_LATENCY.observe(0.00001, "envelope_parse")
+    metrics.STAGE_LATENCY.observe(0.000005, "logging")
+    metrics.STAGE_LATENCY.observe(0.00001, "serialisation")
+    metrics.LATENCY.observe(0.0005, "inspect")
+
+
+def run_micro(n: int) -> None:
+    for threads in (1, 8):
+        per = n // threads
+
+        def work():
+            for _ in range(per):
+                one_request()
+
+        ts = [threading.Thread(target=work) for _ in range(threads)]
+        t0 = time.perf_counter()
+        for t in ts:
+            t.start()
+        for t in ts:
+            t.join()
+        took = time.perf_counter() - t0
+        print(f"{threads} thread(s): {took / (per * threads) * 1e6:.2f} us per request recorded")
+    t0 = time.perf_counter()
+    text = metrics.render()
+    print(f"render: {(time.perf_counter() - t0) * 1000:.2f} ms, {len(text.splitlines())} lines")
+
+
+def run_http(requests: int) -> None:
+    import httpx
+
+    def body(i: int) -> str:
+        # distinct bodies: the decision cache would hide the work otherwise
+        return json.dumps({"messages": [{"content": {"parts": [f"hi {i}, mail me at a@b.co"]}}]})
+
+    async def go(base):
+        lat = []
+        async with httpx.AsyncClient() as c:
+            t0 = time.perf_counter()
+            for i in range(requests):
+                t = time.perf_counter()
+                await c.post(base + "/inspect", json={"bodyKind": "json", "body": body(i),
+                                                      "url": "https://chatgpt.com/backend-api/conversation"})
+                lat.append(time.perf_counter() - t)
+            return summarize(lat, time.perf_counter() - t0)
+
+    for flag in ("0", "1"):
+        with proxy_server({"PP_METRICS": flag, "PP_DECISION_CACHE": "0"}) as base:
+            asyncio.run(go(base))   # warm up
+            print(f"PP_METRICS={flag}: {asyncio.run(go(base))}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200_000)
+    ap.add_argument("--http", action="store_true")
+    ap.add_argument("--requests", type=int, default=2000)
+    args = ap.parse_args()
+    run_micro(args.n)
+    if args.http:
+        run_http(args.requests)
+
+
+if __name__ == "__main__":
+    main()
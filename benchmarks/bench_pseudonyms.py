@@ -0,0 +1,107 @@
+"""
+Pseudonymisation (PP_REDACTION=pseudonymise) against the default maskers.
+
+redact_text throughput on PII-dense text (each match gets a salted token
+instead of a placeholder), with values that repeat (the common case in a
+conversation: memo hits) and with every value new (a keyed BLAKE2b per
+match), plus the bare per-match cost of the maskers and of token().
+Checks that both modes find the same spans and that reidentify() restores
+the original text exactly.
+
+    python -m benchmarks.bench_pseudonyms [--kb 64,256,1024] [--reps 5]
+"""
+
+import argparse
+import random
+import time
+
+from proxy.detectors import detect_all
+from proxy.transformers import (
+    PSEUDONYMS, _mask_value, _select, configure_pseudonyms, redact_text,
+)
+
+from .corpus import pii_dense
+
+
+def _best(fn, reps: int) -> float:
+    best = float("inf")
+    for _ in range(reps):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _mode(mode: str, salt: str = "bench") -> None:
+    configure_pseudonyms(mode, salt)
+    PSEUDONYMS.clear()
+
+
+def check(text: str) -> int:
+    _mode("mask")
+    tags_mask: list = []
+    redact_text(text, tags_mask)
+    _mode("pseudonymise")
+    tags_pseudo: list = []
+    pseudo = redact_text(text, tags_pseudo)
+    assert tags_mask == tags_pseudo, (tags_mask, tags_pseudo)
+    assert PSEUDONYMS.reidentify(pseudo) == text, "reidentify did not restore the text"
+    assert not detect_all(pseudo), "pseudonymised text still has detections (tokens look like PII?)"
+    again: list = []
+    assert redact_text(text, again) == pseudo, "tokens are not deterministic"
+    _mode("mask")
+    return len(_select(detect_all(text)))
+
+
+def per_match(dets: list, reps: int) -> dict:
+    out = {}
+    _mode("mask")
+    out["mask_ns"] = _best(lambda: [_mask_value(d) for d in dets], reps) / len(dets) * 1e9
+    _mode("pseudonymise")
+    [_mask_value(d) for d in dets]
+    out["token_hit_ns"] = _best(lambda: [_mask_value(d) for d in dets], reps) / len(dets) * 1e9
+
+    def fresh():
+        PSEUDONYMS.set_salt(str(random.random()))
+        [_mask_value(d) for d in dets]
+    out["token_miss_ns"] = _best(fresh, reps) / len(dets) * 1e9
+    _mode("mask")
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--kb", default="64,256,1024", help="text sizes in KB")
+    ap.add_argument("--reps", type=int, default=5)
+    args = ap.parse_args()
+
+    print(f"{'size':>8} {'matches':>8} {'mask ms':>9} {'pseudo ms':>10} {'pseudo new ms':>14} {'overhead':>9}")
+    for kb in (int(x) for x in args.kb.split(",")):
+        text = pii_dense(kb * 1024, seed=kb)
+        n = check(text)
+
+        # modes interleaved per rep, so drift on a busy machine hits all three alike
+        best = {"mask": float("inf"), "pseudo": float("inf"), "new": float("inf")}
+        _mode("pseudonymise")
+        redact_text(text, [])
+        for _ in range(args.reps):
+            for name in best:
+                configure_pseudonyms("mask" if name == "mask" else "pseudonymise",
+                                     str(random.random()) if name == "new" else "bench")
+                t0 = time.perf_counter()
+                redact_text(text, [])
+                best[name] = min(best[name], time.perf_counter() - t0)
+        t_mask, t_pseudo, t_new = best["mask"], best["pseudo"], best["new"]
+        _mode("mask")
+        print(f"{kb:>6}KB {n:>8} {t_mask * 1e3:>9.2f} {t_pseudo * 1e3:>10.2f} {t_new * 1e3:>14.2f} "
+              f"{(t_pseudo / t_mask - 1) * 100:>+8.1f}%")
+
+    dets = _select(detect_all(pii_dense(256 * 1024, seed=3)))
+    pm = per_match(dets, args.reps)
+    print(f"\nper match ({len(dets)} matches): masker {pm['mask_ns']:.0f} ns, token (seen) {pm['token_hit_ns']:.0f} ns, "
+          f"token (new) {pm['token_miss_ns']:.0f} ns")
+    print("checks: same spans and tags in both modes, deterministic tokens, reidentify round-trips: ok")
+
+
+if __name__ == "__main__":
+    main()
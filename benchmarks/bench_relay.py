@@ -0,0 +1,96 @@
+"""
+/relay/chatgpt against a local stand-in upstream (benchmarks/relay_apps.py).
+
+For the upstream itself ("direct"), the old buffering relay ("legacy") and
+the pooled streaming relay ("relay"), reports:
+
+  - SSE: time to first byte and to the end of a timed event stream
+  - bulk: throughput of a large download
+  - small: latency of many tiny requests (connection reuse)
+
+    python -m benchmarks.bench_relay [--streams 20] [--events 40] [--interval-ms 25] [--mb 64] [--small 300]
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from .harness import percentile, proxy_server
+
+
+async def sse(client: httpx.AsyncClient, url: str, n: int) -> tuple[list[float], list[float]]:
+    ttfb, total = [], []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        async with client.stream("POST", url, content=b'{"messages": []}',
+                                 headers={"content-type": "application/json"}) as r:
+            first = None
+            async for _chunk in r.aiter_raw():
+                if first is None:
+                    first = time.perf_counter() - t0
+        ttfb.append(first or 0.0)
+        total.append(time.perf_counter() - t0)
+    return ttfb, total
+
+
+async def bulk(client: httpx.AsyncClient, url: str) -> float:
+    t0 = time.perf_counter()
+    n = 0
+    async with client.stream("GET", url) as r:
+        async for chunk in r.aiter_raw():
+            n += len(chunk)
+    return n / 1e6 / (time.perf_counter() - t0)
+
+
+async def small(client: httpx.AsyncClient, url: str, n: int) -> list[float]:
+    lat = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        (await client.get(url)).raise_for_status()
+        lat.append(time.perf_counter() - t0)
+    return lat
+
+
+async def measure(prefix: str, args) -> dict:
+    async with httpx.AsyncClient(timeout=120) as client:
+        q = f"?events={args.events}&interval_ms={args.interval_ms}"
+        ttfb, total = await sse(client, f"{prefix}/backend-api/conversation{q}", args.streams)
+        mbps = await bulk(client, f"{prefix}/backend-api/blob?mb={args.mb}")
+        lat = await small(client, f"{prefix}/backend-api/me", args.small)
+    return {
+        "ttfb_p50": percentile(ttfb, 50) * 1000, "ttfb_p99": percentile(ttfb, 99) * 1000,
+        "stream_p50": percentile(total, 50) * 1000, "mbps": mbps,
+        "small_p50": percentile(lat, 50) * 1000, "small_p99": percentile(lat, 99) * 1000,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--streams", type=int, default=20)
+    ap.add_argument("--events", type=int, default=40)
+    ap.add_argument("--interval-ms", type=float, default=25)
+    ap.add_argument("--mb", type=int, default=64)
+    ap.add_argument("--small", type=int, default=300)
+    args = ap.parse_args()
+
+    rows = {}
+    with proxy_server(app="benchmarks.relay_apps:upstream") as up:
+        env = {"PP_UPSTREAM_CHATGPT": up}
+        rows["direct"] = asyncio.run(measure(up, args))
+        with proxy_server(env, app="benchmarks.relay_apps:legacy") as base:
+            rows["legacy"] = asyncio.run(measure(base + "/relay/chatgpt", args))
+        with proxy_server(env) as base:
+            rows["relay"] = asyncio.run(measure(base + "/relay/chatgpt", args))
+
+    print(f"SSE: {args.events} events every {args.interval_ms} ms; bulk: {args.mb} MB\n")
+    print(f"{'target':<8} {'ttfb p50':>9} {'ttfb p99':>9} {'stream p50':>11} {'bulk MB/s':>10} "
+          f"{'small p50':>10} {'small p99':>10}")
+    for name, r in rows.items():
+        print(f"{name:<8} {r['ttfb_p50']:>9.1f} {r['ttfb_p99']:>9.1f} {r['stream_p50']:>11.1f} "
+              f"{r['mbps']:>10.1f} {r['small_p50']:>10.2f} {r['small_p99']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Latency the SSE redaction stage adds per upstream chunk.
+
+  - micro: SSERedactor.feed() time per chunk on a ChatGPT-style delta stream
+    (one event per chunk, as upstream flushes them), per window size; also
+    checks the reassembled text equals redact_text() of the whole reply
+  - http (--http): relay with PP_RELAY_REDACT_SSE=0/1 against the local
+    stand-in upstream; time to first byte, gaps between chunks, and the
+    proxy's own /relay/stats
+
+    python -m benchmarks.bench_sse [--events 2000] [--http --streams 10]
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from proxy.sse import RelayStats, SSERedactor
+from proxy.transformers import redact_text
+
+from .corpus import pii_dense, prose
+from .harness import percentile
+
+
+def delta_events(text: str, piece: int = 24) -> list[bytes]:
+    out = [b'event: delta_encoding\ndata: "v1"\n\n']
+    for i in range(0, len(text), piece):
+        op = {"p": "/message/content/parts/0", "o": "append", "v": text[i:i + piece]} if i == 0 else {"v": text[i:i + piece]}
+        out.append(f"event: delta\ndata: {json.dumps(op)}\n\n".encode())
+    out.append(b"data: [DONE]\n\n")
+    return out
+
+
+def reassemble(body: bytes) -> str:
+    text = []
+    for ev in body.split(b"\n\n"):
+        for ln in ev.decode().split("\n"):
+            if ln.startswith("data: {"):
+                v = json.loads(ln[6:]).get("v")
+                if isinstance(v, str):
+                    text.append(v)
+    return "".join(text)
+
+
+def run_micro(events: int) -> None:
+    print(f"{'corpus':<10} {'window':>6} {'chunks':>7} {'p50 us':>8} {'p99 us':>8} {'max us':>8} {'MB/s':>7} {'same':>5}")
+    for name, gen in (("prose", prose), ("pii_dense", pii_dense)):
+        text = gen(events * 24)
+        chunks = delta_events(text)
+        ref = redact_text(text, [])
+        for window in (64, 256, 1024):
+            stats = RelayStats()
+            r = SSERedactor(window, stats=stats)
+            lat = []
+            t0 = time.perf_counter()
+            out = []
+            for c in chunks:
+                t = time.perf_counter()
+                out.append(r.feed(c))
+                lat.append(time.perf_counter() - t)
+            out.append(r.close())
+            wall = time.perf_counter() - t0
+            same = reassemble(b"".join(out)) == ref
+            mb = sum(map(len, chunks)) / 1e6
+            print(f"{name:<10} {window:>6} {len(chunks):>7} {percentile(lat, 50) * 1e6:>8.1f} "
+                  f"{percentile(lat, 99) * 1e6:>8.1f} {max(lat) * 1e6:>8.1f} {mb / wall:>7.1f} {'yes' if same else 'NO':>5}")
+
+
+def run_http(streams: int, events: int, interval_ms: float) -> None:
+    import httpx
+
+    from .harness import proxy_server
+
+    async def one(client, url):
+        ttfb, gaps = None, []
+        t0 = last = time.perf_counter()
+        async with client.stream("POST", url, content=b"{}") as r:
+            async for _ in r.aiter_raw():
+                now = time.perf_counter()
+                if ttfb is None:
+                    ttfb = now - t0
+                else:
+                    gaps.append(now - last)
+                last = now
+        return ttfb, gaps
+
+    async def measure(base):
+        url = f"{base}/backend-api/conversation?events={events}&interval_ms={interval_ms}"
+        ttfb, gaps = [], []
+        async with httpx.AsyncClient(timeout=120) as client:
+            for _ in range(streams):
+                t, g = await one(client, url)
+                ttfb.append(t)
+                gaps.extend(g)
+        return ttfb, gaps
+
+    rows = []
+    with proxy_server(app="benchmarks.relay_apps:upstream") as up:
+        for redact in ("0", "1"):
+            with proxy_server({"PP_UPSTREAM_CHATGPT": up, "PP_RELAY_REDACT_SSE": redact}) as base:
+                ttfb, gaps = asyncio.run(measure(base + "/relay/chatgpt"))
+                stats = httpx.get(base + "/relay/stats").json()["sse"]
+                rows.append((f"redact={redact}", ttfb, gaps, stats))
+
+    print(f"\n{events} events every {interval_ms} ms, {streams} streams")
+    print(f"{'relay':<9} {'ttfb p50 ms':>12} {'gap p50 ms':>11} {'gap p99 ms':>11} {'stage p50 us':>13} {'stage p99 us':>13}")
+    for name, ttfb, gaps, st in rows:
+        print(f"{name:<9} {percentile(ttfb, 50) * 1000:>12.2f} {percentile(gaps, 50) * 1000:>11.2f} "
+              f"{percentile(gaps, 99) * 1000:>11.2f} {st['chunk_ms_p50'] * 1000:>13.1f} {st['chunk_ms_p99'] * 1000:>13.1f}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--events", type=int, default=2000)
+    ap.add_argument("--http", action="store_true")
+    ap.add_argument("--streams", type=int, default=10)
+    ap.add_argument("--interval-ms", type=float, default=10)
+    args = ap.parse_args()
+    run_micro(args.events)
+    if args.http:
+        run_http(args.streams, min(args.events, 200), args.interval_ms)
+
+
+if __name__ == "__main__":
+    main()
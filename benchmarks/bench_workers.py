@@ -0,0 +1,140 @@
+"""
+Throughput of the multi-worker launcher (python -m proxy.serve) at 1..N
+worker processes, against the plain single-process server, with the same
+CPU-bound /inspect mix (decision cache off so every request is scanned).
+
+Before timing, each multi-worker server is checked for shared state: every
+worker reports the same salt (also after POST /admin/salt/rotate), a body
+decided once is a shared-cache hit afterwards, and /metrics on any worker
+counts the requests of all of them.
+
+    python -m benchmarks.bench_workers [--workers 1,2,4] [--clients 8] [--requests 40]
+
+Scaling needs free cores: on a machine with fewer CPUs than workers the
+extra processes only add context switches.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+
+import httpx
+
+from .corpus import PAYLOADS
+from .harness import proxy_server, summarize
+
+MIX = ("plain_prompt", "pii_prompt", "conversation_20", "log_paste")
+
+
+def _payloads() -> list[dict]:
+    out = []
+    for name in MIX:
+        url, kind, build = PAYLOADS[name]
+        out.extend({"url": url, "bodyKind": kind, "mode": "warn", "body": build(seed)} for seed in range(1, 4))
+    return out
+
+
+async def _client(base: str, payloads: list[dict], n: int, offset: int, out: list[float]) -> None:
+    async with httpx.AsyncClient(timeout=120) as c:
+        for i in range(n):
+            p = payloads[(offset + i) % len(payloads)]
+            t0 = time.perf_counter()
+            r = await c.post(base + "/inspect", json=p)
+            r.raise_for_status()
+            out.append(time.perf_counter() - t0)
+
+
+async def _run(base: str, clients: int, per_client: int, payloads: list[dict]) -> dict:
+    lat: list[float] = []
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_client(base, payloads, per_client, k * 7, lat) for k in range(clients)))
+    return summarize(lat, time.perf_counter() - t0)
+
+
+def _states(base: str, n: int) -> list[dict]:
+    # new connection each time so the kernel spreads them over the workers
+    return [httpx.get(base + "/admin/state", headers={"Connection": "close"}).json() for _ in range(n)]
+
+
+def _wait_for_workers(base: str, n: int, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    while len(httpx.get(base + "/admin/state").json()["workers"]) < n:
+        if time.time() > deadline:
+            raise RuntimeError(f"only some of {n} workers came up")
+        time.sleep(0.2)
+
+
+def _requests_total(text: str) -> float:
+    return sum(float(m) for m in re.findall(r"^pp_inspect_requests_total\{.*\} (\S+)$", text, re.M))
+
+
+def check_shared_state(base: str, workers: int, refresh_s: float) -> dict:
+    seen = _states(base, 8 * workers)
+    salts = {s["salt_id"] for s in seen}
+    assert len(salts) == 1, f"workers disagree on the salt: {salts}"
+
+    rotated = httpx.post(base + "/admin/salt/rotate").json()["salt_id"]
+    time.sleep(refresh_s + 0.2)
+    after = {s["salt_id"] for s in _states(base, 8 * workers)}
+    assert after == {rotated}, f"rotation not seen by every worker: {after} vs {rotated}"
+
+    body = {"url": PAYLOADS["pii_prompt"][0], "bodyKind": "json", "mode": "warn",
+            "body": PAYLOADS["pii_prompt"][2](99)}
+    for _ in range(4 * workers):
+        httpx.post(base + "/inspect", json=body, headers={"Connection": "close"}).raise_for_status()
+    shared = httpx.get(base + "/cache/stats").json()["shared"]
+    assert shared["decisions"] >= 1
+
+    sent = 20
+    time.sleep(refresh_s + 0.5)      # the requests above must be published before the baseline
+    before = _requests_total(httpx.get(base + "/metrics").text)
+    for i in range(sent):
+        httpx.post(base + "/inspect", json={**body, "sendId": str(i)}, headers={"Connection": "close"})
+    time.sleep(refresh_s + 0.5)      # let every worker publish
+    counted = _requests_total(httpx.get(base + "/metrics").text) - before
+    assert counted == sent, f"/metrics counted {counted} of {sent} requests"
+
+    return {"workers_seen": len({s["worker"] for s in seen}), "salt_rotation": "ok",
+            "shared_cache_entries": shared["decisions"], "metrics_aggregated": "ok"}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", default="1,2,4", help="comma separated worker counts")
+    ap.add_argument("--clients", type=int, default=8, help="concurrent clients per worker")
+    ap.add_argument("--requests", type=int, default=40, help="requests per client")
+    ap.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = ap.parse_args()
+
+    payloads = _payloads()
+    refresh_s = 0.5
+    base_env = {"PP_DECISION_CACHE": "0", "PP_DECIDE_BACKEND": "inline", "PP_SHARED_REFRESH_S": str(refresh_s)}
+    results: dict = {"cpus": os.cpu_count()}
+
+    with proxy_server(base_env) as base:
+        asyncio.run(_run(base, 2, 5, payloads))
+        results["single_process"] = asyncio.run(_run(base, args.clients, args.requests, payloads))
+    print(f"{'single process':<16} {results['single_process']}")
+
+    for n in (int(x) for x in args.workers.split(",")):
+        with proxy_server({**base_env, "PP_DECISION_CACHE": "1"}, workers=n) as base:
+            _wait_for_workers(base, n)
+            results[f"check_{n}"] = check_shared_state(base, n, refresh_s)
+        with proxy_server(base_env, workers=n) as base:
+            _wait_for_workers(base, n)
+            asyncio.run(_run(base, 2 * n, 5, payloads))
+            results[f"workers_{n}"] = asyncio.run(_run(base, args.clients * n, args.requests, payloads))
+        print(f"{f'{n} worker(s)':<16} {results[f'workers_{n}']}  shared state: {results[f'check_{n}']}")
+
+    one = results.get("workers_1", results["single_process"])["rps"]
+    for n in (int(x) for x in args.workers.split(",")):
+        print(f"  {n} worker(s): {results[f'workers_{n}']['rps'] / one:.2f}x the 1-worker throughput")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Shared helpers for the HTTP benchmarks: start the proxy in a subprocess and
+summarise latency samples.
+"""
+
+import contextlib
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def proxy_server(env: dict | None = None, *, port: int | None = None, app: str = "proxy.app:app",
+                 extra_args: tuple = (), workers: int = 0):
+    """
+    Run uvicorn on 127.0.0.1 with the given PP_* overrides; yields the base URL.
+    Logs go to a throwaway file unless PP_LOG is set explicitly. workers > 0
+    starts the multi-worker launcher (proxy.serve) instead, state file included.
+    """
+    import httpx     # only the HTTP benchmarks need it
+
+    port = port or free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        full_env = {**os.environ, "PP_LOG": os.path.join(tmp, "events.jsonl"), **(env or {})}
+        if workers:
+            full_env.setdefault("PP_SHARED_STATE", os.path.join(tmp, "state.sqlite"))
+            cmd = [sys.executable, "-m", "proxy.serve", "--workers", str(workers)]
+        else:
+            cmd = [sys.executable, "-m", "uvicorn", app]
+        proc = subprocess.Popen(
+            [*cmd, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", *extra_args],
+            env=full_env,
+        )
+        base = f"http://127.0.0.1:{port}"
+        try:
+            deadline = time.time() + 30
+            while True:
+                try:
+                    if httpx.get(base + "/healthz", timeout=0.5).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if proc.poll() is not None or time.time() > deadline:
+                    raise RuntimeError("proxy did not start")
+                time.sleep(0.1)
+            yield base
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def percentile(samples: list[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    s = sorted(samples)
+    k = min(len(s) - 1, max(0, round(p / 100 * (len(s) - 1))))
+    return s[k]
+
+
+def summarize(latencies_s: list[float], wall_s: float) -> dict:
+    return {
+        "requests": len(latencies_s),
+        "rps": round(len(latencies_s) / wall_s, 1) if wall_s else 0.0,
+        "p50_ms": round(percentile(latencies_s, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies_s, 99) * 1000, 2),
+    }
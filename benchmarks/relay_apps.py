@@ -0,0 +1,90 @@
+"""
+ASGI apps for the relay benchmark (run with uvicorn via harness.proxy_server):
+
+  - upstream: a local stand-in for chatgpt.com with an SSE endpoint that
+    emits events on a timer, a bulk download endpoint and a tiny JSON one
+  - legacy:   the relay as it was before the pooled streaming client (fresh
+    AsyncClient per request, whole response buffered), for comparison
+"""
+
+import asyncio
+import json
+import os
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+
+upstream = FastAPI()
+
+
+@upstream.get("/healthz")
+async def _up_health():
+    return PlainTextResponse("ok")
+
+
+_WORDS = ("the", "report", "is", "ready", "please", "review", "it", "before", "friday", "and", "reply")
+_PII = ("mail me at jane.roe@example.org", "call 0512345678", "ask Acme Widgets Inc")
+
+
+@upstream.api_route("/backend-api/conversation", methods=["GET", "POST"])
+async def _sse(events: int = 40, interval_ms: float = 25, size: int = 120, pii_every: int = 10):
+    """ChatGPT delta-encoded stream: `events` text deltas, one every `interval_ms`."""
+    async def gen():
+        yield b'event: delta_encoding\ndata: "v1"\n\n'
+        for i in range(events):
+            words = []
+            while sum(len(w) + 1 for w in words) < size:
+                words.append(_WORDS[(i + len(words)) % len(_WORDS)])
+            text = " ".join(words) + " "
+            if pii_every and i % pii_every == pii_every - 1:
+                text += _PII[i % len(_PII)] + " "
+            op = {"p": "/message/content/parts/0", "o": "append", "v": text} if i == 0 else {"v": text}
+            yield f"event: delta\ndata: {json.dumps(op)}\n\n".encode()
+            await asyncio.sleep(interval_ms / 1000)
+        yield b'data: {"type": "message_stream_complete"}\n\n'
+        yield b"data: [DONE]\n\n"
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
+
+@upstream.get("/backend-api/blob")
+async def _blob(mb: int = 32):
+    chunk = b"\0" * (64 * 1024)
+
+    async def gen():
+        for _ in range(mb * 16):
+            yield chunk
+    return StreamingResponse(gen(), media_type="application/octet-stream")
+
+
+@upstream.get("/backend-api/me")
+async def _me():
+    return JSONResponse({"id": "user-1", "name": "bench"})
+
+
+# ---- legacy relay (verbatim behaviour of the old /relay/chatgpt) ----
+
+legacy = FastAPI()
+_UPSTREAM = os.getenv("PP_UPSTREAM_CHATGPT", "https://chatgpt.com").rstrip("/")
+_HOP_DROP = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade", "content-length",
+}
+
+
+@legacy.get("/healthz")
+async def _legacy_health():
+    return PlainTextResponse("ok")
+
+
+@legacy.api_route("/relay/chatgpt/{path:path}", methods=["GET", "POST"])
+async def _legacy_relay(path: str, request: Request):
+    headers_in = {k: v for k, v in request.headers.items() if k.lower() not in _HOP_DROP}
+    raw = await request.body()
+    query = request.url.query
+    url = f"{_UPSTREAM}/{path}" + (f"?{query}" if query else "")
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        r = await client.request(request.method, url, headers=headers_in,
+                                 content=(raw if request.method not in ("GET", "HEAD") else None))
+    return Response(content=r.content, status_code=r.status_code,
+                    headers={"Content-Type": r.headers.get("content-type", "application/octet-stream")})
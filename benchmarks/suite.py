@@ -0,0 +1,220 @@
+"""
+One-shot benchmark suite with machine-readable results, for comparing runs
+across commits.
+
+  micro  in-process timings per corpus payload (benchmarks.corpus.PAYLOADS):
+         detect_all on the text, json_transform(redact_text), the binary
+         classifier, and decide() end to end; memo/index caches off so
+         repeats measure the real work
+  macro  concurrent HTTP clients against a locally started proxy sending a
+         weighted mix of those payloads (prepare pings and short prompts
+         dominate, as in real traffic); decision cache off
+
+    python -m benchmarks.suite [--quick] [--no-macro] [--out results.json]
+    python -m benchmarks.suite --compare base.json new.json [--threshold 10]
+
+Results are JSON: {"meta": {...commit, python, codec...}, "micro": {...},
+"macro": {...}}. --compare prints the ratio per metric and exits 1 if any
+got slower by more than --threshold percent.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+from .corpus import PAYLOADS
+from .harness import proxy_server, summarize
+
+# how often each payload shows up in the macro mix
+MIX = {"prepare": 8, "plain_prompt": 6, "pii_prompt": 3, "conversation_20": 3, "conversation_200": 1,
+       "multimodal": 1, "log_paste": 1}
+
+
+def _meta(args) -> dict:
+    from proxy import codec
+
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], capture_output=True, text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "codec": codec.BACKEND,
+        "args": vars(args),
+    }
+
+
+def _time(fn, min_s: float, max_reps: int) -> dict:
+    """Repeat fn() for at least min_s (and once at least); per-call stats in microseconds."""
+    samples = []
+    deadline = time.perf_counter() + min_s
+    while not samples or (time.perf_counter() < deadline and len(samples) < max_reps):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return {
+        "reps": len(samples),
+        "min_us": round(min(samples) * 1e6, 2),
+        "median_us": round(statistics.median(samples) * 1e6, 2),
+    }
+
+
+def run_micro(min_s: float, max_reps: int) -> dict:
+    from proxy.conversations import configure_conversations
+    from proxy.detectors import detect_all
+    from proxy.policy import _json_declares_or_embeds_binary, decide
+    from proxy.transformers import NOT_JSON, configure_redact_memo, json_transform, parse_body, redact_text
+
+    configure_redact_memo(0)
+    configure_conversations(0, 0, 0)
+    out = {}
+    try:
+        for name, (url, kind, build) in PAYLOADS.items():
+            body = build(1)
+            parsed = parse_body(body)
+            res = {"bytes": len(body.encode())}
+            if parsed is NOT_JSON:
+                res["detect_all"] = _time(lambda: detect_all(body), min_s, max_reps)
+            res["json_transform"] = _time(lambda: json_transform(body, redact_text), min_s, max_reps)
+            if parsed is not NOT_JSON:
+                res["binary_check"] = _time(lambda: _json_declares_or_embeds_binary(parsed), min_s, max_reps)
+            res["decide"] = _time(lambda: decide("warn", kind, url, body), min_s, max_reps)
+            out[name] = res
+            print(f"  micro {name:<17} decide median {res['decide']['median_us']:>10.1f} us", file=sys.stderr)
+    finally:
+        configure_redact_memo(32 << 20)
+        configure_conversations(64 << 20, 1024, 1800.0)
+    return out
+
+
+async def _macro_client(base: str, work: list, lat: dict) -> None:
+    import httpx
+
+    async with httpx.AsyncClient(timeout=120) as c:
+        for name, payload in work:
+            t0 = time.perf_counter()
+            r = await c.post(base + "/inspect", json=payload)
+            r.raise_for_status()
+            lat[name].append(time.perf_counter() - t0)
+
+
+def run_macro(clients: int, requests: int, backend: str) -> dict:
+    rng = random.Random(7)
+    names = [n for n, w in MIX.items() for _ in range(w)]
+    bodies = {n: [PAYLOADS[n][2](seed) for seed in range(1, 9)] for n in MIX}
+    work = []
+    for i in range(requests):
+        n = rng.choice(names)
+        url, kind, _ = PAYLOADS[n]
+        work.append((n, {"url": url, "bodyKind": kind, "mode": "warn", "body": bodies[n][i % 8],
+                         "sendId": str(i), "tabId": i % clients}))
+
+    lat: dict = {n: [] for n in MIX}
+    env = {"PP_DECIDE_BACKEND": backend, "PP_DECISION_CACHE": "0"}
+    with proxy_server(env) as base:
+        asyncio.run(_macro_client(base, work[:20], {n: [] for n in MIX}))   # warm up
+        t0 = time.perf_counter()
+
+        async def go():
+            await asyncio.gather(*(_macro_client(base, work[k::clients], lat) for k in range(clients)))
+        asyncio.run(go())
+        wall = time.perf_counter() - t0
+    every = [x for v in lat.values() for x in v]
+    return {
+        "backend": backend,
+        "clients": clients,
+        "overall": summarize(every, wall),
+        "per_payload": {n: summarize(v, wall) for n, v in lat.items() if v},
+    }
+
+
+# ---- comparison ----
+
+def _flatten(d: dict, prefix: str = "") -> dict:
+    out = {}
+    for k, v in d.items():
+        key = f"{prefix}.{k}" if prefix else k
+        if isinstance(v, dict):
+            out.update(_flatten(v, key))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[key] = v
+    return out
+
+
+def compare(base_path: str, new_path: str, threshold: float) -> int:
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    a = _flatten({"micro": base.get("micro", {}), "macro": base.get("macro", {})})
+    b = _flatten({"micro": new.get("micro", {}), "macro": new.get("macro", {})})
+    print(f"base {base['meta'].get('commit', '')[:10]}  vs  new {new['meta'].get('commit', '')[:10]}")
+    print(f"{'metric':<60} {'base':>12} {'new':>12} {'change':>8}")
+    worse = 0
+    for key in sorted(a.keys() & b.keys()):
+        # only timings and throughput; counts/sizes aren't performance
+        lower_better = key.endswith(("_us", "_ms"))
+        if not (lower_better or key.endswith("rps")):
+            continue
+        old, cur = a[key], b[key]
+        if not old:
+            continue
+        change = (cur - old) / old * 100
+        slower = change > threshold if lower_better else change < -threshold
+        worse += slower
+        print(f"{key:<60} {old:>12.2f} {cur:>12.2f} {change:>+7.1f}%{'  <-- slower' if slower else ''}")
+    print(f"\n{worse} metric(s) slower by more than {threshold:g}%")
+    return 1 if worse else 0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", help="write results here (default: stdout)")
+    ap.add_argument("--quick", action="store_true", help="shorter runs, for a smoke check")
+    ap.add_argument("--no-micro", action="store_true")
+    ap.add_argument("--no-macro", action="store_true")
+    ap.add_argument("--min-s", type=float, default=0.5, help="minimum time per micro measurement")
+    ap.add_argument("--clients", type=int, default=16)
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--backend", default="thread")
+    ap.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"))
+    ap.add_argument("--threshold", type=float, default=10.0, help="percent, for --compare")
+    args = ap.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    min_s, max_reps, requests = args.min_s, 10_000, args.requests
+    if args.quick:
+        min_s, max_reps, requests = 0.05, 50, min(requests, 200)
+
+    results = {"meta": _meta(args)}
+    if not args.no_micro:
+        results["micro"] = run_micro(min_s, max_reps)
+    if not args.no_macro:
+        results["macro"] = run_macro(args.clients, requests, args.backend)
+        print(f"  macro {results['macro']['overall']}", file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
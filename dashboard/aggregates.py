@@ -0,0 +1,369 @@
+"""
+Incremental aggregates over the proxy's event log for the dashboard.
+
+LiveAggregates tails events.jsonl by byte offset, parses only lines appended
+since the last refresh and keeps:
+
+  - one SendGroup per (send_id, tab_id), same fields as the old pandas groupby
+  - running totals and per-bucket (default 1 minute) totals keyed by each
+    group's last_ts, so metrics for any time window are a sum over buckets
+
+With segments=False only the live file is folded (closed segments are
+queried from Parquet, see columnar.py) and the state resets on rotation.
+
+A refresh costs O(new lines), not O(log size). Only the max_groups most
+recently updated groups are kept as objects; older ones stay counted in the
+totals and buckets but are treated as finished (a send spans seconds, so a
+late event for an evicted group is rare and just counts as a new send).
+
+Rotation is noticed through the segment manifest rather than the inode: the
+inode of a rotated file is freed once it's compressed, and often handed
+straight to the new live file.
+"""
+
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from proxy.eventlog import _open_segment, manifest_path, read_manifest, segment_files
+
+_HEAD_BYTES = 128
+
+
+def normalize_detected(obj) -> list[str]:
+    detected = obj.get("detected", [])
+    if isinstance(detected, str):
+        return [d.strip() for d in detected.split(",") if d.strip()]
+    if isinstance(detected, list):
+        return [str(d).strip() for d in detected if str(d).strip()]
+    return []
+
+
+def infer_status(obj) -> int:
+    # Prefer explicit status if present
+    if isinstance(obj.get("status", None), int):
+        return obj["status"]
+    # Otherwise infer from action
+    action = (obj.get("action") or "").lower()
+    return 403 if action == "block" else 200
+
+
+_INT64 = 1 << 63
+
+
+def group_key(obj, fallback: str) -> tuple:
+    """
+    (send_id, tab_id) of an event, normalised the same way for the live fold
+    and the Parquet columns: send_id as a string (older clients sent numbers),
+    tab_id as an int or None.
+    """
+    send_id = obj.get("send_id")
+    tab = obj.get("tab_id")
+    if isinstance(tab, str):
+        try:
+            tab = int(tab)
+        except ValueError:
+            tab = None
+    if not isinstance(tab, int) or isinstance(tab, bool) or not -_INT64 <= tab < _INT64:
+        tab = None
+    return (str(send_id) if send_id else fallback, tab)
+
+
+def route_from_obj(obj) -> str:
+    if obj.get("route"):
+        return obj["route"]
+    url = obj.get("url") or ""
+    return url.split("?")[0] if url else ""
+
+
+class SendGroup:
+    """All events of one (send_id, tab_id), folded as they arrive."""
+    __slots__ = ("send_id", "tab_id", "first_ts", "last_ts", "routes", "duration_ms",
+                 "final_status", "final_action", "actions", "detected")
+
+    def __init__(self, send_id, tab_id, ts: float):
+        self.send_id = send_id
+        self.tab_id = tab_id
+        self.first_ts = ts
+        self.last_ts = ts
+        self.routes: Counter = Counter()
+        self.duration_ms = 0.0
+        self.final_status = 0
+        self.final_action = ""
+        self.actions: list[str] = []
+        self.detected: set[str] = set()
+
+    def add(self, ts: float, route: str, duration_ms: float, status: int, action: str, detected: list[str]):
+        self.first_ts = min(self.first_ts, ts)
+        if ts >= self.last_ts:
+            self.last_ts = ts
+            self.final_action = action
+        self.routes[route] += 1
+        self.duration_ms += duration_ms
+        self.final_status = max(self.final_status, status)     # worst status wins
+        if action and action not in self.actions:
+            self.actions.append(action)
+        self.detected.update(detected)
+
+    def merge(self, other: "SendGroup") -> "SendGroup":
+        """The group both halves would have made together (e.g. either side of a rotation)."""
+        first, second = (self, other) if self.first_ts <= other.first_ts else (other, self)
+        g = SendGroup(self.send_id, self.tab_id, first.first_ts)
+        g.last_ts = max(self.last_ts, other.last_ts)
+        g.final_action = (other if other.last_ts >= self.last_ts else self).final_action
+        g.routes = self.routes + other.routes
+        g.duration_ms = self.duration_ms + other.duration_ms
+        g.final_status = max(self.final_status, other.final_status)
+        g.actions = first.actions + [a for a in second.actions if a not in first.actions]
+        g.detected = self.detected | other.detected
+        return g
+
+    def row(self) -> dict:
+        return {
+            "last_ts": self.last_ts,
+            "send_id": self.send_id,
+            "tab_id": self.tab_id,
+            "route": self.routes.most_common(1)[0][0] if self.routes else "",
+            "duration_ms": self.duration_ms,
+            "final_status": self.final_status,
+            "final_action": self.final_action,
+            "actions": ",".join(self.actions),
+            "detected": ",".join(sorted(self.detected)),
+        }
+
+
+class _Totals:
+    __slots__ = ("sends", "duration_ms", "ok", "blocked", "detections")
+
+    def __init__(self):
+        self.sends = 0
+        self.duration_ms = 0.0
+        self.ok = 0
+        self.blocked = 0
+        self.detections: Counter = Counter()
+
+    def apply(self, g: SendGroup, sign: int) -> None:
+        self.sends += sign
+        self.duration_ms += sign * g.duration_ms
+        self.ok += sign * (g.final_status == 200)
+        self.blocked += sign * (g.final_status >= 400)
+        for d in g.detected:
+            self.detections[d] += sign
+            if not self.detections[d]:
+                del self.detections[d]
+
+    def add(self, other: "_Totals") -> "_Totals":
+        self.sends += other.sends
+        self.duration_ms += other.duration_ms
+        self.ok += other.ok
+        self.blocked += other.blocked
+        self.detections.update(other.detections)
+        return self
+
+    def summary(self) -> dict:
+        return {
+            "sends": self.sends,
+            "avg_latency_ms": round(self.duration_ms / self.sends, 1) if self.sends else 0,
+            "ok_rate": self.ok / self.sends * 100 if self.sends else 0,
+            "blocked": self.blocked,
+            "detections": dict(self.detections),
+        }
+
+
+class LiveAggregates:
+    def __init__(self, path: str, *, bucket_s: int = 60, since_ts: Optional[float] = None,
+                 max_groups: int = 100_000, segments: bool = True):
+        self.path = path
+        self.segments = segments      # False: live file only (closed segments are queried elsewhere)
+        self.bucket_s = bucket_s
+        self.since_ts = since_ts
+        self.max_groups = max_groups
+        self.groups: "OrderedDict[tuple, SendGroup]" = OrderedDict()   # least recently updated first
+        self.totals = _Totals()
+        self.buckets: dict[int, _Totals] = {}
+        self.lines = 0
+        self._head = b""          # first bytes of the live file we are tailing
+        self._offset = 0
+        self._manifest_sig: Optional[tuple] = None
+        self._seen_segments: set[str] = set()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    # ---- reading ----
+
+    def refresh(self) -> int:
+        """Consume everything appended since the last call; returns new line count."""
+        with self._lock:
+            before = self.lines
+            if not self._loaded:
+                self._initial_load()
+            else:
+                self._tail()
+            return self.lines - before
+
+    def _initial_load(self) -> None:
+        # closed segments (only those overlapping since_ts), then the live file
+        for fp in segment_files(self.path, self.since_ts) if self.segments else ():
+            if fp == self.path:
+                continue
+            with _open_segment(fp) as f:
+                for line in f:
+                    self._consume(line)
+        self._seen_segments = {e["file"] for e in read_manifest(self.path)["segments"]}
+        self._new_segments()    # remember the manifest signature
+        self._read_live()
+        self._loaded = True
+
+    def _tail(self) -> None:
+        # Rotation shows up as a new manifest entry (written before the next
+        # live file is created), so check that first, then read the live file.
+        new = self._new_segments()
+        if new and self.segments:
+            self._catch_up_rotated(new)
+        elif new:
+            self._reset()       # what we had is a closed segment now
+        self._read_live()
+
+    def _reset(self) -> None:
+        for e in read_manifest(self.path)["segments"]:
+            self._seen_segments.add(e["file"])
+        self.groups.clear()
+        self.totals = _Totals()
+        self.buckets.clear()
+        self._head, self._offset = b"", 0
+
+    def _new_segments(self) -> list[dict]:
+        try:
+            st = os.stat(manifest_path(self.path))
+            sig = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            return []
+        if sig == self._manifest_sig:
+            return []
+        self._manifest_sig = sig
+        return [e for e in read_manifest(self.path)["segments"] if e["file"] not in self._seen_segments]
+
+    def _catch_up_rotated(self, new: list[dict]) -> None:
+        # The file we were tailing became the first new segment: finish it from
+        # our offset; any further new segments are read whole.
+        d = os.path.dirname(self.path)
+        for k, e in enumerate(new):
+            self._seen_segments.add(e["file"])
+            try:
+                with _open_segment(os.path.join(d, e["file"])) as f:
+                    raw = f.buffer
+                    if k == 0:
+                        _skip_bytes(raw, self._offset)
+                    for line in raw:
+                        self._consume(line.decode("utf-8", "replace"))
+            except FileNotFoundError:
+                continue
+        self._head, self._offset = b"", 0
+
+    def _read_live(self) -> None:
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            # Identify the file by its first bytes: inode numbers get reused
+            # as soon as a rotated segment is compressed and removed.
+            if self._offset:
+                if f.read(len(self._head)) != self._head:
+                    return      # replaced under us; the manifest catches it up next time
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break       # half-written line: pick it up next time
+                if self._offset == 0:
+                    self._head = line[:_HEAD_BYTES]
+                self._offset += len(line)
+                self._consume(line.decode("utf-8", "replace"))
+
+    # ---- folding ----
+
+    def _consume(self, line: str) -> None:
+        i = self.lines
+        self.lines += 1
+        try:
+            obj = json.loads(line)
+            ts = obj.get("ts", time.time())
+            ts = float(ts)
+            if self.since_ts is not None and ts < self.since_ts:
+                return
+            key = group_key(obj, f"_no_send_id_{i}")
+            args = (ts, route_from_obj(obj), float(obj.get("duration_ms", 0) or 0),
+                    infer_status(obj), (obj.get("action") or "").lower(), normalize_detected(obj))
+        except Exception:
+            return
+
+        g = self.groups.get(key)
+        if g is None:
+            g = self.groups[key] = SendGroup(key[0], key[1], ts)
+            if len(self.groups) > self.max_groups:
+                self.groups.popitem(last=False)
+        else:
+            self._apply(g, -1)
+            self.groups.move_to_end(key)
+        g.add(*args)
+        self._apply(g, +1)
+
+    def _apply(self, g: SendGroup, sign: int) -> None:
+        self.totals.apply(g, sign)
+        b = int(g.last_ts // self.bucket_s)
+        t = self.buckets.get(b)
+        if t is None:
+            t = self.buckets[b] = _Totals()
+        t.apply(g, sign)
+        if not t.sends:
+            del self.buckets[b]
+
+    # ---- queries ----
+
+    def window_totals(self, start_ts: Optional[float] = None) -> _Totals:
+        if start_ts is None:
+            return _Totals().add(self.totals)
+        first = int(start_ts // self.bucket_s)
+        out = _Totals()
+        for b, t in self.buckets.items():
+            if b >= first:
+                out.add(t)
+        return out
+
+    def summary(self, start_ts: Optional[float] = None) -> dict:
+        return self.window_totals(start_ts).summary()
+
+    def latency_buckets(self, start_ts: Optional[float] = None) -> dict[int, tuple[float, int]]:
+        """bucket -> (summed send latency in ms, sends)"""
+        first = None if start_ts is None else int(start_ts // self.bucket_s)
+        return {b: (t.duration_ms, t.sends) for b, t in self.buckets.items()
+                if t.sends and (first is None or b >= first)}
+
+    def latency_series(self, start_ts: Optional[float] = None) -> list[tuple[float, float]]:
+        """(bucket start ts, average send latency in ms) per bucket, oldest first."""
+        return latency_series(self.latency_buckets(start_ts), self.bucket_s)
+
+    def recent(self, n: int = 30, start_ts: Optional[float] = None) -> list[dict]:
+        out = []
+        for g in reversed(self.groups.values()):
+            if len(out) >= n:
+                break
+            if start_ts is None or g.last_ts >= start_ts:
+                out.append(g.row())
+        return out
+
+
+def latency_series(buckets: dict[int, tuple[float, int]], bucket_s: int) -> list[tuple[float, float]]:
+    return [(b * bucket_s, dur / n) for b, (dur, n) in sorted(buckets.items()) if n]
+
+
+def _skip_bytes(f, n: int) -> None:
+    while n > 0:
+        chunk = f.read(min(n, 1 << 20))
+        if not chunk:
+            return
+        n -= len(chunk)
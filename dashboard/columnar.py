@@ -0,0 +1,401 @@
+"""
+Columnar (Parquet) copies of the closed event-log segments, and vectorised
+dashboard queries over them.
+
+Compaction turns every segment listed in events.manifest.json into
+events.<utc>-<n>.parquet next to it: one row per event, sorted by ts, with
+`detected` as a list<string> column and route/action dictionary-encoded.
+It is idempotent and also drops Parquet files whose segment was removed by
+retention. Run it from the dashboard (on each rerun; a no-op unless the proxy
+rotated) or as a job:
+
+    python -m dashboard.columnar [--log proxy/logs/events.jsonl] [--watch 60]
+
+ColumnarHistory answers the dashboard's questions for a time window with
+Arrow compute kernels: files are pruned by the manifest's ts ranges and
+row groups by Parquet statistics (predicate pushdown on ts), and the
+per-(send_id, tab_id) grouping is a hash aggregation rather than per-row
+Python. Closed segments that aren't compacted yet are converted in memory so
+results never have a gap. The live file is left to LiveAggregates.
+"""
+
+from __future__ import annotations
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Iterable, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:     # optional: the dashboard falls back to JSONL-only aggregates
+    pa = None
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dashboard.aggregates import SendGroup, _Totals, group_key, infer_status, normalize_detected, route_from_obj
+from proxy import codec
+from proxy.eventlog import _open_segment, _stem, manifest_path, read_manifest
+
+ROW_GROUP_SIZE = 64 * 1024
+_INT32 = 1 << 31
+_COMPACT_LOCK = threading.Lock()   # dashboard sessions share one process
+
+if pa is not None:
+    SCHEMA = pa.schema([
+        ("ts", pa.float64()),
+        ("send_id", pa.string()),
+        ("tab_id", pa.int64()),
+        ("route", pa.dictionary(pa.int32(), pa.string())),
+        ("duration_ms", pa.float64()),
+        ("status", pa.int32()),
+        ("action", pa.dictionary(pa.int32(), pa.string())),
+        ("detected", pa.list_(pa.string())),
+    ])
+
+
+def available() -> bool:
+    return pa is not None
+
+
+# ---- compaction ---------------------------------------------------------------
+
+def parquet_name(segment_file: str) -> str:
+    """events.<stamp>-<n>.jsonl[.gz|.zst] -> events.<stamp>-<n>.parquet"""
+    base = segment_file
+    for sfx in (".gz", ".zst"):
+        if base.endswith(sfx):
+            base = base[:-len(sfx)]
+    if base.endswith(".jsonl"):
+        base = base[:-len(".jsonl")]
+    return base + ".parquet"
+
+
+def events_to_table(lines: Iterable[str], key_prefix: str = "") -> "pa.Table":
+    """Parse JSONL event lines into a ts-sorted table (bad lines are skipped)."""
+    cols: dict[str, list] = {name: [] for name in SCHEMA.names}
+    for i, line in enumerate(lines):
+        try:
+            obj = codec.loads(line)
+            ts = float(obj.get("ts", time.time()))
+            # coerced to the schema's types: one odd event must not sink the whole table
+            send_id, tab = group_key(obj, f"_no_send_id_{key_prefix}{i}")
+            status = infer_status(obj)
+            if not -_INT32 <= status < _INT32:
+                continue
+            row = (
+                ts,
+                send_id,
+                tab,
+                str(route_from_obj(obj)),
+                float(obj.get("duration_ms", 0) or 0),
+                status,
+                (obj.get("action") or "").lower(),
+                normalize_detected(obj),
+            )
+        except Exception:
+            continue
+        for name, v in zip(SCHEMA.names, row):
+            cols[name].append(v)
+    t = pa.table(cols, schema=SCHEMA)
+    return t.sort_by("ts") if t.num_rows else t
+
+
+def _read_segment(fp: str) -> "pa.Table":
+    with _open_segment(fp) as f:
+        return events_to_table(f, key_prefix=os.path.basename(fp) + ":")
+
+
+def compact(path: str) -> list[str]:
+    """
+    Write a Parquet file for every closed segment that doesn't have one and
+    remove Parquet files whose segment is gone. Returns the files written.
+    """
+    with _COMPACT_LOCK:
+        return _compact(path)
+
+
+def _compact(path: str) -> list[str]:
+    d = os.path.dirname(path)
+    written, wanted = [], set()
+    for e in read_manifest(path)["segments"]:
+        name = parquet_name(e["file"])
+        wanted.add(name)
+        out = os.path.join(d, name)
+        if os.path.exists(out):
+            continue
+        try:
+            table = _read_segment(os.path.join(d, e["file"]))
+        except FileNotFoundError:
+            continue    # expired under us
+        tmp = out + ".tmp"
+        pq.write_table(table, tmp, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+        os.replace(tmp, out)
+        written.append(out)
+    for fp in glob.glob(os.path.join(d, glob.escape(_stem(path)) + ".*.parquet")):
+        if os.path.basename(fp) not in wanted:
+            try:
+                os.remove(fp)
+            except OSError:
+                pass
+    return written
+
+
+# ---- queries ----------------------------------------------------------------
+
+_GROUP_KEYS = ["send_id", "tab_id"]
+
+
+class ColumnarHistory:
+    """
+    Window queries over the closed segments. Results for a window are cached
+    until the manifest changes; windows are floored to `bucket_s` so a window
+    ending "now" keeps hitting the cache between rotations.
+    """
+
+    def __init__(self, path: str, *, bucket_s: int = 60):
+        if pa is None:
+            raise RuntimeError("columnar history needs pyarrow (pip install pyarrow)")
+        self.path = path
+        self.bucket_s = bucket_s
+        self._sig: Optional[tuple] = None
+        self._cache: dict = {}
+        self._converted: dict[str, "pa.Table"] = {}   # uncompacted segments, in memory
+
+    def _check_manifest(self) -> None:
+        try:
+            st = os.stat(manifest_path(self.path))
+            sig = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            sig = None
+        if sig != self._sig:
+            self._sig = sig
+            self._cache.clear()
+
+    def _floor(self, start_ts: Optional[float]) -> Optional[float]:
+        return None if start_ts is None else (start_ts // self.bucket_s) * self.bucket_s
+
+    def rows(self, start_ts: Optional[float] = None) -> "pa.Table":
+        """Event rows of the closed segments with ts >= start_ts."""
+        d = os.path.dirname(self.path)
+        files, tables, live = [], [], set()
+        for e in read_manifest(self.path)["segments"]:
+            hi = e.get("max_ts")
+            if start_ts is not None and hi is not None and hi < start_ts:
+                continue
+            pq_fp = os.path.join(d, parquet_name(e["file"]))
+            if os.path.exists(pq_fp):
+                files.append(pq_fp)
+                continue
+            # not compacted yet: convert once and keep it until it is
+            live.add(e["file"])
+            t = self._converted.get(e["file"])
+            if t is None:
+                try:
+                    t = self._converted[e["file"]] = _read_segment(os.path.join(d, e["file"]))
+                except FileNotFoundError:
+                    continue
+            tables.append(t if start_ts is None else t.filter(pc.field("ts") >= start_ts))
+        for name in list(self._converted):
+            if name not in live:
+                del self._converted[name]
+        if files:
+            dataset = ds.dataset(files, schema=SCHEMA, format="parquet")
+            flt = None if start_ts is None else ds.field("ts") >= start_ts
+            tables.insert(0, dataset.to_table(filter=flt))
+        if not tables:
+            return SCHEMA.empty_table()
+        return pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+
+    def _query(self, start_ts: Optional[float]) -> dict:
+        self._check_manifest()
+        start_ts = self._floor(start_ts)
+        hit = self._cache.get(start_ts)
+        if hit is not None:
+            return hit
+        rows = self.rows(start_ts)
+        groups = rows.group_by(_GROUP_KEYS, use_threads=False).aggregate(
+            [("ts", "max"), ("duration_ms", "sum"), ("status", "max")]
+        )
+        res = {"rows": rows, "groups": groups}
+        if len(self._cache) >= 4:
+            self._cache.clear()     # windows move; don't pin old row sets
+        self._cache[start_ts] = res
+        return res
+
+    def window_totals(self, start_ts: Optional[float] = None) -> _Totals:
+        q = self._query(start_ts)
+        if "totals" in q:
+            return _Totals().add(q["totals"])
+        rows, groups = q["rows"], q["groups"]
+        t = _Totals()
+        t.sends = groups.num_rows
+        if t.sends:
+            status = groups["status_max"]
+            t.duration_ms = pc.sum(groups["duration_ms_sum"]).as_py() or 0.0
+            t.ok = pc.sum(pc.equal(status, 200).cast(pa.int64())).as_py() or 0
+            t.blocked = pc.sum(pc.greater_equal(status, 400).cast(pa.int64())).as_py() or 0
+            t.detections.update(_detections_per_group(rows))
+        q["totals"] = t
+        return _Totals().add(t)
+
+    def summary(self, start_ts: Optional[float] = None) -> dict:
+        return self.window_totals(start_ts).summary()
+
+    def latency_buckets(self, start_ts: Optional[float] = None) -> dict[int, tuple[float, int]]:
+        """bucket (by each group's last ts) -> (summed send latency in ms, sends)"""
+        q = self._query(start_ts)
+        if "buckets" not in q:
+            g = q["groups"]
+            b = pc.floor(pc.divide(g["ts_max"], float(self.bucket_s))).cast(pa.int64())
+            agg = pa.table({"b": b, "dur": g["duration_ms_sum"]}).group_by("b").aggregate(
+                [("dur", "sum"), ("dur", "count")]
+            )
+            q["buckets"] = dict(zip(
+                agg["b"].to_pylist(),
+                zip(agg["dur_sum"].to_pylist(), agg["dur_count"].to_pylist()),
+            ))
+        return dict(q["buckets"])
+
+    def recent(self, n: int = 30, start_ts: Optional[float] = None) -> list[dict]:
+        """The n groups with the latest last_ts, as LiveAggregates rows."""
+        q = self._query(start_ts)
+        rows, groups = q["rows"], q["groups"]
+        if not groups.num_rows:
+            return []
+        top = pc.select_k_unstable(groups, min(n, groups.num_rows), [("ts_max", "descending")])
+        top = groups.take(top)
+        # only the handful of selected groups is folded in Python
+        sel = rows.filter(pc.is_in(rows["send_id"], value_set=top["send_id"]))
+        by_key: dict[tuple, list] = {}
+        for r in sel.to_pylist():
+            by_key.setdefault((r["send_id"], r["tab_id"]), []).append(r)
+        out = []
+        for key in zip(top["send_id"].to_pylist(), top["tab_id"].to_pylist()):
+            out.append(_group_row(key, by_key.get(key, [])))
+        out.sort(key=lambda r: r["last_ts"], reverse=True)
+        return out
+
+
+    def groups_for(self, keys: set, start_ts: Optional[float] = None) -> dict[tuple, SendGroup]:
+        """SendGroups of the window's rows for the given (send_id, tab_id) keys."""
+        if not keys:
+            return {}
+        rows = self._query(start_ts)["rows"]
+        ids = pa.array(sorted({k[0] for k in keys}), pa.string())
+        out: dict[tuple, SendGroup] = {}
+        for r in sorted(rows.filter(pc.is_in(rows["send_id"], value_set=ids)).to_pylist(), key=lambda r: r["ts"]):
+            key = (r["send_id"], r["tab_id"])
+            if key not in keys:
+                continue
+            g = out.get(key)
+            if g is None:
+                g = out[key] = SendGroup(key[0], key[1], r["ts"])
+            g.add(r["ts"], r["route"], r["duration_ms"], r["status"], r["action"], r["detected"] or [])
+        return out
+
+
+def combined(live, hist: Optional[ColumnarHistory], start_ts: Optional[float] = None,
+             n: int = 30) -> tuple[_Totals, dict[int, tuple[float, int]], list[dict]]:
+    """
+    Totals, latency buckets and the n most recent sends over the live file
+    (a LiveAggregates with segments=False) plus the closed segments. A send
+    whose events straddle a rotation is a group on both sides; it is merged
+    so it counts once.
+    """
+    totals = live.window_totals(start_ts)
+    buckets = live.latency_buckets(start_ts)
+    recent = live.recent(n, start_ts)
+    if hist is None:
+        return totals, buckets, recent
+    totals.add(hist.window_totals(start_ts))
+    for b, (dur, cnt) in hist.latency_buckets(start_ts).items():
+        old_dur, old_n = buckets.get(b, (0.0, 0))
+        buckets[b] = (old_dur + dur, old_n + cnt)
+
+    first = None if start_ts is None else int(start_ts // live.bucket_s)
+    mine = {k: g for k, g in list(live.groups.items())
+            if first is None or int(g.last_ts // live.bucket_s) >= first}
+    merged = {}
+    for key, old in hist.groups_for(set(mine), start_ts).items():
+        new = mine[key]
+        both = merged[key] = old.merge(new)
+        for g, sign in ((old, -1), (new, -1), (both, 1)):
+            totals.apply(g, sign)
+            b = int(g.last_ts // live.bucket_s)
+            dur, cnt = buckets.get(b, (0.0, 0))
+            buckets[b] = (dur + sign * g.duration_ms, cnt + sign)
+    buckets = {b: v for b, v in buckets.items() if v[1]}
+
+    rows = {}
+    for r in hist.recent(n, start_ts) + recent:
+        key = (r["send_id"], r["tab_id"])
+        rows[key] = merged[key].row() if key in merged else r
+    recent = sorted(rows.values(), key=lambda r: r["last_ts"], reverse=True)[:n]
+    return totals, buckets, recent
+
+
+def _detections_per_group(rows: "pa.Table") -> dict[str, int]:
+    """How many sends had each detection type (each type counted once per send)."""
+    det = rows["detected"]
+    flat = pc.list_flatten(det)
+    if not len(flat):
+        return {}
+    parents = pc.list_parent_indices(det)
+    pairs = pa.table({
+        "send_id": pc.take(rows["send_id"], parents),
+        "tab_id": pc.take(rows["tab_id"], parents),
+        "det": flat,
+    }).group_by(_GROUP_KEYS + ["det"], use_threads=False).aggregate([])
+    counts = pc.value_counts(pairs["det"])
+    return dict(zip(counts.field("values").to_pylist(), counts.field("counts").to_pylist()))
+
+
+def _group_row(key: tuple, events: list[dict]) -> dict:
+    # same fields and rules as SendGroup.row()
+    events.sort(key=lambda r: r["ts"])
+    routes = Counter(r["route"] for r in events)
+    actions, detected = [], set()
+    for r in events:
+        if r["action"] and r["action"] not in actions:
+            actions.append(r["action"])
+        detected.update(r["detected"] or ())
+    return {
+        "last_ts": events[-1]["ts"] if events else None,
+        "send_id": key[0],
+        "tab_id": key[1],
+        "route": routes.most_common(1)[0][0] if routes else "",
+        "duration_ms": sum(r["duration_ms"] for r in events),
+        "final_status": max((r["status"] for r in events), default=0),
+        "final_action": events[-1]["action"] if events else "",
+        "actions": ",".join(actions),
+        "detected": ",".join(sorted(detected)),
+    }
+
+
+# ---- job ----------------------------------------------------------------------
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Compact closed event-log segments into Parquet")
+    ap.add_argument("--log", default=os.getenv("PP_LOG", "proxy/logs/events.jsonl"))
+    ap.add_argument("--watch", type=float, default=0, help="re-run every N seconds")
+    args = ap.parse_args()
+    if pa is None:
+        sys.exit("pyarrow is required: pip install pyarrow")
+    while True:
+        for fp in compact(args.log):
+            print("wrote", fp)
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,33 @@ chrome.runtime.onInstalled.addListener(() => {
   });
 });
 
+// /inspect/raw request headers (url/filename percent-encoded: headers are latin-1)
+function ppfRawHeaders(payload, mode) {
+  const h = {
+    "Content-Type": "text/plain; charset=utf-8",
+    "X-PP-Mode": mode,
+    "X-PP-Body-Kind": payload.bodyKind || "none",
+    "X-PP-Url": encodeURIComponent(payload.url || ""),
+    "X-PP-Context": payload.context || "fetch"
+  };
+  if (payload.contentType) h["X-PP-Content-Type"] = payload.contentType;
+  if (payload.filename) h["X-PP-Filename"] = encodeURIComponent(payload.filename);
+  if (payload.sendId != null) h["X-PP-Send-Id"] = String(payload.sendId);
+  if (payload.tabId != null) h["X-PP-Tab-Id"] = String(payload.tabId);
+  return h;
+}
+
+// Same shape as the /inspect JSON decision
+function ppfRawDecision(headers, text) {
+  const action = headers.get("X-PP-Action") || "allow";
+  const detected = (headers.get("X-PP-Detected") || "").split(",").filter(Boolean);
+  const notify = headers.get("X-PP-Notify");
+  const out = { action, detected };
+  if (notify) out.notify = { message: decodeURIComponent(notify) };
+  if (action === "modify") out.body = text;
+  return out;
+}
+
 // Relay inspection to local proxy; include current mode
 async function ppfInspect(payload) {
   // read mode fresh so popup changes take effect immediately
@@ -17,6 +44,19 @@ async function ppfInspect(payload) {
   const to = setTimeout(() => ctrl.abort(), 1500);
 
   try {
+    // text bodies go raw (metadata in headers) so large prompts aren't
+    // JSON-escaped into an envelope and back; anything else uses the envelope
+    if (typeof payload.body === "string") {
+      const res = await fetch("http://localhost:8787/inspect/raw", {
+        method: "POST",
+        headers: ppfRawHeaders(payload, ppf_mode),
+        body: payload.body,
+        signal: ctrl.signal
+      });
+      const text = await res.text();
+      clearTimeout(to);
+      return ppfRawDecision(res.headers, text);
+    }
     const res = await fetch("http://localhost:8787/inspect", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
@@ -32,10 +72,55 @@ async function ppfInspect(payload) {
   }
 }
 
+// Inspections that arrive in the same tick (bursts on page load, uploads)
+// share one /inspect/batch round trip; a lone one goes out as usual
+const PPF_BATCH_MAX = 32;
+let ppfPending = [];
+let ppfFlushTimer = null;
+
+function ppfEnqueue(payload) {
+  return new Promise((resolve) => {
+    ppfPending.push({ payload, resolve });
+    if (!ppfFlushTimer) ppfFlushTimer = setTimeout(ppfFlush, 0);
+  });
+}
+
+function ppfFlush() {
+  const items = ppfPending;
+  ppfPending = [];
+  ppfFlushTimer = null;
+  for (let i = 0; i < items.length; i += PPF_BATCH_MAX) {
+    const chunk = items.slice(i, i + PPF_BATCH_MAX);
+    if (chunk.length === 1) ppfInspect(chunk[0].payload).then(chunk[0].resolve);
+    else ppfInspectBatch(chunk);
+  }
+}
+
+async function ppfInspectBatch(items) {
+  const { ppf_mode } = await chrome.storage.local.get({ ppf_mode: "warn" });
+  const ctrl = new AbortController();
+  const to = setTimeout(() => ctrl.abort(), 1500);
+  let out = [];
+  try {
+    const res = await fetch("http://localhost:8787/inspect/batch", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(items.map((it) => ({ ...it.payload, mode: ppf_mode }))),
+      signal: ctrl.signal
+    });
+    out = res.ok ? await res.json() : [];
+  } catch (e) {
+    out = [];
+  }
+  clearTimeout(to);
+  // fail-open per item
+  items.forEach((it, k) => it.resolve(out[k]?.decision ?? { action: "allow" }));
+}
+
 chrome.runtime.onMessage.addListener((msg, sender, sendResponse) => {
   if (msg?.type === "PPF_INSPECT") {
     const enriched = { ...msg.payload, tabId: sender?.tab?.id ?? null }
-    ppfInspect(enriched).then(sendResponse);
+    ppfEnqueue(enriched).then(sendResponse);
     return true; // async
   }
   if (msg?.type === "PPF_SET_MODE") {
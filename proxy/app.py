@@ -1,42 +1,272 @@
-import httpx
-from fastapi import FastAPI, Request
+import asyncio
+import hashlib
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, PlainTextResponse, Response
-from .utils import PORT, UPSTREAM_CHATGPT, log_event, now
-from .policy import decide
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from .utils import (
+    PORT, UPSTREAM_CHATGPT, DETECTORS_PATH, HARDENED, SCAN_BUDGET_MS,
+    DECIDE_BACKEND, DECIDE_WORKERS, OFFLOAD_MIN_BYTES,
+    UPSTREAM_HTTP2, UPSTREAM_MAX_CONNECTIONS, UPSTREAM_MAX_KEEPALIVE, UPSTREAM_KEEPALIVE_S, UPSTREAM_TIMEOUT_S,
+    RELAY_REDACT_SSE, SSE_WINDOW,
+    REDACT_MEMO_BYTES, CONV_INDEX_BYTES, CONV_MAX, CONV_IDLE_S, DECISION_CACHE, CACHE_MAX_ENTRIES, CACHE_MAX_BYTES, CACHE_TTL_S,
+    BATCH_MAX, METRICS, SLOW_MS, SLOW_LOG_PATH, PROFILE, SHARED_REFRESH_S, REDACTION_MODE, VAULT_MAX, SHARED_VAULT,
+    log_event, log_events, logger_stats, start_logger, stop_logger, now, get_salt, rotate_salt, salt_stale, shared_store,
+)
+from . import codec, metrics, sse, upstream
+from .cache import DecisionCache, decision_key
+from .conversations import CONVERSATIONS, configure_conversations
+from .profiler import PROFILER, SORT_KEYS, configure_profiler
+from .workers import run_decide, start_backend, stop_backend
+from .detectors import detector_stats, dictionaries, reload_dictionaries, reset_detector_stats, set_hardened
+from .transformers import PSEUDONYMS, REDACT_MEMO, configure_pseudonyms, configure_redact_memo, load_detector_config
+
+# custom detectors are loaded once at startup; no code edits needed
+if DETECTORS_PATH:
+    load_detector_config(DETECTORS_PATH)
+if HARDENED:
+    set_hardened(True)
+configure_redact_memo(REDACT_MEMO_BYTES)
+configure_conversations(CONV_INDEX_BYTES, CONV_MAX, CONV_IDLE_S)
+configure_profiler(slow_ms=SLOW_MS, slow_log=SLOW_LOG_PATH, profiling=PROFILE)
+# pseudonymise mode: salted tokens instead of placeholders; with the shared
+# vault, new tokens are written to the state file after each decision
+_VAULT = shared_store() if SHARED_VAULT else None
+configure_pseudonyms(REDACTION_MODE, get_salt(), max_entries=VAULT_MAX, collect=_VAULT is not None)
+
+# identical bodies get the same decision without rescanning
+_CACHE = DecisionCache(max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                       ttl_s=CACHE_TTL_S, shared=shared_store(), share_tokens=_VAULT is not None) if DECISION_CACHE else None
+
+# multi-worker mode (PP_SHARED_STATE): this process's id in the shared store
+_WORKER = {"id": f"{os.getpid()}-{os.urandom(3).hex()}", "started": time.time()}
+
+async def _publish_metrics():
+    # every worker pushes its counters so any of them can answer /metrics for all
+    store = shared_store()
+    while True:
+        try:
+            await asyncio.to_thread(store.publish, _WORKER["id"], metrics.snapshot(), _WORKER["started"])
+        except Exception:
+            pass    # store busy/locked: next round
+        await asyncio.sleep(SHARED_REFRESH_S)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    start_logger()
+    start_backend(
+        DECIDE_BACKEND, DECIDE_WORKERS,
+        min_bytes=OFFLOAD_MIN_BYTES, detectors_path=DETECTORS_PATH, hardened=HARDENED,
+        memo_bytes=REDACT_MEMO_BYTES, conv_config=(CONV_INDEX_BYTES, CONV_MAX, CONV_IDLE_S),
+        pseudonym_config=(REDACTION_MODE, VAULT_MAX),
+    )
+    upstream.start_client(
+        http2=UPSTREAM_HTTP2,
+        max_connections=UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive=UPSTREAM_MAX_KEEPALIVE,
+        keepalive_s=UPSTREAM_KEEPALIVE_S,
+        timeout_s=UPSTREAM_TIMEOUT_S,
+    )
+    publisher = asyncio.create_task(_publish_metrics()) if METRICS and shared_store() is not None else None
+    try:
+        yield
+    finally:
+        if publisher is not None:
+            publisher.cancel()
+        await upstream.stop_client()
+        stop_backend()
+        stop_logger()   # flushes whatever is still queued
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], allow_credentials=True,
     allow_methods=["*"], allow_headers=["*"],
+    expose_headers=["X-PP-Action", "X-PP-Detected", "X-PP-Notify"],
 )
 
+# CORS is open for /inspect, but web pages must not be able to flip admin
+# switches or read pseudonymised originals (chatgpt.com sees the tokens):
+# state-changing admin endpoints take the extension or no origin (curl) only.
+_EXTENSION_ORIGINS = ("chrome-extension://", "moz-extension://")
+
+def extension_only(request: Request) -> None:
+    origin = request.headers.get("origin")
+    if origin and not origin.startswith(_EXTENSION_ORIGINS):
+        raise HTTPException(status_code=403, detail="only available to the extension")
+
 @app.get("/healthz")
 async def healthz():
     return PlainTextResponse("ok")
 
-@app.post("/inspect")
-async def inspect(request: Request):
-    start_ts = now()
-    payload = await request.json()
-
-    url   = payload.get("url", "")
-    ctx   = payload.get("context", "fetch")
-    mode  = (payload.get("mode") or "warn").lower()
-    body  = payload.get("body")
-    kind  = payload.get("bodyKind", "none")
-
-    # NEW: hand MIME/filename to policy so it can classify non-text correctly
-    content_type = payload.get("contentType")
-    filename     = payload.get("filename")
-
-    # ask policy only (keep app clean)
-    decision = decide(
-        mode, kind, url, body,
-        content_type=content_type,
-        filename=filename
-    )
+@app.get("/detectors/stats")
+async def detectors_stats(reset: bool = False):
+    # cumulative per-detector cost: spot the one regex that dominates p99
+    out = detector_stats()
+    if reset:
+        reset_detector_stats()
+    return JSONResponse({"detectors": out, "dictionaries": {n: d.info() for n, d in dictionaries().items()}})
+
+@app.post("/detectors/reload", dependencies=[Depends(extension_only)])
+async def detectors_reload():
+    # dictionary files are also picked up on their own within reload_s; this is "now"
+    try:
+        return JSONResponse({"dictionaries": await asyncio.to_thread(reload_dictionaries)})
+    except OSError as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+@app.get("/logs/stats")
+async def logs_stats():
+    # queue depth, written/dropped event counts of the background logger
+    return JSONResponse(logger_stats())
+
+@app.get("/cache/stats")
+async def cache_stats():
+    # decision cache hits/misses/evictions, plus the per-string redaction memo
+    # (this process only; with PP_DECIDE_BACKEND=process each worker has its own)
+    stats = await asyncio.to_thread(_CACHE.stats) if _CACHE is not None else {"enabled": False}
+    return JSONResponse({**stats, "redact_memo": REDACT_MEMO.stats(), "conversations": CONVERSATIONS.stats(),
+                         "pseudonyms": PSEUDONYMS.stats()})
+
+@app.post("/cache/clear", dependencies=[Depends(extension_only)])
+async def cache_clear():
+    if _CACHE is not None:
+        await asyncio.to_thread(_CACHE.clear)
+    REDACT_MEMO.clear()
+    CONVERSATIONS.clear()
+    return JSONResponse({"ok": True})
+
+@app.get("/relay/stats")
+async def relay_stats(reset: bool = False):
+    # SSE redaction on the relay: per-chunk processing time and detections
+    out = {"sse": sse.STATS.snapshot(), "upstream": upstream.client_config()}
+    if reset:
+        sse.STATS.reset()
+    return JSONResponse(out)
+
+# ---- runtime profiling (see proxy/profiler.py) ----
+
+@app.get("/admin/profile")
+async def profile_status(limit: int = 30, sort: str = "tottime"):
+    # hottest functions over all requests profiled since the last reset
+    if sort not in SORT_KEYS:
+        return JSONResponse({"error": f"sort must be one of {SORT_KEYS}"}, status_code=400)
+    return JSONResponse({**PROFILER.status(), "hot": PROFILER.hot(limit, sort)})
+
+@app.post("/admin/profile", dependencies=[Depends(extension_only)])
+async def profile_toggle(enabled: Optional[bool] = None, slow_ms: Optional[float] = None, reset: bool = False):
+    # e.g. POST /admin/profile?enabled=true&slow_ms=250 ; nothing restarts
+    if enabled is not None:
+        PROFILER.profiling = enabled
+    if slow_ms is not None:
+        PROFILER.slow_ms = max(0.0, slow_ms)
+    if reset:
+        PROFILER.reset()
+    return JSONResponse(PROFILER.status())
+
+def _observe_endpoint(endpoint: str, t0: float, *, parse: float, log: float, ser: float) -> None:
+    # request-level stages; the decide() ones are recorded per payload in _inspect
+    metrics.STAGE_LATENCY.observe(parse, "envelope_parse")
+    metrics.STAGE_LATENCY.observe(log, "logging")
+    metrics.STAGE_LATENCY.observe(ser, "serialisation")
+    metrics.LATENCY.observe(time.perf_counter() - t0, endpoint)
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # Prometheus text exposition; counters are per process (one per uvicorn worker)
+    if not METRICS:
+        return PlainTextResponse("metrics disabled (PP_METRICS=0)\n", status_code=404)
+    store = shared_store()
+    others = await asyncio.to_thread(store.worker_snapshots, _WORKER["id"]) if store is not None else ()
+    return PlainTextResponse(metrics.render(others), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/admin/state")
+async def admin_state():
+    # which worker answered, and whether it agrees with the others on the salt
+    store = shared_store()
+    salt, rotations = await asyncio.to_thread(store.salt) if store is not None else (get_salt(), None)
+    return JSONResponse({
+        "worker": _WORKER["id"],
+        "pid": os.getpid(),
+        "shared": store.path if store is not None else None,
+        "salt_id": hashlib.blake2b(salt.encode(), digest_size=4).hexdigest(),   # never the salt itself
+        "salt_rotations": rotations,
+        "workers": await asyncio.to_thread(store.workers) if store is not None else [],
+    })
+
+@app.post("/admin/salt/rotate", dependencies=[Depends(extension_only)])
+async def admin_rotate_salt():
+    # pseudonymise mode: tokens change from here on; the vault still knows the old ones
+    PSEUDONYMS.set_salt(await asyncio.to_thread(rotate_salt))
+    return await admin_state()
+
+# ---- /reidentify: pseudonym tokens back to the original values ----
+# Body: any text (e.g. a model reply); response: the same text with every
+# token this proxy handed out (still in the vault) replaced by its value.
+
+@app.post("/reidentify", dependencies=[Depends(extension_only)])
+async def reidentify(request: Request):
+    text = (await request.body()).decode("utf-8", "replace")
+    if _VAULT is not None:
+        out = await asyncio.to_thread(PSEUDONYMS.reidentify, text, _VAULT.vault_get)
+    else:
+        out = PSEUDONYMS.reidentify(text)
+    return PlainTextResponse(out)
+
+async def _inspect(
+    *, url: str, ctx: str, mode: str, kind: str, body,
+    content_type, filename, send_id, tab_id, start_ts: float, stages: Optional[dict] = None,
+    endpoint: str = "inspect",
+) -> tuple[dict, int, Optional[dict]]:
+    """
+    decide() (or the cache) and the event log line for it (None for noisy
+    endpoints); shared by the /inspect flavours, which do the logging.
+    """
+    if PSEUDONYMS.enabled:
+        # picks up rotations (other workers' too); re-read from the shared file every refresh_s
+        PSEUDONYMS.set_salt(await asyncio.to_thread(get_salt) if salt_stale() else get_salt())
+
+    # same body seen recently -> same decision (decide() doesn't use the URL)
+    key = decision_key(mode, kind, content_type, filename, body) if _CACHE is not None else None
+    decision, tokens = await _CACHE.aget(key) if key is not None else (None, ())
+    cached = decision is not None
+    if tokens and PSEUDONYMS.enabled:
+        # the vault may have dropped these since the decision was cached
+        PSEUDONYMS.remember(tokens)
+        if _VAULT is not None:
+            await asyncio.to_thread(_VAULT.vault_put, tokens)
+
+    # slow-request capture / profiling want per-detector times (and a profile)
+    trace = None
+    if not cached and PROFILER.collecting:
+        trace = {}
+        if stages is None:
+            stages = {}
+
+    # ask policy only (keep app clean); may run off the event loop
+    if decision is None:
+        decision = await run_decide(
+            mode, kind, url, body,
+            content_type=content_type,
+            filename=filename,
+            budget_s=(SCAN_BUDGET_MS / 1000) or None,
+            tab_id=tab_id,
+            stages=stages,
+            trace=trace,
+            profile=PROFILER.profiling,
+        )
+        if key is not None:
+            out = decision.get("body")     # not `body`: that's the request, for the profiler below
+            tokens = PSEUDONYMS.pairs_in(out) if PSEUDONYMS.enabled and isinstance(out, str) else ()
+            await _CACHE.aput(key, decision, tokens)
+        if _VAULT is not None and PSEUDONYMS.enabled:
+            minted = PSEUDONYMS.drain()
+            if minted:
+                await asyncio.to_thread(_VAULT.vault_put, minted)
 
     # compute a status for dashboards
     status = 200 if decision.get("action") != "block" else 403
@@ -51,13 +281,27 @@ async def inspect(request: Request):
         except Exception:
             route = url.split("?")[0] if "?" in url else url
 
+    if trace is not None:
+        # only writes (synchronously; they're rare) when over the threshold
+        PROFILER.record(route=route, endpoint=endpoint, duration_s=now() - start_ts, body=body,
+                        stages=stages, trace=trace, decision=decision, status=status)
+
+    if METRICS:
+        metrics.observe_stages(stages)
+        metrics.REQUESTS.inc(decision.get("action", "allow"), mode, metrics.route_label(route))
+        for t in detected:
+            metrics.DETECTIONS.inc(t)
+        if cached:
+            metrics.CACHE_HITS.inc()
+
     # --- reduce noise: skip logging heartbeats/prepare ---
     noisy = (
         url.endswith("/conversation/prepare")
         or url.endswith("/conversation/implicit_message_feedback")
     )
+    event = None
     if not noisy:
-        log_event({
+        event = {
             "ts": start_ts,
             "route": route,
             "duration_ms": round((now() - start_ts) * 1000, 2),
@@ -72,11 +316,168 @@ async def inspect(request: Request):
 
             "action": decision.get("action", "allow"),
             "mode": mode,
-            "send_id": payload.get("sendId"),
-            "tab_id": payload.get("tabId"),
-        })
+            "send_id": send_id,
+            "tab_id": tab_id,
+            "cached": cached,
+        }
+    return decision, status, event
 
-    return JSONResponse(decision, status_code=status)
+@app.post("/inspect")
+async def inspect(request: Request):
+    start_ts = now()
+    raw = await request.body()
+    t0 = time.perf_counter()
+    payload = codec.loads(raw)
+    t = time.perf_counter()
+
+    decision, status, event = await _inspect(
+        url=payload.get("url", ""),
+        ctx=payload.get("context", "fetch"),
+        mode=(payload.get("mode") or "warn").lower(),
+        kind=payload.get("bodyKind", "none"),
+        body=payload.get("body"),
+        # NEW: hand MIME/filename to policy so it can classify non-text correctly
+        content_type=payload.get("contentType"),
+        filename=payload.get("filename"),
+        send_id=payload.get("sendId"),
+        tab_id=payload.get("tabId"),
+        start_ts=start_ts,
+        stages={} if METRICS else None,
+    )
+    t_log = time.perf_counter()
+    if event is not None:
+        log_event(event)
+    t_ser = time.perf_counter()
+
+    # same bytes JSONResponse would produce, via the fast codec when available
+    content = codec.dumps_compact(decision)
+    if METRICS:
+        _observe_endpoint("inspect", t0, parse=t - t0, log=t_ser - t_log, ser=time.perf_counter() - t_ser)
+    return Response(content=content, status_code=status, media_type="application/json")
+
+# ---- /inspect/batch: several envelopes per round trip ----
+# Body: a JSON array of /inspect payloads. Items are decided concurrently
+# (each through the same cache/backend path as /inspect) and answered in
+# order as {"status": 200|403, "decision": {...}}; an item that isn't an
+# object gets {"status": 400, "error": ...}, one whose decide() raised gets
+# {"status": 500, "error": ...}. The log lines of the whole batch are
+# written in one go.
+
+@app.post("/inspect/batch")
+async def inspect_batch(request: Request):
+    start_ts = now()
+    raw = await request.body()
+    t0 = time.perf_counter()
+    items = codec.loads(raw)
+    t = time.perf_counter()
+    if not isinstance(items, list):
+        return JSONResponse({"error": "expected a JSON array of inspect payloads"}, status_code=400)
+    if len(items) > BATCH_MAX:
+        return JSONResponse({"error": f"at most {BATCH_MAX} items per batch"}, status_code=413)
+
+    async def one(payload):
+        if not isinstance(payload, dict):
+            return None
+        return await _inspect(
+            url=payload.get("url", ""),
+            ctx=payload.get("context", "fetch"),
+            mode=(payload.get("mode") or "warn").lower(),
+            kind=payload.get("bodyKind", "none"),
+            body=payload.get("body"),
+            content_type=payload.get("contentType"),
+            filename=payload.get("filename"),
+            send_id=payload.get("sendId"),
+            tab_id=payload.get("tabId"),
+            start_ts=start_ts,
+            stages={} if METRICS else None,
+            endpoint="batch",
+        )
+
+    # one failing item must not take the others down with it
+    results = await asyncio.gather(*(one(p) for p in items), return_exceptions=True)
+    out, events = [], []
+    for r in results:
+        if r is None:
+            out.append({"status": 400, "error": "inspect payload must be an object"})
+            continue
+        if isinstance(r, BaseException):
+            if not isinstance(r, Exception):
+                raise r     # cancellation etc.
+            out.append({"status": 500, "error": f"{type(r).__name__}: {r}"})
+            continue
+        decision, status, event = r
+        out.append({"status": status, "decision": decision})
+        if event is not None:
+            events.append(event)
+    t_log = time.perf_counter()
+    log_events(events)
+    t_ser = time.perf_counter()
+    content = codec.dumps_compact(out)
+    if METRICS:
+        _observe_endpoint("batch", t0, parse=t - t0, log=t_ser - t_log, ser=time.perf_counter() - t_ser)
+    return Response(content=content, media_type="application/json")
+
+# ---- /inspect/raw: the chat body as-is, metadata in headers ----
+# Saves the JSON-in-JSON round trip (escape the body into an envelope, parse
+# the envelope, escape the result again) on large prompts.
+#
+# Request headers: X-PP-Url, X-PP-Filename (both percent-encoded), X-PP-Mode,
+# X-PP-Body-Kind, X-PP-Context, X-PP-Content-Type, X-PP-Send-Id, X-PP-Tab-Id.
+# Response: X-PP-Action, X-PP-Detected (comma separated), X-PP-Notify
+# (percent-encoded); the body is the redacted body for "modify", else empty.
+
+def _header_int(v):
+    # tabId arrives as a string; keep it an int like the JSON envelope's
+    try:
+        return int(v) if v is not None else None
+    except ValueError:
+        return v
+
+@app.post("/inspect/raw")
+async def inspect_raw(request: Request):
+    start_ts = now()
+    from urllib.parse import quote, unquote
+    h = request.headers
+    raw = await request.body()
+    t0 = time.perf_counter()
+    try:
+        body = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        body = raw      # bytes: policy treats it as non-text
+    t = time.perf_counter()
+
+    decision, status, event = await _inspect(
+        url=unquote(h.get("x-pp-url", "")),
+        ctx=h.get("x-pp-context", "fetch"),
+        mode=(h.get("x-pp-mode") or "warn").lower(),
+        kind=h.get("x-pp-body-kind", "none"),
+        body=body,
+        content_type=h.get("x-pp-content-type"),
+        filename=unquote(h["x-pp-filename"]) if "x-pp-filename" in h else None,
+        send_id=h.get("x-pp-send-id"),
+        tab_id=_header_int(h.get("x-pp-tab-id")),
+        start_ts=start_ts,
+        stages={} if METRICS else None,
+        endpoint="raw",
+    )
+    t_log = time.perf_counter()
+    if event is not None:
+        log_event(event)
+    t_ser = time.perf_counter()
+
+    headers = {
+        "X-PP-Action": decision.get("action", "allow"),
+        "X-PP-Detected": ",".join(decision.get("detected", [])),
+    }
+    notify = (decision.get("notify") or {}).get("message")
+    if notify:
+        headers["X-PP-Notify"] = quote(notify, safe=" ()")
+    content = decision.get("body", "") if decision.get("action") == "modify" else ""
+    content = content.encode("utf-8")
+    if METRICS:
+        _observe_endpoint("raw", t0, parse=t - t0, log=t_ser - t_log, ser=time.perf_counter() - t_ser)
+    return Response(content=content, status_code=status, headers=headers,
+                    media_type="text/plain; charset=utf-8")
 
 
 
@@ -107,11 +508,22 @@ async def relay_chatgpt(path: str, request: Request):
             "Access-Control-Max-Age": "600",
         })
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        r = await client.request(method, upstream_url, headers=_strip_hop(headers_in),
-                                 content=(raw if method not in ("GET","HEAD") else None))
+    # pooled client; body is forwarded chunk by chunk (keeps SSE streaming)
+    r = await upstream.relay(method, upstream_url, _strip_hop(headers_in),
+                             raw if method not in ("GET","HEAD") else None)
 
-    return Response(content=r.content, status_code=r.status_code, headers={
-        "Content-Type": r.headers.get("content-type","application/octet-stream"),
-        "Access-Control-Allow-Origin": origin
-    })
+    content_type = r.headers.get("content-type","application/octet-stream")
+    headers = {
+        "Content-Type": content_type,
+        "Access-Control-Allow-Origin": origin,
+    }
+    if RELAY_REDACT_SSE and content_type.startswith("text/event-stream"):
+        # model output: decode and redact event by event as it streams
+        body = sse.redact_sse(upstream.stream_body(r, decode=True), SSE_WINDOW)
+        headers["Cache-Control"] = "no-cache"
+        return StreamingResponse(body, status_code=r.status_code, headers=headers)
+
+    # raw bytes are passed through, so the encoding has to travel with them
+    if r.headers.get("content-encoding"):
+        headers["Content-Encoding"] = r.headers["content-encoding"]
+    return StreamingResponse(upstream.stream_body(r), status_code=r.status_code, headers=headers)
@@ -0,0 +1,207 @@
+"""
+Content-addressed cache of /inspect decisions.
+
+The extension re-sends identical bodies all the time (retries, prepare /
+feedback pings, regenerations), so decisions are cached under a BLAKE2b
+digest of (mode, bodyKind, content_type, filename, body) — decide() doesn't
+look at the URL. Entries expire after `ttl_s` and the least recently used
+ones are evicted past `max_entries` or `max_bytes` (body-sized estimate).
+
+The whole cache is dropped when the detector configuration changes
+(detectors.config_generation(): registering detectors, maskers, hardened
+mode), and can be cleared by hand. Decisions made under an exhausted scan
+budget are never cached: they depend on timing, not content.
+
+With `shared` (a shared.SharedStore, multi-worker mode) a local miss falls
+through to the store, and puts go to both, so a body decided by one worker
+is a hit on the others. The store is SQLite and can wait on another
+worker's write lock: from the event loop use aget()/aput(), which only
+touch it from a thread.
+
+In pseudonymise mode an entry also keeps the (token, value) pairs its body
+uses, so a hit can put them back into the vault (they may have been evicted
+since). They only go to the shared store with `share_tokens` (the shared
+vault is on); otherwise such entries stay local, since another worker could
+not re-identify their tokens anyway.
+"""
+
+from __future__ import annotations
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .detectors import config_fingerprint, config_generation
+from .policy import BUDGET_ALLOW_TOAST, BUDGET_BLOCK_TOAST, Decision
+
+_ENTRY_OVERHEAD = 256   # rough bytes per entry besides the strings it holds
+_SEP = b"\x00"
+
+
+def decision_key(
+    mode: Optional[str],
+    kind: Optional[str],
+    content_type: Optional[str],
+    filename: Optional[str],
+    body: Any,
+) -> bytes:
+    h = hashlib.blake2b(digest_size=16)
+    for part in ((mode or "").lower(), (kind or "").lower(), content_type or "", filename or ""):
+        h.update(part.encode("utf-8", "surrogatepass"))
+        h.update(_SEP)
+    if isinstance(body, str):
+        h.update(b"s")
+        h.update(body.encode("utf-8", "surrogatepass"))
+    elif isinstance(body, (bytes, bytearray)):
+        h.update(b"b")
+        h.update(body)
+    else:
+        h.update(b"r")
+        h.update(repr(body).encode("utf-8", "surrogatepass"))
+    return h.digest()
+
+
+def _size(decision: Decision, tokens: tuple = ()) -> int:
+    return (_ENTRY_OVERHEAD + len(decision.get("body") or "") + 16 * len(decision.get("detected") or ())
+            + sum(len(t) + len(v) for t, v in tokens))
+
+
+def _copy(decision: Decision) -> Decision:
+    # callers get their own dict/lists; strings are shared
+    out = dict(decision)
+    if "detected" in out:
+        out["detected"] = list(out["detected"])
+    if "notify" in out:
+        out["notify"] = dict(out["notify"])
+    return out  # type: ignore[return-value]
+
+
+class DecisionCache:
+    def __init__(self, *, max_entries: int = 4096, max_bytes: int = 64 << 20, ttl_s: float = 300.0,
+                 shared=None, share_tokens: bool = False):
+        self.shared = shared
+        self.share_tokens = share_tokens
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[bytes, tuple[float, int, Decision, tuple]]" = OrderedDict()
+        self._bytes = 0
+        self._generation = config_generation()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def _check_generation(self) -> None:
+        gen = config_generation()
+        if gen != self._generation:
+            self._generation = gen
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self._bytes = 0
+
+    def get(self, key: bytes) -> Optional[Decision]:
+        decision, _ = self._get_local(key)
+        if decision is None and self.shared is not None:
+            decision, _ = self._get_shared(key)
+        return decision
+
+    async def aget(self, key: bytes) -> tuple[Optional[Decision], tuple]:
+        """(decision or None, pseudonym (token, value) pairs its body uses)."""
+        decision, tokens = self._get_local(key)
+        if decision is None and self.shared is not None:
+            decision, tokens = await asyncio.to_thread(self._get_shared, key)
+        return decision, tokens
+
+    def _get_local(self, key: bytes) -> tuple[Optional[Decision], tuple]:
+        with self._lock:
+            self._check_generation()
+            item = self._data.get(key)
+            if item is not None:
+                expires, size, decision, tokens = item
+                if expires >= time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return _copy(decision), tokens
+                del self._data[key]
+                self._bytes -= size
+                self.expirations += 1
+            self.misses += 1
+        return None, ()
+
+    def _get_shared(self, key: bytes) -> tuple[Optional[Decision], tuple]:
+        decision = self.shared.get_decision(self._shared_key(key))
+        if decision is None:
+            return None, ()
+        tokens = tuple(tuple(p) for p in decision.pop("_tokens", ()))
+        self._put_local(key, decision, tokens)
+        return decision, tokens
+
+    def _shared_key(self, key: bytes) -> bytes:
+        # generations are per process; the config digest is the same on every worker with the same config
+        return config_fingerprint() + key
+
+    def put(self, key: bytes, decision: Decision, tokens: tuple = ()) -> None:
+        if self._cacheable(decision) and self._put_local(key, decision, tokens) and self._shareable(tokens):
+            self.shared.put_decision(self._shared_key(key), self._shared_value(decision, tokens), self.ttl_s)
+
+    async def aput(self, key: bytes, decision: Decision, tokens: tuple = ()) -> None:
+        if self._cacheable(decision) and self._put_local(key, decision, tokens) and self._shareable(tokens):
+            await asyncio.to_thread(self.shared.put_decision, self._shared_key(key),
+                                    self._shared_value(decision, tokens), self.ttl_s)
+
+    @staticmethod
+    def _cacheable(decision: Decision) -> bool:
+        notify = (decision.get("notify") or {}).get("message")
+        return notify not in (BUDGET_ALLOW_TOAST, BUDGET_BLOCK_TOAST)
+
+    def _shareable(self, tokens: tuple) -> bool:
+        return self.shared is not None and (not tokens or self.share_tokens)
+
+    @staticmethod
+    def _shared_value(decision: Decision, tokens: tuple) -> dict:
+        return {**decision, "_tokens": [list(p) for p in tokens]} if tokens else decision
+
+    def _put_local(self, key: bytes, decision: Decision, tokens: tuple = ()) -> bool:
+        size = _size(decision, tokens)
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            self._check_generation()
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (time.monotonic() + self.ttl_s, size, _copy(decision), tuple(tokens))
+            self._bytes += size
+            while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, sz, _, _) = self._data.popitem(last=False)
+                self._bytes -= sz
+                self.evictions += 1
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self._bytes = 0
+        if self.shared is not None:
+            self.shared.clear_decisions()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            **({"shared": self.shared.stats()} if self.shared is not None else {}),
+        }
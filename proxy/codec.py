@@ -0,0 +1,107 @@
+"""
+JSON codec used on the hot path. Picks orjson or msgspec when installed and
+falls back to the stdlib json module (PP_JSON_CODEC=auto|orjson|msgspec|json).
+
+Contract, whatever the backend:
+  - loads(x)          == json.loads(x), except that integers beyond 64 bits
+                         may come back as floats (see below)
+  - dumps_compact(o)  == json.dumps(o, ensure_ascii=False, separators=(",", ":"))
+The fast libraries differ from the stdlib in a few corners (exponent floats,
+NaN/Infinity, lone surrogates); those inputs are routed to the stdlib so the
+redacted body stays byte-identical. A float decoded from a >64-bit integer is
+always >= 1e16, so float_is_portable() flags it too; callers that re-emit a
+tree with non-portable floats should re-decode it with json.loads first.
+"""
+
+from __future__ import annotations
+import json
+import math
+import os
+from typing import Any, Callable, Optional
+
+_loads_fast: Optional[Callable[[Any], Any]] = None
+_dumps_fast: Optional[Callable[[Any], bytes]] = None
+BACKEND = "json"
+
+
+def set_backend(name: str = "auto") -> str:
+    """Select the codec ("auto", "orjson", "msgspec" or "json"); returns the one in use."""
+    global _loads_fast, _dumps_fast, BACKEND
+    _loads_fast, _dumps_fast, BACKEND = None, None, "json"
+    name = (name or "auto").lower()
+
+    if name in ("auto", "orjson"):
+        try:
+            import orjson
+
+            _loads_fast, _dumps_fast, BACKEND = orjson.loads, orjson.dumps, "orjson"
+            return BACKEND
+        except ImportError:
+            pass
+
+    if name in ("auto", "msgspec"):
+        try:
+            import msgspec
+
+            _loads_fast, _dumps_fast, BACKEND = msgspec.json.decode, msgspec.json.encode, "msgspec"
+        except ImportError:
+            pass
+    return BACKEND
+
+
+set_backend(os.getenv("PP_JSON_CODEC", "auto"))
+
+
+def loads(data: str | bytes | bytearray) -> Any:
+    if _loads_fast is not None:
+        try:
+            return _loads_fast(data)
+        except Exception:
+            pass    # NaN/Infinity, lone surrogates, ...: let the stdlib decide
+    return json.loads(data)
+
+
+def float_is_portable(v: float) -> bool:
+    """True if the fast encoders print this float exactly like float.__repr__."""
+    return math.isfinite(v) and "e" not in repr(v)
+
+
+def floats_are_portable(obj: Any) -> bool:
+    # iterative: payloads can nest deeper than the recursion limit
+    stack = [obj]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, float):
+            if not float_is_portable(x):
+                return False
+        elif isinstance(x, dict):
+            stack.extend(x.values())
+        elif isinstance(x, list):
+            stack.extend(x)
+    return True
+
+
+def dumps_compact(obj: Any, *, portable: Optional[bool] = None) -> str:
+    """
+    Compact, non-ASCII-escaping JSON. Pass `portable` if the caller already
+    knows whether every float in `obj` is portable (saves a walk).
+    """
+    if _dumps_fast is not None:
+        if portable is None:
+            portable = floats_are_portable(obj)
+        if portable:
+            try:
+                return _dumps_fast(obj).decode("utf-8")
+            except Exception:
+                pass    # lone surrogates, non-str keys, ...
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps_line(obj: Any) -> str:
+    """One log line. Whitespace is not part of the log contract, so no checks."""
+    if _dumps_fast is not None:
+        try:
+            return _dumps_fast(obj).decode("utf-8")
+        except Exception:
+            pass
+    return json.dumps(obj, ensure_ascii=False)
@@ -0,0 +1,152 @@
+"""
+Per-conversation index of already-inspected message nodes.
+
+Every ChatGPT turn re-posts the conversation context, so /inspect keeps
+seeing the same `messages[]` entries. For each (tabId, conversation_id) we
+remember, per message id, a fingerprint of the node as it arrived and the
+node after redaction (plus its tags). json_transform then only walks
+messages that are new or whose content changed and splices the stored
+redaction in for the rest, so the output is the same as a full scan.
+
+Memory is bounded by an approximate byte budget and a conversation count
+(least recently used conversations go first), conversations idle longer
+than `idle_s` are dropped, and everything is dropped when the detector
+configuration changes. One index per process, thread-safe.
+"""
+
+from __future__ import annotations
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional
+
+from . import codec
+from .detectors import config_generation
+
+_NODE_OVERHEAD = 256    # rough bytes per stored message besides its JSON
+
+
+def fingerprint(node: Any) -> tuple[bytes, int]:
+    """(digest, serialised length) of a message node, before it is redacted."""
+    raw = codec.dumps_line(node).encode("utf-8", "surrogatepass")
+    return hashlib.blake2b(raw, digest_size=16).digest(), len(raw)
+
+
+class _Conversation:
+    __slots__ = ("nodes", "bytes", "last_used")
+
+    def __init__(self):
+        # message id -> (fingerprint, redacted node, tags, changed, size, pseudonym pairs)
+        self.nodes: dict[str, tuple[bytes, Any, tuple, bool, int, tuple]] = {}
+        self.bytes = 0
+        self.last_used = time.monotonic()
+
+
+class ConversationIndex:
+    def __init__(self, *, max_bytes: int = 64 << 20, max_conversations: int = 1024, idle_s: float = 1800.0):
+        self.max_bytes = max_bytes
+        self.max_conversations = max_conversations
+        self.idle_s = idle_s
+        self._convs: "OrderedDict[tuple, _Conversation]" = OrderedDict()
+        self._bytes = 0
+        self._generation = config_generation()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _drop(self, key: tuple) -> None:
+        conv = self._convs.pop(key)
+        self._bytes -= conv.bytes
+
+    def _sweep(self, now: float) -> None:
+        # LRU order == idle order, so expired ones are at the front
+        while self._convs:
+            key, conv = next(iter(self._convs.items()))
+            if now - conv.last_used <= self.idle_s:
+                break
+            self._drop(key)
+            self.expirations += 1
+
+    def _check_generation(self) -> None:
+        gen = config_generation()
+        if gen != self._generation:
+            self._generation = gen
+            self._convs.clear()
+            self._bytes = 0
+
+    def lookup(self, key: tuple, msg_id: str, fp: bytes) -> Optional[tuple[Any, tuple, bool, tuple]]:
+        """
+        (redacted node, tags, changed, pairs) if this message was seen with the
+        same content; pairs are the (token, value)s its redaction carries.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._check_generation()
+            self._sweep(now)
+            conv = self._convs.get(key)
+            item = conv.nodes.get(msg_id) if conv is not None else None
+            if item is None or item[0] != fp:
+                self.misses += 1
+                return None
+            conv.last_used = now
+            self._convs.move_to_end(key)
+            self.hits += 1
+            return item[1], item[2], item[3], item[5]
+
+    def store(self, key: tuple, msg_id: str, fp: bytes, size: int, node: Any, tags: List[str], changed: bool,
+              pairs: Iterable = ()) -> None:
+        size = 2 * size + _NODE_OVERHEAD     # the node as it came in + as it went out
+        if size > self.max_bytes:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._check_generation()
+            conv = self._convs.get(key)
+            if conv is None:
+                conv = self._convs[key] = _Conversation()
+            old = conv.nodes.get(msg_id)
+            if old is not None:
+                conv.bytes -= old[4]
+                self._bytes -= old[4]
+            conv.nodes[msg_id] = (fp, node, tuple(tags), changed, size, tuple(pairs))
+            conv.bytes += size
+            self._bytes += size
+            conv.last_used = now
+            self._convs.move_to_end(key)
+            while self._convs and (self._bytes > self.max_bytes or len(self._convs) > self.max_conversations):
+                self._drop(next(iter(self._convs)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._convs.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "conversations": len(self._convs),
+            "messages": sum(len(c.nodes) for c in list(self._convs.values())),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+CONVERSATIONS = ConversationIndex()
+
+
+def configure_conversations(max_bytes: int, max_conversations: int, idle_s: float) -> None:
+    """Resize (max_bytes=0 disables) the process-wide index; existing entries are dropped."""
+    CONVERSATIONS.clear()
+    CONVERSATIONS.max_bytes = max_bytes
+    CONVERSATIONS.max_conversations = max_conversations
+    CONVERSATIONS.idle_s = idle_s
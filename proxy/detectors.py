@@ -1,5 +1,23 @@
+import hashlib
+import logging
+import os
 import re
-from typing import TypedDict, List
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, List, Optional, TypedDict, Union
+
+try:
+    import ahocorasick     # pyahocorasick: optional C automaton for dictionary detectors
+except ImportError:
+    ahocorasick = None
+
+
+log = logging.getLogger(__name__)
 
 
 class Detection(TypedDict):
@@ -85,6 +103,619 @@ PATTERNS: dict[str, re.Pattern[str]] = {
     "company": COMPANY_RE,
 }
 
+# ========== HARDENED PATTERNS ==========
+# Linear-time variants for the patterns that backtrack badly on long runs
+# (a 40 KB "a-a-a-..." takes seconds with the defaults). They rely on
+# possessive quantifiers (Python 3.11+) and RFC-ish length caps, and only start
+# at the beginning of a run, so each character is visited a bounded number of
+# times. Email and JWT are finders rather than regexes: they give exactly the
+# default spans, the rest find the same spans as the defaults on ordinary text.
+
+HARDENED_PATTERNS: dict[str, Union[re.Pattern[str], Callable]] = {}
+
+if sys.version_info >= (3, 11):
+    _LOCAL_RUN = re.compile(r"[A-Za-z0-9._%+-]*")
+    _DOMAIN = re.compile(r"[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+
+    def _find_emails(text: str):
+        # EMAIL_RE's spans, one pass: for each "@" the local part is the run to
+        # its left (not reaching back into the previous match), read on the
+        # reversed text, and the domain is matched once, anchored after the "@"
+        # (domain runs never share an "@", so no character is read twice)
+        rev = text[::-1] if "@" in text else ""
+        n = len(text)
+        lo = 0          # end of the previous match
+        at = text.find("@")
+        while at != -1:
+            local = _LOCAL_RUN.match(rev, n - at, n - lo).end() - (n - at)
+            dom = _DOMAIN.match(text, at + 1) if local else None
+            if dom is not None:
+                yield at - local, dom.end()
+                lo = dom.end()
+            at = text.find("@", max(at + 1, lo))
+
+    _JWT_SHAPE = re.compile(
+        r"""
+        (?<![A-Za-z0-9_-])(?:\b|-++\b|[A-Za-z0-9_]++\b)                   # first \b of a run only
+        (?=[A-Za-z0-9_-]{10,}+\.[A-Za-z0-9_-]{10,}+\.[A-Za-z0-9_-]{10})   # length check
+        ([A-Za-z0-9_-]++\.[A-Za-z0-9_-]++\.[A-Za-z0-9_-]+)
+        \b
+        """,
+        re.VERBOSE,
+    )
+    _JWT_RUN = re.compile(r"[A-Za-z0-9_.-]*")
+    _ANY_LETTER = re.compile(r"[A-Za-z]")
+
+    def _find_jwts(text: str):
+        # JWT_RE's letter check looks at the whole [A-Za-z0-9_.-] run from the
+        # start, past the third part too. Next letter and end of run are kept
+        # between candidates so a long run of digit parts is only read once.
+        letter = run_end = -1
+        for m in _JWT_SHAPE.finditer(text):
+            p = m.start(1)
+            if letter < p:
+                lm = _ANY_LETTER.search(text, p)
+                if lm is None:
+                    return
+                letter = lm.start()
+            if run_end <= p:
+                run_end = _JWT_RUN.match(text, p).end()
+            if letter < run_end:
+                yield m.span(1)
+
+    HARDENED_PATTERNS = {
+        "email": _find_emails,
+        "jwt": _find_jwts,
+        "api_key": re.compile(r"\b[A-Za-z0-9]{20,64}+\b"),
+        # at most 8 words of at most 64 letters before the suffix
+        "company": re.compile(
+            r"\b([A-Z][a-zA-Z]{1,63}+(?: [A-Z][a-zA-Z]{1,63}+){0,7} )"
+            r"(Company|Co\.|Corporation|Corp\.|Inc|Incorporated|LLC|Ltd)\b"
+        ),
+    }
+
+
+# ========== PREFILTERS ==========
+# Cheap C-speed checks run before a detector's regex is tried. Each check is a
+# *necessary* condition for its pattern to match anywhere, so a detector that
+# fails its check is skipped without changing the result.
+
+_ANY_DIGIT_RE = re.compile(r"\d")
+_COMPANY_HINTS = ("Co", "Inc", "LLC", "Ltd")   # prefixes of every suffix alternative
+
+
+def _has_digit(text: str) -> bool:
+    return _ANY_DIGIT_RE.search(text) is not None
+
+
+def _has_two(text: str, ch: str) -> bool:
+    i = text.find(ch)
+    return i != -1 and text.find(ch, i + 1) != -1
+
+
+# ========== SCAN BUDGET ==========
+
+class ScanBudgetExceeded(Exception):
+    """Raised by detect_all when the current scan_budget() deadline has passed."""
+
+
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("pp_scan_deadline", default=None)
+
+
+@contextmanager
+def scan_budget(seconds: Optional[float]):
+    """
+    Bound the total detection time for everything inside the block (e.g. one
+    request). The deadline is checked between detectors, so a single regex
+    call is never interrupted; with hardened patterns those stay linear.
+    """
+    if not seconds or seconds <= 0:
+        yield
+        return
+    token = _DEADLINE.set(time.perf_counter() + seconds)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+# Per-request detector time (slow-request capture); None = not collecting
+_TIMINGS: ContextVar[Optional[dict]] = ContextVar("pp_detector_timings", default=None)
+
+
+@contextmanager
+def detector_timings(out: Optional[dict]):
+    """Add seconds spent per detector inside the block to `out` (if not None)."""
+    if out is None:
+        yield
+        return
+    token = _TIMINGS.set(out)
+    try:
+        yield
+    finally:
+        _TIMINGS.reset(token)
+
+
+# ========== REGISTRY ==========
+
+# A finder gets the full text and yields (start, end) spans, like finditer would
+Finder = Callable[[str], Iterable[tuple[int, int]]]
+
+
+@dataclass
+class Detector:
+    """
+    One registered detector.
+
+    - match:    compiled regex (scanned with finditer) or a finder callable
+    - masker:   value -> replacement, used by transformers._mask_value
+    - precheck: cheap text -> bool; False means "cannot match, skip the scan"
+    - priority: lower runs first; on overlapping matches with the same start,
+                the lower priority wins when redacting
+    - max_len:  longest possible match, None if unbounded; sizes the overlap
+                of chunked/streaming redaction
+    """
+    name: str
+    match: Union[re.Pattern[str], Finder]
+    masker: Optional[Callable[[str], str]] = None
+    precheck: Optional[Callable[[str], bool]] = None
+    priority: int = 100
+    max_len: Optional[int] = None
+
+    # cost accounting (cumulative, per process)
+    calls: int = field(default=0, compare=False)
+    skipped: int = field(default=0, compare=False)
+    hits: int = field(default=0, compare=False)
+    seconds: float = field(default=0.0, compare=False)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "priority": self.priority,
+            "calls": self.calls,
+            "skipped": self.skipped,
+            "hits": self.hits,
+            "total_ms": round(self.seconds * 1000, 3),
+            "avg_ms": round(self.seconds * 1000 / self.calls, 4) if self.calls else 0.0,
+        }
+
+
+_REGISTRY: dict[str, Detector] = {}
+_ORDERED: list[Detector] = []   # registry sorted by priority, rebuilt on change
+# Bumped on every change to what detection/masking produces (caches key on it)
+_GENERATION = {"n": 0}
+
+
+def _changed() -> None:
+    _GENERATION["n"] += 1
+
+
+def config_generation() -> int:
+    return _GENERATION["n"]
+
+
+def mark_config_changed() -> None:
+    """For changes to masking made outside the registry (redaction mode, salt)."""
+    _changed()
+
+
+# ---- config fingerprint ----
+# config_generation() counts this process's changes, so two processes with
+# the same config rarely agree on it; anything shared between processes
+# (the multi-worker decision cache) keys on a digest of the config instead.
+
+_FINGERPRINT_SOURCES: list[Callable[[], str]] = []
+_FINGERPRINT = {"gen": -1, "digest": b""}
+
+
+def add_fingerprint_source(fn: Callable[[], str]) -> None:
+    """State outside the registry that changes what masking produces (redaction mode, salt)."""
+    _FINGERPRINT_SOURCES.append(fn)
+    _changed()
+
+
+def _value_id(v: Any, depth: int = 0) -> str:
+    # stable across processes: no memory addresses
+    if isinstance(v, re.Pattern):
+        return f"re:{v.pattern!r}:{v.flags}"
+    if callable(v):
+        return _callable_id(v, depth + 1)
+    if type(v).__repr__ is object.__repr__:
+        return type(v).__qualname__
+    return repr(v)
+
+
+def _callable_id(fn: Any, depth: int = 0) -> str:
+    if fn is None:
+        return ""
+    fp = getattr(fn, "fingerprint", None)
+    if callable(fp):
+        return fp()
+    parts = [getattr(fn, "__module__", "") or "", getattr(fn, "__qualname__", type(fn).__qualname__)]
+    if depth < 4:
+        # lambdas from config differ only in what they close over ({{TICKET}} vs {{BADGE}})
+        for cell in getattr(fn, "__closure__", None) or ():
+            try:
+                parts.append(_value_id(cell.cell_contents, depth))
+            except ValueError:
+                parts.append("<empty>")
+        parts.extend(_value_id(d, depth) for d in getattr(fn, "__defaults__", None) or ())
+    return ":".join(parts)
+
+
+def config_fingerprint() -> bytes:
+    """
+    16-byte digest of everything that decides detections and masks: the
+    detectors in scan order (pattern / finder, masker, priority, max_len) and
+    the registered sources. Equal configs give equal digests in any process.
+    Recomputed once per config_generation().
+    """
+    gen = _GENERATION["n"]
+    if _FINGERPRINT["gen"] != gen:
+        h = hashlib.blake2b(digest_size=16)
+        for d in _ORDERED:
+            match = _value_id(d.match) if isinstance(d.match, re.Pattern) else _callable_id(d.match)
+            h.update(f"{d.name}\0{match}\0{_callable_id(d.masker)}\0{d.priority}\0{d.max_len}\n"
+                     .encode("utf-8", "surrogatepass"))
+        for src in _FINGERPRINT_SOURCES:
+            h.update(src().encode("utf-8", "surrogatepass") + b"\n")
+        _FINGERPRINT["gen"], _FINGERPRINT["digest"] = gen, h.digest()
+    return _FINGERPRINT["digest"]
+
+
+def _reorder() -> None:
+    # sorted() is stable: equal priorities keep registration order
+    _ORDERED[:] = sorted(_REGISTRY.values(), key=lambda d: d.priority)
+    _changed()
+
+
+def register_detector(
+    name: str,
+    match: Union[re.Pattern[str], str, Finder],
+    *,
+    masker: Optional[Callable[[str], str]] = None,
+    precheck: Optional[Callable[[str], bool]] = None,
+    priority: int = 100,
+    max_len: Optional[int] = None,
+    replace: bool = False,
+) -> Detector:
+    """
+    Add a detector to the registry. `match` may be a regex string, a compiled
+    pattern, or a finder callable yielding (start, end) spans.
+    """
+    if name in _REGISTRY and not replace:
+        raise ValueError(f"detector already registered: {name}")
+    if isinstance(match, str):
+        match = re.compile(match)
+    det = Detector(name=name, match=match, masker=masker, precheck=precheck, priority=priority,
+                   max_len=max_len)
+    _REGISTRY[name] = det
+    _reorder()
+    return det
+
+
+def unregister_detector(name: str) -> None:
+    _REGISTRY.pop(name, None)
+    _reorder()
+
+
+def get_detector(name: str) -> Optional[Detector]:
+    return _REGISTRY.get(name)
+
+
+def set_masker(name: str, masker: Callable[[str], str]) -> None:
+    _REGISTRY[name].masker = masker
+    _changed()
+
+
+def detectors() -> List[Detector]:
+    """Registered detectors in scan (priority) order."""
+    return list(_ORDERED)
+
+
+def max_match_len(unbounded: int) -> int:
+    """Longest match any registered detector can produce; `unbounded` stands in for None."""
+    return max((d.max_len or unbounded for d in _ORDERED), default=0)
+
+
+def detector_stats() -> List[dict]:
+    return [d.stats() for d in _ORDERED]
+
+
+def reset_detector_stats() -> None:
+    for d in _REGISTRY.values():
+        d.calls = d.skipped = d.hits = 0
+        d.seconds = 0.0
+
+
+# ========== DICTIONARY DETECTOR ==========
+# For long term lists (customer / project / employee names): one Aho-Corasick
+# pass over the text no matter how many terms, where a regex alternation of
+# thousands of names would crawl. pyahocorasick (C) is used when installed,
+# else a pure Python automaton with the same results.
+
+def _fold(text: str) -> str:
+    # lower-case without moving offsets (a few chars lower to two, e.g. 'İ')
+    low = text.lower()
+    if len(low) == len(text):
+        return low
+    return "".join(c if len(lc := c.lower()) != 1 else lc for c in text)
+
+
+def _is_word(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+class _PyAutomaton:
+    """Aho-Corasick over str; find() -> (start, end) of every occurrence."""
+
+    backend = "python"
+
+    def __init__(self, terms: Iterable[str]):
+        goto: list[dict] = [{}]
+        out: list[tuple] = [()]
+        for t in terms:
+            node = 0
+            for c in t:
+                nxt = goto[node].get(c)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[node][c] = nxt
+                    goto.append({})
+                    out.append(())
+                node = nxt
+            out[node] = (len(t),)
+        # failure links breadth-first, so a node's fallback is done before it
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for c, child in goto[node].items():
+                f = fail[node]
+                while f and c not in goto[f]:
+                    f = fail[f]
+                fc = goto[f].get(c, 0) if node else 0
+                fail[child] = fc
+                if out[fc]:
+                    out[child] = out[child] + out[fc]
+                queue.append(child)
+        self.goto, self.fail, self.out = goto, fail, out
+
+    def find(self, hay: str) -> list[tuple[int, int]]:
+        goto, fail, out = self.goto, self.fail, self.out
+        spans = []
+        node = 0
+        for i, c in enumerate(hay):
+            nxt = goto[node].get(c)
+            while nxt is None and node:
+                node = fail[node]
+                nxt = goto[node].get(c)
+            node = nxt or 0
+            if out[node]:
+                end = i + 1
+                spans.extend((end - n, end) for n in out[node])
+        return spans
+
+
+class _CAutomaton:
+    backend = "pyahocorasick"
+
+    def __init__(self, terms: Iterable[str]):
+        self._a = ahocorasick.Automaton()
+        for t in terms:
+            self._a.add_word(t, len(t))
+        self._a.make_automaton()
+
+    def find(self, hay: str) -> list[tuple[int, int]]:
+        return [(end + 1 - n, end + 1) for end, n in self._a.iter(hay)]
+
+
+def read_terms(path: str) -> List[str]:
+    """One term per line; blank lines and lines starting with # are skipped."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [t for t in (line.strip() for line in f) if t and not t.startswith("#")]
+
+
+class Dictionary:
+    """
+    Finder matching any of a list of terms (use it as the `match` of a
+    detector). Overlapping hits resolve leftmost-longest; with whole_words a
+    hit must not continue a word on either side (like \\b around the term).
+
+    Loaded from `path` (see read_terms) or given `terms`. With a path, the
+    file's mtime is checked at most every `reload_s` seconds during scans;
+    a changed file is rebuilt in a background thread and swapped in when
+    ready, scans meanwhile use the old automaton.
+    """
+
+    def __init__(
+        self,
+        terms: Optional[Iterable[str]] = None,
+        *,
+        path: Optional[str] = None,
+        case_sensitive: bool = False,
+        whole_words: bool = True,
+        reload_s: float = 2.0,
+        backend: str = "auto",
+    ):
+        if backend not in ("auto", "python", "pyahocorasick"):
+            raise ValueError(f"unknown dictionary backend {backend!r}")
+        if backend == "pyahocorasick" and ahocorasick is None:
+            raise RuntimeError("the pyahocorasick backend needs `pip install pyahocorasick`")
+        self.path = path
+        self.case_sensitive = case_sensitive
+        self.whole_words = whole_words
+        self.reload_s = reload_s
+        self._backend = backend
+        self._automaton = None
+        self._digest = ""
+        self.terms = self.max_len = 0
+        self._min_len = 1
+        self._mtime: Optional[int] = None
+        self._next_check = 0.0
+        self._build_lock = threading.Lock()
+        self.reloads = 0
+        self.loaded_at = 0.0
+        self.build_s = 0.0
+        if path is not None:
+            self.reload()
+        else:
+            self._load(list(terms or ()))
+
+    def _load(self, terms: List[str]) -> None:
+        t0 = time.perf_counter()
+        keys = {t if self.case_sensitive else _fold(t) for t in terms if t}
+        cls = _CAutomaton if ahocorasick is not None and self._backend != "python" else _PyAutomaton
+        automaton = cls(keys) if keys else None
+        digest = hashlib.blake2b("\0".join(sorted(keys)).encode("utf-8", "surrogatepass"), digest_size=16)
+        # swap everything at once; a scan running now keeps its old automaton
+        self._automaton, self.terms, self._digest = automaton, len(keys), digest.hexdigest()
+        self.max_len = max(map(len, keys), default=0)
+        self._min_len = min(map(len, keys), default=1)
+        self.build_s = time.perf_counter() - t0
+        self.loaded_at = time.time()
+        for det in _REGISTRY.values():
+            if det.match is self:
+                det.max_len = self.max_len
+        _changed()
+
+    def reload(self) -> dict:
+        """Re-read the file now (no-op without a path); returns info()."""
+        if self.path is not None:
+            with self._build_lock:
+                mtime = os.stat(self.path).st_mtime_ns
+                self._load(read_terms(self.path))
+                self._mtime = mtime
+                self.reloads += 1
+        return self.info()
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.reload_s
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return      # gone / being replaced: keep the current terms
+        if mtime != self._mtime and self._build_lock.acquire(blocking=False):
+            threading.Thread(target=self._rebuild, name="pp-dictionary", daemon=True).start()
+
+    def _rebuild(self) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            self._load(read_terms(self.path))
+            self._mtime = mtime
+            self.reloads += 1
+        except OSError as e:
+            log.warning("dictionary reload of %s failed: %s", self.path, e)
+        finally:
+            self._build_lock.release()
+
+    def __call__(self, text: str) -> List[tuple[int, int]]:
+        if self.path is not None and self.reload_s:
+            self._maybe_reload()
+        automaton = self._automaton
+        if automaton is None or len(text) < self._min_len:
+            return []
+        spans = automaton.find(text if self.case_sensitive else _fold(text))
+        if not spans:
+            return spans
+        n = len(text)
+        out = []
+        cursor = 0
+        for start, end in sorted(spans, key=lambda se: (se[0], -se[1])):
+            if start < cursor:
+                continue
+            if self.whole_words and (
+                (start > 0 and _is_word(text[start - 1]) and _is_word(text[start]))
+                or (end < n and _is_word(text[end]) and _is_word(text[end - 1]))
+            ):
+                continue
+            out.append((start, end))
+            cursor = end
+        return out
+
+    def fingerprint(self) -> str:
+        """The term list and options (for config_fingerprint; the path and backend don't matter)."""
+        return f"dictionary:{self._digest}:{self.case_sensitive}:{self.whole_words}"
+
+    def info(self) -> dict:
+        return {
+            "path": self.path,
+            "terms": self.terms,
+            "max_len": self.max_len,
+            "backend": self._automaton.backend if self._automaton is not None else None,
+            "case_sensitive": self.case_sensitive,
+            "whole_words": self.whole_words,
+            "reloads": self.reloads,
+            "loaded_at": round(self.loaded_at, 3),
+            "build_ms": round(self.build_s * 1000, 1),
+        }
+
+
+def dictionaries() -> dict[str, Dictionary]:
+    return {d.name: d.match for d in _ORDERED if isinstance(d.match, Dictionary)}
+
+
+def reload_dictionaries() -> dict[str, dict]:
+    """Re-read every file-backed dictionary detector now."""
+    return {name: d.reload() for name, d in dictionaries().items()}
+
+
+# Built-ins, in the historical PATTERNS order (which is also overlap priority)
+_BUILTIN_PRECHECKS: dict[str, Callable[[str], bool]] = {
+    "email": lambda t: "@" in t,
+    "phone": lambda t: ("05" in t or "+" in t) and _has_digit(t),
+    "ipv4": lambda t: "." in t and _has_digit(t),
+    "ipv6": lambda t: ":" in t,
+    "jwt": lambda t: _has_two(t, "."),
+    "api_key": lambda t: len(t) >= 20,
+    "national_id": lambda t: "1" in t or "2" in t,
+    "company": lambda t: " " in t and any(h in t for h in _COMPANY_HINTS),
+}
+
+# Longest match per built-in (None = the default pattern is unbounded)
+_BUILTIN_MAX_LEN: dict[str, Optional[int]] = {
+    "email": None,
+    "phone": 13,
+    "ipv4": 15,
+    "ipv6": 39,
+    "jwt": None,
+    "api_key": 64,
+    "national_id": 10,
+    "company": None,
+}
+# ...and with the hardened patterns (email and JWT stay as unbounded as the defaults)
+_HARDENED_MAX_LEN = {"email": None, "jwt": None, "api_key": 64, "company": 8 * 64 + 7 + 1 + 12}
+
+for _i, (_name, _pattern) in enumerate(PATTERNS.items()):
+    register_detector(_name, _pattern, precheck=_BUILTIN_PRECHECKS[_name], priority=(_i + 1) * 10,
+                      max_len=_BUILTIN_MAX_LEN[_name])
+
+_STATE = {"hardened": False}
+
+
+def set_hardened(on: bool) -> None:
+    """
+    Swap the built-in detectors between the default and hardened patterns.
+    Detectors replaced from config are left alone.
+    """
+    if on and not HARDENED_PATTERNS:
+        raise RuntimeError("hardened detection needs Python 3.11+ (possessive quantifiers)")
+    for name, hard in HARDENED_PATTERNS.items():
+        det = _REGISTRY.get(name)
+        if det is not None and det.match in (PATTERNS[name], hard):
+            det.match = hard if on else PATTERNS[name]
+            det.max_len = _HARDENED_MAX_LEN[name] if on else _BUILTIN_MAX_LEN[name]
+    _STATE["hardened"] = on
+    _changed()
+
+
+def is_hardened() -> bool:
+    return _STATE["hardened"]
+
+
 ## Main function from detectors.py
 def detect_all(text: str) -> List[Detection]:
     """
@@ -94,19 +725,51 @@ def detect_all(text: str) -> List[Detection]:
         {"type": "ipv4", "start": 50, "end": 60, "value": "192.168.1.1"},
         ...
       ]
+
+    Detectors run in priority order; those whose precheck fails are skipped.
+    Raises ScanBudgetExceeded when running under an expired scan_budget().
     """
 
     detections: List[Detection] = []
-    for dtype, pattern in PATTERNS.items():
-        for m in pattern.finditer(text):
-            detections.append(
-                Detection(
-                    type=dtype,
-                    start=m.start(),
-                    end=m.end(),
-                    value=m.group(0),
+    if not text:
+        return detections
+
+    clock = time.perf_counter
+    deadline = _DEADLINE.get()
+    per_request = _TIMINGS.get()
+    for det in _ORDERED:
+        if deadline is not None and clock() > deadline:
+            raise ScanBudgetExceeded(det.name)
+        det.calls += 1
+        if det.precheck is not None and not det.precheck(text):
+            det.skipped += 1
+            continue
+        t0 = clock()
+        n = len(detections)
+        dtype = det.name
+        # the budget is checked per match too: one detector alone can overrun it
+        if isinstance(det.match, re.Pattern):
+            for m in det.match.finditer(text):
+                detections.append(
+                    Detection(
+                        type=dtype,
+                        start=m.start(),
+                        end=m.end(),
+                        value=m.group(0),
+                    )
                 )
-            )
+                if deadline is not None and clock() > deadline:
+                    raise ScanBudgetExceeded(dtype)
+        else:
+            for start, end in det.match(text):
+                detections.append(Detection(type=dtype, start=start, end=end, value=text[start:end]))
+                if deadline is not None and clock() > deadline:
+                    raise ScanBudgetExceeded(dtype)
+        det.hits += len(detections) - n
+        dt = clock() - t0
+        det.seconds += dt
+        if per_request is not None:
+            per_request[dtype] = per_request.get(dtype, 0.0) + dt
     return detections
 
 
@@ -0,0 +1,446 @@
+"""
+Background event logger for events.jsonl.
+
+log() only enqueues; a single writer thread owns the file handle, serialises
+events and writes them in batches (flushed when `batch_size` events are
+waiting or every `flush_interval` seconds). When the queue is full, events
+are dropped ("drop_new" keeps what is queued, "drop_oldest" keeps the newest)
+and counted, so a slow disk never stalls /inspect.
+
+Rotation: the live file is always `path` (events.jsonl). Once it passes
+`rotate_bytes` or is `rotate_seconds` old it is closed, renamed to a segment
+(events.<utc>-<n>.jsonl), compressed (gzip, or zstd if `zstandard` is
+installed) and recorded in events.manifest.json with its ts range and event
+count. Retention drops the oldest segments by count and/or age. Readers use
+segment_files()/iter_lines() to touch only the segments overlapping a window.
+
+shared=True is for several processes logging to the same path (multi-worker
+mode): every batch write and rotation happens under an flock on
+`<path>.lock`, and a writer whose file was rotated away by another process
+reopens the new one before writing. Without fcntl (Windows) writes are only
+O_APPEND, so leave rotation off there.
+"""
+
+from __future__ import annotations
+import gzip
+import io
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, TextIO
+
+from . import codec
+
+try:
+    import zstandard
+except ImportError:     # optional
+    zstandard = None
+
+try:
+    import fcntl
+except ImportError:     # not on Windows
+    fcntl = None
+
+DROP_POLICIES = ("drop_new", "drop_oldest")
+COMPRESSIONS = ("gzip", "zstd", "none")
+_SUFFIX = {"gzip": ".gz", "zstd": ".zst", "none": ""}
+
+_STOP = object()
+
+
+class EventLogger:
+    def __init__(
+        self,
+        path: str,
+        *,
+        max_queue: int = 10_000,
+        batch_size: int = 256,
+        flush_interval: float = 0.5,
+        drop_policy: str = "drop_new",
+        rotate_bytes: int = 0,
+        rotate_seconds: float = 0,
+        compress: str = "gzip",
+        retain_segments: int = 0,
+        retain_seconds: float = 0,
+        shared: bool = False,
+    ) -> None:
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"unknown drop policy {drop_policy!r}, expected one of {DROP_POLICIES}")
+        if compress not in COMPRESSIONS:
+            raise ValueError(f"unknown compression {compress!r}, expected one of {COMPRESSIONS}")
+        if compress == "zstd" and zstandard is None:
+            compress = "gzip"
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+        self._q: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._fh: Optional[TextIO] = None
+        self.logged = 0
+        self.dropped = 0
+        self.batches = 0
+
+        # rotation / retention (0 = disabled)
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.retain_segments = retain_segments
+        self.retain_seconds = retain_seconds
+        self.rotations = 0
+        self._seg: dict = {}
+        self.shared = shared
+
+    # ---- producer side (hot path) ----
+
+    def log(self, obj: dict) -> bool:
+        """Queue one event; returns False if it (or an older one) was dropped."""
+        try:
+            self._q.put_nowait(obj)
+            return True
+        except queue.Full:
+            pass
+        if self.drop_policy == "drop_oldest":
+            try:
+                self.dropped += _n_events(self._q.get_nowait())    # may be a whole log_many batch
+            except queue.Empty:
+                pass
+            try:
+                self._q.put_nowait(obj)
+                return False
+            except queue.Full:
+                pass
+        self.dropped += 1
+        return False
+
+    def log_many(self, objs: list[dict]) -> bool:
+        """Queue several events as one item; they reach the file in the same write."""
+        if not objs:
+            return True
+        item = list(objs)
+        try:
+            self._q.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        if self.drop_policy == "drop_oldest":
+            try:
+                self.dropped += _n_events(self._q.get_nowait())
+                self._q.put_nowait(item)
+                return False
+            except (queue.Empty, queue.Full):
+                pass
+        self.dropped += len(item)
+        return False
+
+    # ---- lifecycle ----
+
+    def start(self) -> "EventLogger":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="pp-eventlog", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush everything queued so far, then stop the writer."""
+        if self._thread is None:
+            return
+        self._q.put(_STOP)  # blocking put: the writer is draining
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "queued": self._q.qsize(),
+            "logged": self.logged,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "drop_policy": self.drop_policy,
+            "rotations": self.rotations,
+            "segment_bytes": self._seg.get("bytes", 0),
+            "shared": self.shared,
+        }
+
+    # ---- writer thread ----
+
+    def _open(self) -> TextIO:
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        fh = open(self.path, "a", encoding="utf-8")
+        size = fh.tell()
+        # A non-empty file left by an earlier run: its ts range is unknown
+        # until rotation reads it back.
+        self._seg = {"bytes": size, "count": 0, "min_ts": None, "max_ts": None,
+                     "opened": time.time(), "complete": size == 0}
+        return fh
+
+    @contextmanager
+    def _locked(self):
+        # cross-process exclusion around writes/rotation (shared mode only)
+        if not self.shared or fcntl is None:
+            yield
+            return
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        with open(self.path + ".lock", "a") as lf:
+            fcntl.flock(lf, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lf, fcntl.LOCK_UN)
+
+    def _rotated_away(self) -> bool:
+        # another process renamed the live file since we opened it
+        try:
+            return os.stat(self.path).st_ino != os.fstat(self._fh.fileno()).st_ino
+        except OSError:
+            return True
+
+    def _write(self, batch: list[dict]) -> None:
+        data = "".join(codec.dumps_line(o) + "\n" for o in batch)
+        with self._locked():
+            if self._fh is not None and self.shared and self._rotated_away():
+                self._reset_handle()
+            if self._fh is None:
+                self._fh = self._open()
+            self._fh.write(data)
+            self._fh.flush()
+            self.logged += len(batch)
+            self.batches += 1
+            self._account(batch, len(data))
+            if self._should_rotate():
+                self.rotate()
+
+    def _account(self, batch: list[dict], nbytes: int) -> None:
+        seg = self._seg
+        if self.shared:
+            # other processes write here too: size from the file, ts range on rotation
+            seg["bytes"] = os.fstat(self._fh.fileno()).st_size
+            seg["complete"] = False
+            return
+        seg["bytes"] += nbytes
+        seg["count"] += len(batch)
+        for o in batch:
+            ts = o.get("ts")
+            if isinstance(ts, (int, float)):
+                seg["min_ts"] = ts if seg["min_ts"] is None else min(seg["min_ts"], ts)
+                seg["max_ts"] = ts if seg["max_ts"] is None else max(seg["max_ts"], ts)
+
+    def _should_rotate(self) -> bool:
+        seg = self._seg
+        if self.rotate_bytes and seg.get("bytes", 0) >= self.rotate_bytes:
+            return True
+        if self.rotate_seconds and seg.get("bytes", 0) and time.time() - seg["opened"] >= self.rotate_seconds:
+            return True
+        return False
+
+    def rotate(self) -> Optional[dict]:
+        """Close the live file into a compressed segment (writer thread only)."""
+        self._reset_handle()
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return None
+        seg = self._seg or {"complete": False}
+        raw = _segment_name(self.path)
+        os.replace(self.path, raw)
+        entry = _compress_segment(raw, self.compress, None if seg.get("complete") else _scan_ts_range)
+        if seg.get("complete"):
+            entry.update(count=seg["count"], min_ts=seg["min_ts"], max_ts=seg["max_ts"])
+        manifest = read_manifest(self.path)
+        manifest["segments"].append(entry)
+        self._apply_retention(manifest)
+        _write_manifest(self.path, manifest)
+        self.rotations += 1
+        self._seg = {}
+        return entry
+
+    def _apply_retention(self, manifest: dict) -> None:
+        segs = manifest["segments"]
+        keep = segs
+        if self.retain_seconds:
+            cutoff = time.time() - self.retain_seconds
+            keep = [e for e in keep if (e.get("max_ts") or cutoff) >= cutoff]
+        if self.retain_segments and len(keep) > self.retain_segments:
+            keep = keep[-self.retain_segments:]
+        for e in segs:
+            if e not in keep:
+                try:
+                    os.remove(os.path.join(os.path.dirname(self.path), e["file"]))
+                except OSError:
+                    pass
+        manifest["segments"] = keep
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: list[dict] = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    item = self._q.get(timeout=max(0.0, timeout)) if timeout > 0 else self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                if isinstance(item, list):
+                    batch.extend(item)  # from log_many
+                else:
+                    batch.append(item)
+            try:
+                if batch:
+                    self._write(batch)
+                elif self._fh is not None and self._should_rotate():
+                    with self._locked():
+                        if not (self.shared and self._rotated_away()):
+                            self.rotate()   # time-based rotation on an idle log
+                        else:
+                            self._reset_handle()
+            except OSError:
+                # disk trouble: count the batch as dropped, retry the open next time
+                self.dropped += len(batch)
+                self._reset_handle()
+        self._reset_handle()
+
+    def _reset_handle(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except OSError:
+                pass
+            self._fh = None
+
+
+def _n_events(item) -> int:
+    # queue items are single events (log) or lists of them (log_many)
+    return len(item) if isinstance(item, list) else 1
+
+
+# ---- segments & manifest ----------------------------------------------------
+
+def _stem(path: str) -> str:
+    base = os.path.basename(path)
+    return base[:-len(".jsonl")] if base.endswith(".jsonl") else base
+
+
+def manifest_path(path: str) -> str:
+    return os.path.join(os.path.dirname(path), _stem(path) + ".manifest.json")
+
+
+def read_manifest(path: str) -> dict:
+    try:
+        with open(manifest_path(path), "r", encoding="utf-8") as f:
+            m = codec.loads(f.read())
+        if isinstance(m, dict) and isinstance(m.get("segments"), list):
+            return m
+    except (OSError, ValueError):
+        pass
+    return {"segments": []}
+
+
+def _write_manifest(path: str, manifest: dict) -> None:
+    mp = manifest_path(path)
+    tmp = mp + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(codec.dumps_compact(manifest))
+    os.replace(tmp, mp)     # readers never see a half-written manifest
+
+
+def _segment_name(path: str) -> str:
+    d = os.path.dirname(path)
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    n = 0
+    while True:
+        cand = os.path.join(d, f"{_stem(path)}.{stamp}-{n}.jsonl")
+        if not any(os.path.exists(cand + sfx) for sfx in _SUFFIX.values()):
+            return cand
+        n += 1
+
+
+def _scan_ts_range(line: str, acc: dict) -> None:
+    try:
+        ts = codec.loads(line).get("ts")
+    except Exception:
+        return
+    acc["count"] += 1
+    if isinstance(ts, (int, float)):
+        acc["min_ts"] = ts if acc["min_ts"] is None else min(acc["min_ts"], ts)
+        acc["max_ts"] = ts if acc["max_ts"] is None else max(acc["max_ts"], ts)
+
+
+def _compress_segment(raw: str, method: str, scan) -> dict:
+    """Compress `raw` next to itself and remove it; optionally scan ts per line."""
+    acc = {"count": 0, "min_ts": None, "max_ts": None}
+    dst = raw + _SUFFIX[method]
+    if method == "none" and scan is None:
+        pass
+    else:
+        with open(raw, "rb") as src:
+            if method == "gzip":
+                out = gzip.open(dst, "wb", compresslevel=6)
+            elif method == "zstd":
+                out = zstandard.ZstdCompressor(level=6).stream_writer(open(dst, "wb"))
+            else:
+                out = None
+            try:
+                for line in src:
+                    if out is not None:
+                        out.write(line)
+                    if scan is not None:
+                        scan(line.decode("utf-8", "replace"), acc)
+            finally:
+                if out is not None:
+                    out.close()
+        if out is not None:
+            os.remove(raw)
+    entry = {"file": os.path.basename(dst), "codec": method, "bytes": os.path.getsize(dst)}
+    if scan is not None:
+        entry.update(acc)
+    return entry
+
+
+def _open_segment(fp: str) -> TextIO:
+    if fp.endswith(".gz"):
+        return gzip.open(fp, "rt", encoding="utf-8")
+    if fp.endswith(".zst"):
+        if zstandard is None:
+            raise RuntimeError(f"{fp} is zstd-compressed; pip install zstandard")
+        raw = zstandard.ZstdDecompressor().stream_reader(open(fp, "rb"))
+        return io.TextIOWrapper(raw, encoding="utf-8")
+    return open(fp, "r", encoding="utf-8")
+
+
+def segment_files(path: str, start_ts: Optional[float] = None, end_ts: Optional[float] = None) -> list[str]:
+    """
+    Closed segments whose ts range overlaps [start_ts, end_ts], oldest first,
+    followed by the live file. Segments with an unknown range are included.
+    """
+    d = os.path.dirname(path)
+    out = []
+    for e in read_manifest(path)["segments"]:
+        lo, hi = e.get("min_ts"), e.get("max_ts")
+        if start_ts is not None and hi is not None and hi < start_ts:
+            continue
+        if end_ts is not None and lo is not None and lo > end_ts:
+            continue
+        fp = os.path.join(d, e["file"])
+        if os.path.exists(fp):
+            out.append(fp)
+    if os.path.exists(path):
+        out.append(path)
+    return out
+
+
+def iter_lines(path: str, start_ts: Optional[float] = None, end_ts: Optional[float] = None) -> Iterator[str]:
+    """Raw JSONL lines from every file segment_files() selects (not ts-filtered per line)."""
+    for fp in segment_files(path, start_ts, end_ts):
+        try:
+            with _open_segment(fp) as f:
+                yield from f
+        except FileNotFoundError:
+            continue    # rotated or expired while we were reading
@@ -0,0 +1,155 @@
+"""
+In-process metrics for GET /metrics (Prometheus text format 0.0.4).
+
+Counters and fixed-bucket histograms kept in plain dicts/lists behind one
+lock each; observing is a bisect plus a few increments, so it's cheap enough
+to run on every request. Nothing is exported unless /metrics is scraped.
+
+Stages of an /inspect request (seconds):
+
+  envelope_parse  decoding the /inspect JSON envelope (or batch array)
+  binary_check    non-text classification (MIME/filename + JSON walk)
+  json_parse      decoding the chat body
+  redaction       json_transform / redact_text, incl. re-encoding the body
+  serialisation   encoding the response
+  logging         handing the event to the logger
+
+Stages inside decide() are collected in a dict passed down as `stages`, so
+they are reported from worker processes too.
+
+With several server processes (proxy.serve --workers N), each one publishes
+snapshot() to the shared store and render(others) adds the other workers'
+snapshots to its own, so a scrape of any worker sees the whole server.
+"""
+
+from __future__ import annotations
+import re
+import threading
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Iterable, Optional
+
+# seconds; upper bounds, +Inf implied
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+STAGES = ("envelope_parse", "binary_check", "json_parse", "redaction", "serialisation", "logging")
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labelnames = name, help, labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, n: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + n
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(labels), v] for labels, v in self._values.items()]
+
+    def render(self, others: Iterable[list] = ()) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            values = dict(self._values)
+        for rows in others:
+            for labels, v in rows:
+                labels = tuple(labels)
+                values[labels] = values.get(labels, 0) + v
+        for labels, v in values.items():
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_num(v)}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, labels
+        self.buckets = buckets
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            s[0][i] += 1
+            s[1] += value
+
+    def snapshot(self) -> list:
+        with self._lock:
+            return [[list(labels), list(s[0]), s[1]] for labels, s in self._series.items()]
+
+    def render(self, others: Iterable[list] = ()) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = {labels: [list(s[0]), s[1]] for labels, s in self._series.items()}
+        for rows in others:
+            for labels, counts, total in rows:
+                s = series.setdefault(tuple(labels), [[0] * (len(self.buckets) + 1), 0.0])
+                if len(counts) == len(s[0]):
+                    s[0] = [a + b for a, b in zip(s[0], counts)]
+                    s[1] += total
+        for labels, (counts, total) in series.items():
+            acc = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {acc}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {acc}"
+
+
+# ---- the proxy's metrics ----
+
+REQUESTS = Counter("pp_inspect_requests_total", "Inspected payloads by decision.", ("action", "mode", "route"))
+DETECTIONS = Counter("pp_detections_total", "Payloads with at least one detection, by type.", ("type",))
+CACHE_HITS = Counter("pp_decision_cache_hits_total", "Payloads answered from the decision cache.")
+LATENCY = Histogram("pp_inspect_seconds", "Handler latency per request, by endpoint.", ("endpoint",))
+STAGE_LATENCY = Histogram("pp_inspect_stage_seconds", "Time per processing stage.", ("stage",))
+
+_ALL = (REQUESTS, DETECTIONS, CACHE_HITS, LATENCY, STAGE_LATENCY)
+
+# ids in paths (uuids, long hex/digits) would blow up the route label
+_ID_SEGMENT = re.compile(r"/(?:[0-9a-fA-F-]{16,}|\d+|[A-Za-z0-9_-]*\d[A-Za-z0-9_-]{15,})(?=/|$)")
+
+
+@lru_cache(maxsize=1024)
+def route_label(route: str) -> str:
+    return _ID_SEGMENT.sub("/:id", route or "") or "-"
+
+
+def observe_stages(stages: Optional[dict]) -> None:
+    if stages:
+        for name, seconds in stages.items():
+            STAGE_LATENCY.observe(seconds, name)
+
+
+def snapshot() -> dict:
+    """This process's values, JSON-able, for the shared store."""
+    return {m.name: m.snapshot() for m in _ALL}
+
+
+def render(others: Iterable[dict] = ()) -> str:
+    """Exposition text; `others` are snapshot()s of the other worker processes."""
+    others = list(others)
+    return "\n".join(line for m in _ALL for line in m.render([o.get(m.name, []) for o in others])) + "\n"
@@ -15,7 +15,9 @@ Behavior
 from __future__ import annotations
 import json
 import re
+import time
 import binascii
+import cProfile
 from typing import TypedDict, Optional, Any
 
 # ---------- Constants ---------------------------------------------------------
@@ -23,6 +25,8 @@ from typing import TypedDict, Optional, Any
 #For warn mode
 NON_TEXT_ALLOW_TOAST = "PrivPrompt: allowed non-text upload"
 NON_TEXT_BLOCK_TOAST = "PrivPrompt: blocked non-text upload"
+BUDGET_ALLOW_TOAST = "PrivPrompt: sent without full scan (too large)"
+BUDGET_BLOCK_TOAST = "PrivPrompt: blocked (too large to scan in time)"
 
 # Common binary extensions
 _BINARY_EXTS = (
@@ -59,24 +63,35 @@ _BASE64_SNIFFERS = (
     ("application/pdf", re.compile(r"JVBERi0x")),      # %PDF-
 )
 
+from .detectors import ScanBudgetExceeded, detector_timings, scan_budget
+from .profiler import profile_table
+
 # --- make transformers available everywhere (correct signatures) ---
 try:
-    from .transformers import json_transform, redact_text, looks_binary_like
+    from .transformers import NOT_JSON, json_transform, parse_body, redact_text, looks_binary_like
 except Exception:
+    NOT_JSON = object()
+
+    def parse_body(body_str: str) -> Any:
+        try:
+            return json.loads(body_str)
+        except Exception:
+            return NOT_JSON
+
     def redact_text(text: str, detections_out: list[str] | None = None) -> str:
         return text
 
-    def json_transform(body_str: str, transform, *, skip=None):
+    def json_transform(body_str: str, transform, *, skip=None, parsed=None, tab=None):
         detections: list[str] = []
         # honor skip predicate (e.g., base64/data: URL)
         if skip and isinstance(body_str, str) and skip(body_str):
             return None, detections
-        try:
-            json.loads(body_str)  # JSON → unchanged in fallback
-        except Exception:
+        if parsed is None:
+            parsed = parse_body(body_str)
+        if parsed is NOT_JSON:
             new = transform(body_str, detections)
             return (new if new != body_str else None), detections
-        return None, detections
+        return None, detections  # JSON → unchanged in fallback
 
     def looks_binary_like(_s: str) -> bool:
         return False
@@ -91,13 +106,43 @@ class Decision(TypedDict, total=False):
 
 # ---------- Utilities ---------------------------------------------------------
 
+_BASE64_CHARSET_RE = re.compile(r"[A-Za-z0-9+/=\s]+")
+# same charset as bytes to delete: valid ASCII input translates to b""
+# (\s in a str pattern also matches \x1c-\x1f)
+_BASE64_CHARSET_BYTES = (
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+    b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f"
+)
+_BASE64_WS = (" ", "\t", "\n", "\r", "\x0b", "\x0c", "\x1c", "\x1d", "\x1e", "\x1f")
+_BASE64_WS_PAD = "".join(_BASE64_WS) + "="
+_DATA_URL_HEAD_RE = re.compile(r"\s*data:([^;,\s]+);base64,", re.IGNORECASE)
+# all of _BASE64_SNIFFERS as plain substrings (str `in` beats a regex scan)
+_BASE64_SNIFF_LITERALS = tuple(lit for _, pat in _BASE64_SNIFFERS for lit in pat.pattern.split("|"))
+# base64 chars decoded for the magic check: 16 -> 12 bytes, enough for every
+# signature in _has_binary_magic (WEBP needs 12)
+_MAGIC_B64_CHARS = 16
+
+def _more_than_two(s: str, ch: str) -> bool:
+    # s.count(ch) > 2, stopping at the third hit
+    i = -1
+    for _ in range(3):
+        i = s.find(ch, i + 1)
+        if i == -1:
+            return False
+    return True
+
+def _is_base64_charset(s: str) -> bool:
+    if s.isascii():
+        return not s.encode("ascii").translate(None, _BASE64_CHARSET_BYTES)
+    return _BASE64_CHARSET_RE.fullmatch(s) is not None
+
 def _is_probably_base64(s: str) -> bool:
     # Coarse filter: charset + length + padding sanity
     if len(s) < 128:
         return False
-    if not re.fullmatch(r"[A-Za-z0-9+/=\s]+", s):
+    if _more_than_two(s, "="):
         return False
-    if s.count("=") > 2:
+    if not _is_base64_charset(s):
         return False
     return True
 
@@ -107,6 +152,38 @@ def _b64_to_bytes(s: str) -> Optional[bytes]:
     except Exception:
         return None
 
+def _b64_decodes(s: str) -> Optional[bool]:
+    """
+    Whether a2b_base64(s) succeeds, for ASCII strings in the base64 charset,
+    without decoding: it only fails on a bad data-char count vs. trailing
+    padding. None if there's '=' before the tail (then just decode).
+    """
+    i = len(s)
+    pads = 0
+    while i and s[i - 1] in _BASE64_WS_PAD:
+        pads += s[i - 1] == "="
+        i -= 1
+    if s.find("=", 0, i) != -1:
+        return None
+    # str.find is memchr-fast, str.count isn't: only count what's there
+    ws = [c for c in _BASE64_WS if s.find(c, 0, i) != -1]
+    r = (i - sum(s.count(c, 0, i) for c in ws)) % 4
+    return r == 0 or (r == 2 and pads >= 2) or (r == 3 and pads >= 1)
+
+def _b64_head(s: str) -> Optional[bytes]:
+    # The first bytes of a2b_base64(s) (None if that fails), decoding only
+    # enough of a base64-charset string to check its magic bytes.
+    # a2b_base64 refuses non-ASCII input (e.g. Unicode spaces) outright.
+    if not s.isascii():
+        return None
+    head = "".join(s[:4 * _MAGIC_B64_CHARS].split())[:_MAGIC_B64_CHARS]
+    if len(head) < _MAGIC_B64_CHARS or "=" in head:
+        return _b64_to_bytes(s)     # short or odd: the full decode is cheap or needed
+    ok = _b64_decodes(s)
+    if ok is None:
+        return _b64_to_bytes(s)
+    return _b64_to_bytes(head) if ok else None
+
 def _has_binary_magic(b: bytes) -> bool:
     # PNG
     if b.startswith(b"\x89PNG\r\n\x1a\n"): return True
@@ -147,90 +224,121 @@ def _looks_non_text(content_type: Optional[str], filename: Optional[str], body:
 
 # ---------- JSON Binary Detection --------------------------------------------
 
+_ATTACHMENT_KEYS = {
+    "attachments","files","file_ids","fileids","file_id","upload_id",
+    "asset_pointer","assetpointer","file_token","filetoken",
+    "image","image_url","imageurl","media","payload","blob",
+}
+_MIME_KEYS = {"mime","mime_type","mimetype","content_type"}
+_BINARY_PART_TYPES = {"input_image","image","input_audio","audio","input_video","video","file"}
+
+
+def _url_is_binary(u: str) -> bool:
+    ul = u.lower()
+    return ul.startswith(("blob:", "file:")) or ul.endswith(_BINARY_EXTS)
+
+
+def _key_declares_binary(kl: str, v: Any) -> bool:
+    """Cheap checks on one (lowercased suspect key, value) pair; no descent."""
+    # Attachment-ish containers
+    if kl in _ATTACHMENT_KEYS:
+        return True
+
+    if isinstance(v, str):
+        # MIME hints
+        if kl in _MIME_KEYS and _mime_is_binary(v):
+            return True
+        # Part "type" fields used by multi-modal chat payloads
+        if kl == "type" and v.lower() in _BINARY_PART_TYPES:
+            return True
+        # Filename / URL heuristics
+        if kl in {"filename","file_name"} and v.lower().endswith(_BINARY_EXTS):
+            return True
+        if kl in {"url","src"} and _url_is_binary(v):
+            return True
+
+    # Nested object resembling an attachment record
+    elif isinstance(v, dict):
+        mt = v.get("mime") or v.get("mime_type") or v.get("mimetype") or v.get("content_type") or v.get("mimeType")
+        if isinstance(mt, str) and _mime_is_binary(mt):
+            return True
+        fn = v.get("filename") or v.get("file_name")
+        if isinstance(fn, str) and fn.lower().endswith(_BINARY_EXTS):
+            return True
+        u = v.get("url") or v.get("src")
+        if isinstance(u, str) and _url_is_binary(u):
+            return True
+    return False
+
+
+def _data_url_payload(s: str) -> Optional[str]:
+    # _DATA_URL_RE.match(s.strip()).group(2), without copying or regex-scanning the payload
+    m = _DATA_URL_HEAD_RE.match(s)
+    if not m:
+        return None
+    payload = s[m.end():]
+    if not payload or payload.isspace() or not _is_base64_charset(payload):
+        return None
+    return payload
+
+
+def _string_embeds_binary(s: str) -> bool:
+    # data URL
+    payload = _data_url_payload(s)
+    if payload is not None:
+        b = _b64_head(payload)
+        return bool(b and _has_binary_magic(b))
+    # large base64 anywhere
+    if _is_probably_base64(s):
+        if any(lit in s for lit in _BASE64_SNIFF_LITERALS):
+            return True
+        b = _b64_head(s)
+        return bool(b and _has_binary_magic(b))
+    return False
+
+
 def _json_declares_or_embeds_binary(obj: Any) -> bool:
     """
     Returns True if JSON either:
       - embeds binary via data URLs/base64 that decode to known binary signatures, OR
       - declares/points to binary attachments via common schema patterns used by chat payloads.
-    """
-    # Strings
-    if isinstance(obj, str):
-        # data URL
-        m = _DATA_URL_RE.match(obj.strip())
-        if m:
-            b = _b64_to_bytes(m.group(2))
-            return bool(b and _has_binary_magic(b))
-        # large base64 anywhere
-        if _is_probably_base64(obj):
-            for _, pat in _BASE64_SNIFFERS:
-                if pat.search(obj):
-                    return True
-            b = _b64_to_bytes(obj)
-            return bool(b and _has_binary_magic(b))
-        return False
-
-    # Lists
-    if isinstance(obj, list):
-        return any(_json_declares_or_embeds_binary(v) for v in obj)
-
-    # Dicts
-    if isinstance(obj, dict):
-        for k, v in obj.items():
-            kl = k.lower()
-
-            # Recurse first (nested structures often hide payloads)
-            if _json_declares_or_embeds_binary(v):
-                return True
-
-            # Skip keys we don't care about quickly
-            if kl not in _SUSPECT_KEYS:
-                continue
-
-            # Attachment-ish containers
-            if kl in {
-                "attachments","files","file_ids","fileids","file_id","upload_id",
-                "asset_pointer","assetpointer","file_token","filetoken",
-                "image","image_url","imageurl","media","payload","blob"
-            }:
-                return True
-
-            # MIME hints
-            if kl in {"mime","mime_type","mimetype","content_type","mimetype","mimetype"} and isinstance(v, str):
-                if _mime_is_binary(v):
-                    return True
 
-            # Part "type" fields used by multi-modal chat payloads
-            if kl == "type" and isinstance(v, str) and v.lower() in {
-                "input_image","image","input_audio","audio","input_video","video","file"
-            }:
-                return True
-
-            # Filename / URL heuristics
-            if kl in {"filename","file_name"} and isinstance(v, str) and v.lower().endswith(_BINARY_EXTS):
-                return True
-            if kl in {"url","src"} and isinstance(v, str):
-                vl = v.lower()
-                if vl.startswith(("blob:", "file:")) or vl.endswith(_BINARY_EXTS):
-                    return True
-
-            # Nested object resembling an attachment record
-            if isinstance(v, dict):
-                mt = v.get("mime") or v.get("mime_type") or v.get("mimetype") or v.get("content_type") or v.get("mimeType")
-                if isinstance(mt, str) and _mime_is_binary(mt):
-                    return True
-                fn = v.get("filename") or v.get("file_name")
-                if isinstance(fn, str) and fn.lower().endswith(_BINARY_EXTS):
+    Walks the tree iteratively (no recursion limit on deep payloads) and
+    checks every key/type signal first; strings that could be base64 or data
+    URLs are only looked at once the structure turned up nothing, and then
+    only their first bytes are decoded.
+    """
+    candidates: list[str] = []
+    stack = [obj]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, dict):
+            for k, v in x.items():
+                if isinstance(v, (dict, list)):
+                    stack.append(v)
+                elif isinstance(v, str) and (len(v) >= 128 or _DATA_URL_HEAD_RE.match(v)):
+                    candidates.append(v)
+                kl = k.lower() if isinstance(k, str) else k
+                # Skip keys we don't care about quickly
+                if kl in _SUSPECT_KEYS and _key_declares_binary(kl, v):
                     return True
-                u = v.get("url") or v.get("src")
-                if isinstance(u, str):
-                    ul = u.lower()
-                    if ul.startswith(("blob:", "file:")) or ul.endswith(_BINARY_EXTS):
-                        return True
-
-        return False
-
-    # Anything else
-    return False
+        elif isinstance(x, list):
+            for v in x:
+                if isinstance(v, (dict, list)):
+                    stack.append(v)
+                elif isinstance(v, str) and (len(v) >= 128 or _DATA_URL_HEAD_RE.match(v)):
+                    candidates.append(v)
+        elif isinstance(x, str):
+            candidates.append(x)
+
+    return any(_string_embeds_binary(s) for s in candidates)
+
+def _lap(stages: Optional[dict], name: str, t0: float) -> float:
+    # add the time since t0 to stages[name] (if collecting); returns now
+    t = time.perf_counter()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + (t - t0)
+    return t
 
 # ---------- Main Policy -------------------------------------------------------
 
@@ -241,7 +349,12 @@ def decide(
     body: Optional[str | bytes],
     *,
     content_type: Optional[str] = None,
-    filename: Optional[str] = None
+    filename: Optional[str] = None,
+    budget_s: Optional[float] = None,
+    tab_id: Optional[Any] = None,
+    stages: Optional[dict] = None,
+    trace: Optional[dict] = None,
+    profile: bool = False
 ) -> Decision:
     """
     Centralized policy:
@@ -253,12 +366,72 @@ def decide(
       Plain text/JSON (no binary):
         - Use json_transform + redact_text.
         - In 'block', block only if violations were detected.
+
+      tab_id (the extension's tabId) only lets json_transform reuse the
+      redaction of messages already inspected in that tab's conversation;
+      the result is the same with or without it.
+
+      stages, if a dict, gets seconds spent per stage added to it
+      ("binary_check", "json_parse", "redaction") for /metrics.
+
+      trace, if a dict, gets seconds per detector under "detectors" and,
+      with profile=True, this call's cProfile table under "profile"
+      (see profiler.py); both only feed the slow-request log.
+
+      Scan budget (budget_s) exceeded:
+        - 'strict' & 'block'  -> block with BUDGET_BLOCK_TOAST
+        - 'warn'              -> allow unmodified with BUDGET_ALLOW_TOAST
     """
+    if trace is not None:
+        return _decide_traced(mode, kind, url, body, trace, profile, content_type=content_type,
+                              filename=filename, budget_s=budget_s, tab_id=tab_id, stages=stages)
+    try:
+        with scan_budget(budget_s):
+            return _decide(mode, kind, url, body, content_type=content_type, filename=filename, tab_id=tab_id,
+                           stages=stages)
+    except ScanBudgetExceeded:
+        if (mode or "").lower() in ("strict", "block"):
+            return {"action": "block", "notify": {"message": BUDGET_BLOCK_TOAST}, "detected": []}
+        return {"action": "allow", "notify": {"message": BUDGET_ALLOW_TOAST}, "detected": []}
+
+
+def _decide_traced(mode, kind, url, body, trace: dict, profile: bool, **kwargs) -> Decision:
+    detectors: dict = {}
+    prof = cProfile.Profile() if profile else None
+    if prof is not None:
+        try:
+            prof.enable()
+        except ValueError:      # another profiler already running in this thread
+            prof = None
+    try:
+        with detector_timings(detectors):
+            return decide(mode, kind, url, body, **kwargs)
+    finally:
+        if prof is not None:
+            prof.disable()
+            trace["profile"] = profile_table(prof)
+        trace["detectors"] = detectors
+
+
+def _decide(
+    mode: str,
+    kind: str,
+    url: str,
+    body: Optional[str | bytes],
+    *,
+    content_type: Optional[str] = None,
+    filename: Optional[str] = None,
+    tab_id: Optional[Any] = None,
+    stages: Optional[dict] = None
+) -> Decision:
     mode = (mode or "").lower()
     kind = (kind or "").lower()
+    t = time.perf_counter()
 
     # 1) Obvious non-text by MIME/ext/bytes
-    if _looks_non_text(content_type, filename, body):
+    non_text = _looks_non_text(content_type, filename, body)
+    t = _lap(stages, "binary_check", t)
+    if non_text:
         if mode in ("strict", "block"):
             return {"action": "block", "notify": {"message": NON_TEXT_BLOCK_TOAST}, "detected": []}
         return {"action": "allow", "notify": {"message": NON_TEXT_ALLOW_TOAST}, "detected": []}
@@ -270,19 +443,19 @@ def decide(
         return {"action": "allow", "notify": {"message": NON_TEXT_ALLOW_TOAST}, "detected": []}
 
     # 3) JSON that *declares/embeds* binary even without base64 bytes in this request
-    is_json = False
-    parsed = None
-    try:
-        parsed = json.loads(body)
-        is_json = True
-    except Exception:
-        is_json = False
-
-    if is_json and _json_declares_or_embeds_binary(parsed):
+    # The body is decoded once here; the same tree goes to json_transform.
+    parsed = parse_body(body)
+    is_json = parsed is not NOT_JSON
+    t = _lap(stages, "json_parse", t)
+
+    embeds_binary = is_json and _json_declares_or_embeds_binary(parsed)
+    t = _lap(stages, "binary_check", t)
+    if embeds_binary:
         if mode in ("strict", "block"):
             return {"action": "block", "notify": {"message": NON_TEXT_BLOCK_TOAST}, "detected": []}
         # warn: allow non-text, but still sanitize textual fields
-        new_body, detections = json_transform(body, redact_text, skip=looks_binary_like)
+        new_body, detections = json_transform(body, redact_text, skip=looks_binary_like, parsed=parsed, tab=tab_id)
+        _lap(stages, "redaction", t)
         if new_body is not None and new_body != body:
             return {
                 "action": "modify",
@@ -299,7 +472,8 @@ def decide(
     
 
     if is_json:
-        new_body, detections = json_transform(body, redact_text, skip=looks_binary_like)
+        new_body, detections = json_transform(body, redact_text, skip=looks_binary_like, parsed=parsed, tab=tab_id)
+        _lap(stages, "redaction", t)
         has_violation = bool(detections)
         if mode == "block" and has_violation:
             return {
@@ -318,7 +492,8 @@ def decide(
 
 
     # Plain text (not JSON) – run through the same transformer
-    new_body, detections = json_transform(body, redact_text, skip=looks_binary_like)
+    new_body, detections = json_transform(body, redact_text, skip=looks_binary_like, parsed=parsed, tab=tab_id)
+    _lap(stages, "redaction", t)
     has_violation = bool(detections)
     if mode == "block" and has_violation:
         return {
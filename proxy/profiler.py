@@ -0,0 +1,159 @@
+"""
+Opt-in profiling for slow /inspect requests.
+
+Two independent switches, both changeable at runtime (POST /admin/profile):
+
+  slow_ms   requests taking at least this long end up as one JSON line in
+            the slow log: stage breakdown, body size, per-detector time and,
+            while profiling is on, that request's top functions. The body
+            itself is never written, only a blake2b hash of it (0 = off)
+  profiling every decide() runs under cProfile, in whichever thread or
+            worker process executes it; the per-request tables are summed
+            here and GET /admin/profile shows the hottest functions
+
+Slow capture on its own is cheap (a few dict updates per request);
+cProfile makes decide() several times slower (3-6x on the benchmark
+corpus, pstats conversion included), so only turn it on while looking.
+"""
+
+from __future__ import annotations
+import cProfile
+import hashlib
+import os
+import pstats
+import threading
+import time
+from typing import Optional
+
+from . import codec
+
+SORT_KEYS = ("tottime", "cumtime", "calls")
+_COLUMNS = {"calls": 1, "tottime": 2, "cumtime": 3}
+
+
+def _func_label(func: tuple) -> str:
+    filename, line, name = func
+    if filename == "~":             # builtins: ('~', 0, "<method 'sub' of ...>")
+        return name
+    return f"{os.path.basename(filename)}:{line}({name})"
+
+
+def profile_table(prof: cProfile.Profile) -> dict:
+    """{"file:line(func)": [primitive calls, calls, tottime, cumtime]} of a finished profile.
+
+    Plain lists and strings so it pickles cheaply out of worker processes and
+    can be written as JSON.
+    """
+    stats = pstats.Stats(prof).stats
+    return {_func_label(func): [cc, nc, tt, ct] for func, (cc, nc, tt, ct, _callers) in stats.items()}
+
+
+def top_functions(table: dict, limit: int = 20, sort: str = "tottime") -> list:
+    col = _COLUMNS.get(sort, 2)
+    rows = sorted(table.items(), key=lambda kv: kv[1][col], reverse=True)[:limit]
+    return [{"function": fn, "calls": nc, "tottime_ms": round(tt * 1000, 3), "cumtime_ms": round(ct * 1000, 3)}
+            for fn, (_cc, nc, tt, ct) in rows]
+
+
+def body_hash(body) -> Optional[str]:
+    if body is None:
+        return None
+    if isinstance(body, str):
+        body = body.encode("utf-8", "surrogatepass")
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class Profiler:
+    def __init__(self, *, slow_ms: float = 0.0, slow_log: str = "", profiling: bool = False):
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self.profiling = profiling
+        self._hot: dict = {}
+        self._lock = threading.Lock()
+        self.profiled = 0
+        self.slow = 0
+        self.since = time.time()
+
+    @property
+    def collecting(self) -> bool:
+        """Whether requests should bring back a trace (detector times / profile) at all."""
+        return self.profiling or self.slow_ms > 0
+
+    def add_profile(self, table: dict) -> None:
+        with self._lock:
+            hot = self._hot
+            for fn, (cc, nc, tt, ct) in table.items():
+                row = hot.get(fn)
+                if row is None:
+                    hot[fn] = [cc, nc, tt, ct]
+                else:
+                    row[0] += cc
+                    row[1] += nc
+                    row[2] += tt
+                    row[3] += ct
+            self.profiled += 1
+
+    def hot(self, limit: int = 30, sort: str = "tottime") -> list:
+        with self._lock:
+            table = {fn: list(row) for fn, row in self._hot.items()}
+        return top_functions(table, limit, sort)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hot.clear()
+            self.profiled = 0
+            self.since = time.time()
+
+    def record(self, *, route: str, endpoint: str, duration_s: float, body, stages: Optional[dict],
+               trace: Optional[dict], decision: Optional[dict] = None, status: int = 200) -> bool:
+        """Account one finished request; writes a slow-log line if it crossed slow_ms."""
+        profile = (trace or {}).get("profile")
+        if profile:
+            self.add_profile(profile)
+        if not self.slow_ms or duration_s * 1000 < self.slow_ms:
+            return False
+        size = len(body.encode("utf-8", "surrogatepass")) if isinstance(body, str) else len(body or b"")
+        entry = {
+            "ts": round(time.time(), 3),
+            "endpoint": endpoint,
+            "route": route,
+            "status": status,
+            "duration_ms": round(duration_s * 1000, 3),
+            "body_bytes": size,
+            "body_blake2b": body_hash(body),
+            "action": (decision or {}).get("action"),
+            "detected": list((decision or {}).get("detected", [])),
+            "stages_ms": {k: round(v * 1000, 3) for k, v in (stages or {}).items()},
+            "detectors_ms": {k: round(v * 1000, 3) for k, v in ((trace or {}).get("detectors") or {}).items()},
+        }
+        if profile:
+            entry["top_functions"] = top_functions(profile, 15)
+        self.slow += 1
+        if self.slow_log:
+            line = codec.dumps_line(entry) + "\n"
+            with self._lock:
+                d = os.path.dirname(self.slow_log)
+                if d:
+                    os.makedirs(d, exist_ok=True)
+                with open(self.slow_log, "a", encoding="utf-8") as f:
+                    f.write(line)
+        return True
+
+    def status(self) -> dict:
+        return {
+            "profiling": self.profiling,
+            "slow_ms": self.slow_ms,
+            "slow_log": self.slow_log,
+            "slow_requests": self.slow,
+            "profiled_requests": self.profiled,
+            "since": round(self.since, 3),
+        }
+
+
+PROFILER = Profiler()
+
+
+def configure_profiler(*, slow_ms: float, slow_log: str, profiling: bool) -> None:
+    PROFILER.slow_ms = slow_ms
+    PROFILER.slow_log = slow_log
+    PROFILER.profiling = profiling
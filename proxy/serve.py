@@ -0,0 +1,40 @@
+"""
+Multi-worker launcher: one listening socket, N copies of proxy.app in
+separate processes, shared state in a SQLite file (see proxy/shared.py).
+
+    python -m proxy.serve --workers 4 [--host 127.0.0.1] [--port 8787]
+
+The state file (PP_SHARED_STATE, default `state.sqlite` next to the event
+log) is reset on start: a fresh salt, empty shared decision cache, no stale
+worker metrics. Any other pre-fork server works too as long as every worker
+sees the same PP_SHARED_STATE, e.g.
+
+    PP_SHARED_STATE=proxy/logs/state.sqlite gunicorn -k uvicorn.workers.UvicornWorker -w 4 proxy.app:app
+"""
+
+import argparse
+import os
+
+from .shared import SharedStore
+from .utils import LOG_PATH, PORT
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=PORT)
+    ap.add_argument("--log-level", default="info")
+    args = ap.parse_args()
+
+    import uvicorn
+
+    path = os.environ.setdefault("PP_SHARED_STATE", os.path.join(os.path.dirname(LOG_PATH), "state.sqlite"))
+    SharedStore(path).reset()
+    # workers are spawned and read PP_SHARED_STATE from the environment
+    uvicorn.run("proxy.app:app", host=args.host, port=args.port, workers=max(1, args.workers),
+                log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
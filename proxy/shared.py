@@ -0,0 +1,191 @@
+"""
+State shared by the worker processes of a multi-worker proxy.
+
+`python -m proxy.serve --workers N` (or any pre-fork server with
+PP_SHARED_STATE pointing at the same file) runs several copies of the app;
+anything that must agree between them lives in one SQLite file in WAL mode:
+
+  salt       the salt behind get_salt()/rotate_salt() and its rotation
+             count; each worker re-reads it at most every `refresh_s`, so a
+             rotation reaches the others within that time
+  decisions  second-level decision cache behind each worker's in-memory
+             DecisionCache (keyed by detector config digest + body digest)
+  workers    each worker's counters/histograms, published every `refresh_s`
+             and summed by whichever worker answers /metrics
+  vault      opt-in (PP_SHARED_VAULT): pseudonym token -> original value, so
+             /reidentify works on whichever worker gets the request. This
+             puts the original values on disk, next to the event log
+
+SQLite does the cross-process locking; each thread gets its own connection.
+"""
+
+from __future__ import annotations
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from . import codec
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, v TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS decisions (key BLOB PRIMARY KEY, expires REAL NOT NULL, decision TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS decisions_expires ON decisions (expires);
+CREATE TABLE IF NOT EXISTS workers (id TEXT PRIMARY KEY, pid INTEGER, started REAL, seen REAL, metrics TEXT);
+CREATE TABLE IF NOT EXISTS vault (token TEXT PRIMARY KEY, value TEXT NOT NULL, added REAL NOT NULL);
+"""
+
+_PRUNE_EVERY = 256      # puts between sweeps of expired / excess decisions and vault entries
+
+
+class SharedStore:
+    def __init__(self, path: str, *, refresh_s: float = 1.0, max_decisions: int = 65536, max_vault: int = 100_000):
+        self.path = path
+        self.refresh_s = refresh_s
+        self.max_decisions = max_decisions
+        self.max_vault = max_vault
+        self._local = threading.local()
+        self._salt: Optional[tuple[str, int]] = None
+        self._salt_checked = 0.0
+        self._puts = self._vault_puts = 0
+        self.hits = self.misses = 0
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._db().executescript(_SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # autocommit; writers wait for each other instead of failing
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def reset(self) -> None:
+        """Start from scratch (the launcher does this once, before forking workers)."""
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            db.execute("DELETE FROM kv")
+            db.execute("DELETE FROM decisions")
+            db.execute("DELETE FROM workers")
+            db.execute("DELETE FROM vault")
+
+    # ---- salt ----
+
+    def _read_salt(self) -> tuple[str, int]:
+        db = self._db()
+        rows = dict(db.execute("SELECT k, v FROM kv WHERE k IN ('salt', 'salt_rotations')").fetchall())
+        if "salt" not in rows:
+            # first worker to get here picks it; the others read that one
+            db.execute("INSERT OR IGNORE INTO kv VALUES ('salt', ?)", (secrets.token_hex(8),))
+            db.execute("INSERT OR IGNORE INTO kv VALUES ('salt_rotations', '0')")
+            rows = dict(db.execute("SELECT k, v FROM kv WHERE k IN ('salt', 'salt_rotations')").fetchall())
+        return rows["salt"], int(rows.get("salt_rotations", 0))
+
+    def salt_stale(self) -> bool:
+        """True when the next salt() reads the file (callers on an event loop thread it)."""
+        return self._salt is None or time.monotonic() - self._salt_checked >= self.refresh_s
+
+    def salt(self) -> tuple[str, int]:
+        """(salt, rotations), re-read from the file at most every refresh_s."""
+        now = time.monotonic()
+        if self._salt is None or now - self._salt_checked >= self.refresh_s:
+            self._salt = self._read_salt()
+            self._salt_checked = now
+        return self._salt
+
+    def rotate_salt(self) -> tuple[str, int]:
+        db = self._db()
+        salt = secrets.token_hex(8)
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            row = db.execute("SELECT v FROM kv WHERE k = 'salt_rotations'").fetchone()
+            n = int(row[0]) + 1 if row else 1
+            db.execute("INSERT OR REPLACE INTO kv VALUES ('salt', ?)", (salt,))
+            db.execute("INSERT OR REPLACE INTO kv VALUES ('salt_rotations', ?)", (str(n),))
+        self._salt = (salt, n)
+        self._salt_checked = time.monotonic()
+        return self._salt
+
+    # ---- decisions ----
+
+    def get_decision(self, key: bytes) -> Optional[dict]:
+        row = self._db().execute("SELECT expires, decision FROM decisions WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] < time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return codec.loads(row[1])
+
+    def put_decision(self, key: bytes, decision: dict, ttl_s: float) -> None:
+        db = self._db()
+        db.execute("INSERT OR REPLACE INTO decisions VALUES (?, ?, ?)",
+                   (key, time.time() + ttl_s, codec.dumps_compact(decision)))
+        self._puts += 1
+        if self._puts % _PRUNE_EVERY == 0:
+            self._prune(db)
+
+    def _prune(self, db: sqlite3.Connection) -> None:
+        db.execute("DELETE FROM decisions WHERE expires < ?", (time.time(),))
+        # past the cap, the ones closest to expiring go first
+        db.execute("DELETE FROM decisions WHERE key IN (SELECT key FROM decisions ORDER BY expires DESC "
+                   "LIMIT -1 OFFSET ?)", (self.max_decisions,))
+
+    def clear_decisions(self) -> None:
+        self._db().execute("DELETE FROM decisions")
+
+    # ---- pseudonym vault ----
+
+    def vault_put(self, pairs: list) -> None:
+        db = self._db()
+        with db:
+            db.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            db.executemany("INSERT OR IGNORE INTO vault VALUES (?, ?, ?)", [(t, v, now) for t, v in pairs])
+            self._vault_puts += 1
+            if self._vault_puts % _PRUNE_EVERY == 0:
+                # oldest first, like the in-memory vault
+                db.execute("DELETE FROM vault WHERE token IN (SELECT token FROM vault ORDER BY added DESC "
+                           "LIMIT -1 OFFSET ?)", (self.max_vault,))
+
+    def vault_get(self, tokens: list) -> dict:
+        out = {}
+        db = self._db()
+        for i in range(0, len(tokens), 500):      # SQLite's bound-parameter limit
+            chunk = tokens[i:i + 500]
+            q = f"SELECT token, value FROM vault WHERE token IN ({','.join('?' * len(chunk))})"
+            out.update(db.execute(q, chunk).fetchall())
+        return out
+
+    # ---- per-worker metrics ----
+
+    def publish(self, worker_id: str, snapshot: dict, started: float) -> None:
+        self._db().execute("INSERT OR REPLACE INTO workers VALUES (?, ?, ?, ?, ?)",
+                           (worker_id, os.getpid(), started, time.time(), codec.dumps_compact(snapshot)))
+
+    def worker_snapshots(self, exclude: str = "") -> list[dict]:
+        rows = self._db().execute("SELECT metrics FROM workers WHERE id != ?", (exclude,)).fetchall()
+        return [codec.loads(r[0]) for r in rows if r[0]]
+
+    def workers(self) -> list[dict]:
+        rows = self._db().execute("SELECT id, pid, started, seen FROM workers ORDER BY started").fetchall()
+        return [{"id": i, "pid": pid, "started": started, "seen": seen} for i, pid, started, seen in rows]
+
+    def stats(self) -> dict:
+        n = self._db().execute("SELECT COUNT(*) FROM decisions").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "decisions": n,
+            "max_decisions": self.max_decisions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "salt_rotations": self.salt()[1],
+        }
@@ -0,0 +1,281 @@
+"""
+Streaming redaction of text/event-stream responses (used by the relay).
+
+SSERedactor takes the upstream body chunk by chunk, cuts it into events at
+blank lines, and rewrites the text carried by JSON `data:` payloads. One
+StreamRedactor runs per text channel, so PII split across events is still
+caught, up to `window` characters long. The payload shapes it understands:
+
+  - delta patches:  {"p": "/message/content/parts/0", "o": "append", "v": "..."}
+                    (also {"v": "..."} continuing the last path, and
+                    {"o": "patch", "v": [...]} lists of those)
+  - cumulative:     {"message": {"id": ..., "content": {"parts": ["text so far"]}}}
+  - OpenAI-style:   {"choices": [{"index": 0, "delta": {"content": "..."}}]}
+
+Other events (and non-JSON data) pass through byte for byte. Text held back
+by a channel is released at `data: [DONE]` or at the end of the stream as one
+extra event in the channel's own shape.
+
+Per-chunk processing time is recorded in STATS (served at /relay/stats).
+"""
+
+from __future__ import annotations
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+from . import codec
+from .transformers import StreamRedactor
+
+_CONTENT_PART = "/message/content/parts/"
+
+
+class RelayStats:
+    """Cumulative SSE redaction counters plus a window of recent chunk timings."""
+
+    def __init__(self, keep: int = 10_000):
+        self.streams = 0
+        self.chunks = 0
+        self.events = 0
+        self.rewritten = 0
+        self.seconds = 0.0
+        self.max_s = 0.0
+        self.detected: dict[str, int] = {}
+        self._recent: deque = deque(maxlen=keep)
+
+    def chunk(self, seconds: float) -> None:
+        self.chunks += 1
+        self.seconds += seconds
+        self.max_s = max(self.max_s, seconds)
+        self._recent.append(seconds)
+
+    def snapshot(self) -> dict:
+        recent = sorted(self._recent)
+
+        def pct(p: float) -> float:
+            if not recent:
+                return 0.0
+            return round(recent[min(len(recent) - 1, int(p / 100 * len(recent)))] * 1000, 4)
+
+        return {
+            "streams": self.streams,
+            "chunks": self.chunks,
+            "events": self.events,
+            "events_rewritten": self.rewritten,
+            "detected": dict(self.detected),
+            "chunk_ms_avg": round(self.seconds * 1000 / self.chunks, 4) if self.chunks else 0.0,
+            "chunk_ms_p50": pct(50),
+            "chunk_ms_p99": pct(99),
+            "chunk_ms_max": round(self.max_s * 1000, 4),
+        }
+
+    def reset(self) -> None:
+        self.__init__(self._recent.maxlen)
+
+
+STATS = RelayStats()
+
+
+class _Channel:
+    """One text stream inside the SSE body and how to emit leftovers for it."""
+    __slots__ = ("redactor", "raw", "emitted", "template")
+
+    def __init__(self, window: int, tags: List[str]):
+        self.redactor = StreamRedactor(window, tags_out=tags)
+        self.raw = ""       # cumulative channels: upstream text seen so far
+        self.emitted = ""   # cumulative channels: redacted text sent so far
+        self.template: Optional[Callable[[str], Any]] = None
+
+
+def _split_event(buf: bytes) -> tuple[int, int]:
+    """(end of the first complete event, length of its terminator) or (-1, 0)."""
+    best, size = -1, 0
+    for sep in (b"\n\n", b"\r\n\r\n", b"\r\r"):
+        i = buf.find(sep)
+        if i != -1 and (best == -1 or i < best):
+            best, size = i, len(sep)
+    return best, size
+
+
+class SSERedactor:
+    def __init__(self, window: int = 256, *, stats: Optional[RelayStats] = None):
+        self.window = window
+        self.stats = stats if stats is not None else STATS
+        self.detected: List[str] = []
+        self._buf = b""
+        self._channels: dict[Any, _Channel] = {}
+        self._last_path: Optional[str] = None
+        self._closed = False
+        self.stats.streams += 1
+
+    # ---- byte level ----
+
+    def feed(self, chunk: bytes) -> bytes:
+        """Redacted bytes for every event completed by `chunk`."""
+        t0 = time.perf_counter()
+        self._buf += chunk
+        out: List[bytes] = []
+        while True:
+            end, size = _split_event(self._buf)
+            if end == -1:
+                break
+            raw = self._buf[:end + size]
+            self._buf = self._buf[end + size:]
+            out.append(self._event(raw, raw[end:]))
+        self.stats.chunk(time.perf_counter() - t0)
+        return b"".join(out)
+
+    def close(self) -> bytes:
+        """Whatever is left: a trailing partial event and held-back text."""
+        if self._closed:
+            return b""
+        self._closed = True
+        tail, self._buf = self._buf, b""
+        return self._flush_channels() + tail
+
+    # ---- event level ----
+
+    def _event(self, raw: bytes, term: bytes) -> bytes:
+        self.stats.events += 1
+        try:
+            lines = raw[:-len(term)].decode("utf-8").splitlines()
+        except UnicodeDecodeError:
+            return raw
+        data = [ln[5:].lstrip(" ") if ln.startswith("data:") else None for ln in lines]
+        payload = "\n".join(d for d in data if d is not None)
+        if payload.strip() == "[DONE]":
+            return self._flush_channels() + raw
+        if not payload.startswith("{"):
+            return raw
+        try:
+            obj = codec.loads(payload)
+        except ValueError:
+            return raw
+        if not self._rewrite(obj):
+            return raw
+        self.stats.rewritten += 1
+        return self._encode(obj, lines, data, term)
+
+    def _encode(self, obj: Any, lines: List[str], data: List[Optional[str]], term: bytes) -> bytes:
+        nl = "\r\n" if term == b"\r\n\r\n" else term[:1].decode()
+        out, placed = [], False
+        for ln, d in zip(lines, data):
+            if d is None:
+                out.append(ln)
+            elif not placed:
+                out.append("data: " + codec.dumps_compact(obj))
+                placed = True
+        return (nl.join(out) + nl + nl).encode("utf-8")
+
+    def _channel(self, key: Any) -> _Channel:
+        ch = self._channels.get(key)
+        if ch is None:
+            ch = self._channels[key] = _Channel(self.window, self.detected)
+        return ch
+
+    def _rewrite(self, obj: Any) -> bool:
+        if not isinstance(obj, dict):
+            return False
+        changed = False
+        if "v" in obj:
+            changed |= self._patch(obj)
+        msg = obj.get("message")
+        if isinstance(msg, dict):
+            changed |= self._cumulative(obj, msg)
+        choices = obj.get("choices")
+        if isinstance(choices, list):
+            for i, c in enumerate(choices):
+                delta = c.get("delta") if isinstance(c, dict) else None
+                if isinstance(delta, dict) and isinstance(delta.get("content"), str):
+                    changed |= self._choice(c.get("index", i), delta)
+        return changed
+
+    def _patch(self, op: dict) -> bool:
+        path = op.get("p", self._last_path)
+        if "p" in op:
+            self._last_path = op["p"]
+        kind = op.get("o", "append")
+        v = op.get("v")
+        if kind == "patch" and isinstance(v, list):
+            changed = False
+            for sub in v:
+                if isinstance(sub, dict):
+                    changed |= self._patch(sub)
+            return changed
+        if kind != "append" or not isinstance(v, str) or not (path or "").startswith(_CONTENT_PART):
+            return False
+        ch = self._channel(("patch", path))
+        ch.template = lambda text, p=path: {"p": p, "o": "append", "v": text}
+        op["v"] = ch.redactor.feed(v)
+        return op["v"] != v
+
+    def _cumulative(self, obj: dict, msg: dict) -> bool:
+        parts = (msg.get("content") or {}).get("parts") if isinstance(msg.get("content"), dict) else None
+        if not isinstance(parts, list):
+            return False
+        final = msg.get("end_turn") is True or msg.get("status") == "finished_successfully"
+        changed = False
+        for i, full in enumerate(parts):
+            if not isinstance(full, str):
+                continue
+            key = ("message", msg.get("id"), i)
+            ch = self._channel(key)
+            if not full.startswith(ch.raw):
+                # upstream rewrote earlier text: start the part over
+                ch = self._channels[key] = _Channel(self.window, self.detected)
+            delta, ch.raw = full[len(ch.raw):], full
+            ch.emitted += ch.redactor.feed(delta)
+            if final:
+                ch.emitted += ch.redactor.flush()
+            # the latest event; only copied if the flush needs it (it carries all text so far)
+            ch.template = lambda text, t=obj, idx=i, c=ch: _with_part(t, idx, c.emitted)
+            parts[i] = ch.emitted
+            changed |= ch.emitted != full
+        return changed
+
+    def _choice(self, index: Any, delta: dict) -> bool:
+        ch = self._channel(("choice", index))
+        ch.template = lambda text, idx=index: {"choices": [{"index": idx, "delta": {"content": text}}]}
+        v = delta["content"]
+        delta["content"] = ch.redactor.feed(v)
+        return delta["content"] != v
+
+    def _flush_channels(self) -> bytes:
+        out = []
+        for ch in self._channels.values():
+            rest = ch.redactor.flush()
+            if not rest or ch.template is None:
+                continue
+            ch.emitted += rest
+            out.append(("data: " + codec.dumps_compact(ch.template(rest)) + "\n\n").encode("utf-8"))
+        self._record()
+        return b"".join(out)
+
+    def _record(self) -> None:
+        for t in self.detected:
+            self.stats.detected[t] = self.stats.detected.get(t, 0) + 1
+        self.detected.clear()
+
+
+def _with_part(obj: dict, idx: int, text: str) -> dict:
+    # copy just the dicts down to parts; the rest is shared with the (already sent) event
+    msg = dict(obj["message"])
+    content = msg["content"] = dict(msg["content"])
+    parts = content["parts"] = list(content["parts"])
+    parts[idx] = text
+    return {**obj, "message": msg}
+
+
+async def redact_sse(chunks: AsyncIterator[bytes], window: int = 256) -> AsyncIterator[bytes]:
+    """Async wrapper for the relay: redacted SSE bytes as upstream chunks arrive."""
+    r = SSERedactor(window)
+    try:
+        async for chunk in chunks:
+            out = r.feed(chunk)
+            if out:
+                yield out
+        tail = r.close()
+        if tail:
+            yield tail
+    finally:
+        await chunks.aclose()   # client went away: release the upstream connection
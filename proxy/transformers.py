@@ -1,7 +1,19 @@
+import hashlib
+import importlib
 import json
+import os
 import re
-from typing import List, Tuple, Callable, Optional
-from .detectors import detect_all, Detection
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, List, Tuple, Callable, Iterable, Iterator, Optional
+from . import codec
+from .conversations import CONVERSATIONS, fingerprint
+from .detectors import (
+    add_fingerprint_source, config_generation, detect_all, detectors, Detection, Dictionary, get_detector, mark_config_changed,
+    max_match_len, register_detector, set_masker,
+)
 
 # ========== HELPER FUNCTIONS ==========
 # Long base64-like blob and data:URL detectors
@@ -11,6 +23,8 @@ _URLISH       = re.compile(r"^(?:https?|blob|file):", re.I)
 _TOKENISH     = re.compile(r"^[A-Za-z0-9_-]{16,}$")  # file_id / asset_pointer / upload tokens, etc.
 
 # Canonicalize keys to compare underscored/camelCase/whatever uniformly
+# (memoized: the same handful of keys repeat across every payload)
+@lru_cache(maxsize=4096)
 def _norm_key(k: str) -> str:
     return re.sub(r"[^a-z0-9]", "", k.lower())
 
@@ -114,36 +128,301 @@ def _add_tag_once(tags: List[str], tag: str) -> None:
         tags.append(tag)
 
 
+# Built-in maskers, attached to the detectors registered in detectors.py
+_BUILTIN_MASKERS = {
+    "email": mask_email,
+    "phone": mask_phone,
+    "ipv4": mask_ipv4,
+    "ipv6": mask_ipv6,
+    "jwt": mask_jwt,
+    "api_key": mask_api_key,
+    "national_id": mask_national_id,
+    "company": mask_company,
+}
+for _name, _masker in _BUILTIN_MASKERS.items():
+    set_masker(_name, _masker)
+
+
+# ========== PSEUDONYMISATION ==========
+
+_TOKEN_HEX = 12     # 48-bit MAC: collisions stay unlikely with 100k+ values per type
+# hex spelled with a-p: no digit runs for the phone/ID detectors to find in a token
+_HEX_TO_LETTERS = str.maketrans("0123456789", "ghijklmnop")
+_TOKEN_RE = re.compile(r"\b[A-Z0-9_]+_[a-p]{%d}\b" % _TOKEN_HEX)
+
+
+@lru_cache(maxsize=256)
+def _token_prefix(dtype: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", dtype).strip("_").upper() or "PII"
+
+
+class Pseudonymizer:
+    """
+    Keyed, deterministic stand-ins for detected values: TYPE_<12 letters>,
+    a BLAKE2b MAC of the value keyed with the salt, hex spelled a-p. The
+    same value gets the same token for as long as the salt lives, so the
+    model keeps "who is who" across a conversation; rotating the salt
+    unlinks them.
+
+    The vault maps tokens back to values for reidentify(); past `max_entries`
+    the oldest mappings are dropped (a value seen again is simply re-added).
+    It lives in memory only, unless the opt-in shared vault is on (shared.py).
+    With `collect`, new mappings are also queued for drain(), for worker
+    processes and the shared vault.
+    """
+
+    def __init__(self, max_entries: int = 100_000):
+        self.enabled = False
+        self.max_entries = max_entries
+        self.collect = False
+        self._salt = ""
+        self._key = b""
+        # token -> (type, value); (type, value) -> token for the ones still in the vault
+        self._vault: "OrderedDict[str, tuple[str, str]]" = OrderedDict()
+        self._tokens: dict[tuple[str, str], str] = {}
+        self._pending: List[Tuple[str, str]] = []
+        self._lock = threading.Lock()
+        self.minted = self.reused = self.evictions = self.collisions = 0
+        self.reidentified = self.unknown = 0
+
+    def set_salt(self, salt: str) -> None:
+        """New salt -> new tokens; cached redactions made with the old one are dropped."""
+        if salt == self._salt:
+            return
+        with self._lock:
+            self._salt = salt
+            self._key = hashlib.blake2b(salt.encode("utf-8"), digest_size=32).digest()
+            self._tokens.clear()
+        if self.enabled:
+            mark_config_changed()
+
+    def _add(self, tok: str, item: tuple[str, str]) -> None:
+        # caller holds the lock; oldest entries go first
+        self._vault[tok] = item
+        while len(self._vault) > self.max_entries:
+            _, old = self._vault.popitem(last=False)
+            self._tokens.pop(old, None)
+            self.evictions += 1
+
+    def token(self, dtype: str, value: str) -> str:
+        k = (dtype, value)
+        tok = self._tokens.get(k)
+        if tok is not None:
+            self.reused += 1
+            return tok
+        mac = hashlib.blake2b(value.encode("utf-8", "surrogatepass"), key=self._key,
+                              digest_size=_TOKEN_HEX // 2, person=dtype.encode()[:16]).hexdigest()
+        tok = f"{_token_prefix(dtype)}_{mac.translate(_HEX_TO_LETTERS)}"
+        with self._lock:
+            old = self._vault.get(tok)
+            if old is None:
+                self._add(tok, k)
+                if self.collect:
+                    self._pending.append((tok, value))
+            elif old[1] != value:
+                self.collisions += 1    # keep the first value; reidentify stays unambiguous
+            else:
+                self._vault[tok] = k    # minted elsewhere (remember()); now memoised too
+            self._tokens[k] = tok
+            self.minted += 1
+        return tok
+
+    @property
+    def salt(self) -> str:
+        return self._salt
+
+    def drain(self) -> List[Tuple[str, str]]:
+        with self._lock:
+            out, self._pending = self._pending, []
+        return out
+
+    def remember(self, pairs: Iterable, *, pending: bool = False) -> None:
+        """Vault entries minted elsewhere (a worker process, another server worker)."""
+        with self._lock:
+            for tok, value in pairs:
+                if tok not in self._vault:
+                    self._add(tok, ("", value))
+                    if pending and self.collect:
+                        self._pending.append((tok, value))
+
+    def pairs_in(self, text: str) -> List[Tuple[str, str]]:
+        """(token, value) for every vault token in text, e.g. to keep with a cached decision."""
+        found = {m.group(0) for m in _TOKEN_RE.finditer(text)}
+        return sorted(self.lookup(found).items()) if found else []
+
+    def lookup(self, tokens: Iterable[str]) -> dict:
+        with self._lock:
+            return {t: self._vault[t][1] for t in tokens if t in self._vault}
+
+    def reidentify(self, text: str, fallback: Optional[Callable[[List[str]], dict]] = None) -> str:
+        """Put the original values back for every known token in text; unknown ones stay."""
+        found = {m.group(0) for m in _TOKEN_RE.finditer(text)}
+        if not found:
+            return text
+        known = self.lookup(found)
+        missing = [t for t in found if t not in known]
+        if missing and fallback is not None:
+            extra = fallback(missing)
+            if extra:
+                self.remember(extra.items())
+                known.update(extra)
+        self.reidentified += len(known)
+        self.unknown += len(found) - len(known)
+        return _TOKEN_RE.sub(lambda m: known.get(m.group(0), m.group(0)), text)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._vault.clear()
+            self._tokens.clear()
+            self._pending.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._vault),
+            "max_entries": self.max_entries,
+            "minted": self.minted,
+            "reused": self.reused,
+            "evictions": self.evictions,
+            "collisions": self.collisions,
+            "reidentified": self.reidentified,
+            "unknown": self.unknown,
+        }
+
+
+PSEUDONYMS = Pseudonymizer()
+# tokens depend on the mode and the salt (hashed: the digest is a cache key, not a secret store)
+add_fingerprint_source(lambda: "pseudonymise:" + hashlib.blake2b(PSEUDONYMS.salt.encode("utf-8"), digest_size=16)
+                       .hexdigest() if PSEUDONYMS.enabled else "mask")
+
+REDACTION_MODES = ("mask", "pseudonymise")
+
+
+def configure_pseudonyms(mode: str, salt: str, *, max_entries: int = 100_000, collect: bool = False) -> None:
+    """mask (placeholders, the default) or pseudonymise (salted tokens + vault), process-wide."""
+    mode = {"pseudonymize": "pseudonymise"}.get((mode or "mask").lower(), (mode or "mask").lower())
+    if mode not in REDACTION_MODES:
+        raise ValueError(f"unknown redaction mode {mode!r}, expected one of {REDACTION_MODES}")
+    PSEUDONYMS.max_entries = max_entries
+    PSEUDONYMS.collect = collect
+    PSEUDONYMS.set_salt(salt)
+    if PSEUDONYMS.enabled != (mode == "pseudonymise"):
+        PSEUDONYMS.enabled = mode == "pseudonymise"
+        mark_config_changed()
+
+
 def _mask_value(det: Detection) -> str:
     """
     Given a single Detection, return its masked replacement string.
     """
-    t = det["type"]
-    v = det["value"]
-
-    if t == "email":
-        return mask_email(v)
-    if t == "phone":
-        return mask_phone(v)
-    if t == "ipv4":
-        return mask_ipv4(v)
-    if t == "ipv6":
-        return mask_ipv6(v)
-    if t == "jwt":
-        return mask_jwt(v)
-    if t == "api_key":
-        return mask_api_key(v)
-    if t == "national_id":
-        return mask_national_id(v)
-    if t == "company":
-        return mask_company(v)
-
-    # Fallback: if some unknown type sneaks in, just return original
-    return v
+    if PSEUDONYMS.enabled:
+        return PSEUDONYMS.token(det["type"], det["value"])
+    d = get_detector(det["type"])
+    if d is None or d.masker is None:
+        # Fallback: if some unknown type sneaks in, just return original
+        return det["value"]
+    return d.masker(det["value"])
+
+
+# ========= CUSTOM DETECTORS FROM CONFIG =========
+
+_FLAG_CHARS = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE, "a": re.ASCII}
+
+
+def _masker_from_spec(name: str, spec: dict) -> Callable[[str], str]:
+    if spec.get("keep_last") is not None:
+        n = int(spec["keep_last"])
+        return lambda v: mask_keep_last_n(v, n)
+    placeholder = spec.get("mask") or "{{" + name.upper() + "}}"
+    return lambda _: placeholder
+
+
+def _precheck_from_spec(spec: dict) -> Optional[Callable[[str], bool]]:
+    # "requires": substrings of which at least one must occur for a match
+    req = spec.get("requires")
+    if not req:
+        return None
+    if isinstance(req, str):
+        req = [req]
+    req = tuple(req)
+    return lambda t: any(r in t for r in req)
+
+
+def load_detector_config(path: str) -> List[str]:
+    """
+    Register custom detectors from a JSON file and return their names:
+
+      {"detectors": [
+        {"name": "ticket", "pattern": "TCK-\\d{6}", "flags": "i",
+         "requires": ["TCK", "tck"], "mask": "{{TICKET}}", "priority": 90},
+        {"name": "badge", "finder": "mypkg.badges:find_badges", "keep_last": 2}
+      ]}
+
+    "pattern" is a regex; "finder" is "module:function" returning (start, end)
+    spans. "max_len" (optional) is the longest match it can produce, which
+    keeps chunked redaction exact. Entries with an existing name replace the
+    detector (and its masker).
+
+    "dictionary" is a file of terms, one per line (relative paths are from
+    the config file), matched with Aho-Corasick (detectors.Dictionary):
+
+        {"name": "customer", "dictionary": "customers.txt", "mask": "{{CUSTOMER}}",
+         "case_sensitive": false, "whole_words": true, "reload_s": 2}
+
+    The file is re-read when it changes; max_len follows its longest term.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = json.load(f)
+
+    names: List[str] = []
+    for spec in cfg.get("detectors", []):
+        name = spec["name"]
+        if "dictionary" in spec:
+            terms_path = os.path.join(os.path.dirname(os.path.abspath(path)), spec["dictionary"])
+            match = Dictionary(path=terms_path, case_sensitive=bool(spec.get("case_sensitive", False)),
+                               whole_words=bool(spec.get("whole_words", True)),
+                               reload_s=float(spec.get("reload_s", 2.0)))
+            spec = {**spec, "max_len": match.max_len}
+        elif "finder" in spec:
+            mod_name, _, fn_name = spec["finder"].partition(":")
+            match = getattr(importlib.import_module(mod_name), fn_name)
+        else:
+            flags = 0
+            for c in spec.get("flags", ""):
+                flags |= _FLAG_CHARS[c]
+            match = re.compile(spec["pattern"], flags)
+        register_detector(
+            name,
+            match,
+            masker=_masker_from_spec(name, spec),
+            precheck=_precheck_from_spec(spec),
+            priority=int(spec.get("priority", 100)),
+            max_len=spec.get("max_len"),
+            replace=True,
+        )
+        names.append(name)
+    return names
 
 
 # ========= LOW-LEVEL STRING TRANSFORM (USES detect_all) =========
 
+def _select(detections: List[Detection]) -> List[Detection]:
+    """
+    Detections that redact_text actually replaces: by start index, skipping
+    any that overlap an earlier one (sorted() is stable, so on equal starts
+    the detector that ran first wins).
+    """
+    out: List[Detection] = []
+    cursor = 0
+    for det in sorted(detections, key=lambda d: d["start"]):
+        # If overlapping or out of order, skip this detection
+        if det["start"] < cursor:
+            continue
+        out.append(det)
+        cursor = det["end"]
+    return out
+
+
 def redact_text(text: str, tags_out: List[str]) -> str:
     """
     Redact all supported PII types in a plain text string, using detect_all.
@@ -151,8 +430,13 @@ def redact_text(text: str, tags_out: List[str]) -> str:
     - Uses detect_all(text) to get a list[Detection].
     - Builds a new redacted string based on those detections.
     - Populates tags_out with a list[str] of unique detection types.
+
+    Multi-MB strings go through iter_redacted (same output, bounded memory).
     """
 
+    if len(text) > CHUNKED_MIN_CHARS:
+        return "".join(iter_redacted(split_text(text), tags_out))
+
     detections = detect_all(text)  # List[Detection]
 
     if not detections:
@@ -162,26 +446,15 @@ def redact_text(text: str, tags_out: List[str]) -> str:
     for det in detections:
         _add_tag_once(tags_out, det["type"])
 
-    # Sort detections by start index so we can rebuild the string
-    detections_sorted = sorted(detections, key=lambda d: d["start"])
-
     parts: List[str] = []
     cursor = 0
 
-    for det in detections_sorted:
-        start = det["start"]
-        end = det["end"]
-
-        # If overlapping or out of order, skip this detection
-        if start < cursor:
-            continue
-
+    for det in _select(detections):
         # Add text before detection
-        parts.append(text[cursor:start])
+        parts.append(text[cursor:det["start"]])
         # Add masked value
         parts.append(_mask_value(det))
-
-        cursor = end
+        cursor = det["end"]
 
     # Add any remaining text after the last detection
     parts.append(text[cursor:])
@@ -189,57 +462,390 @@ def redact_text(text: str, tags_out: List[str]) -> str:
     return "".join(parts)
 
 
+class StreamRedactor:
+    """
+    Redact text that arrives in pieces (e.g. SSE deltas) without waiting for
+    the end. feed() returns the redacted text that is safe to emit so far;
+    flush() returns the rest once the stream ends.
+
+    The last `window` characters are held back, so a match split across
+    pieces is still found whole as long as it is at most `window` long.
+    A match that touches the end of the buffer is held too, since it could
+    still grow. Already-emitted text is kept as left context so lookbehinds
+    and word boundaries see the same characters as in the full text.
+    `max_pending` bounds how much can be held back before it is forced out.
+
+    tags collects the types actually replaced, in output order; `types`, if
+    given, also collects overlapped (not replaced) detections, like the
+    tags of redact_text.
+    """
+
+    def __init__(self, window: int = 256, *, max_pending: Optional[int] = None, min_step: int = 1,
+                 tags_out: Optional[List[str]] = None, types: Optional[set] = None):
+        self.window = window
+        self.max_pending = max_pending or 16 * window
+        self.min_step = min_step    # rescan only once this much new text can be released
+        self.tags: List[str] = tags_out if tags_out is not None else []
+        self.types = types
+        self._buf = ""
+        self._done = 0      # leading chars of _buf already emitted (context only)
+
+    @property
+    def pending(self) -> int:
+        return len(self._buf) - self._done
+
+    def feed(self, text: str) -> str:
+        self._buf += text
+        if self.pending - self.window - 1 < self.min_step:
+            return ""
+        return self._drain(self.pending > self.max_pending)
+
+    def flush(self) -> str:
+        return self._drain(True)
+
+    def _drain(self, final: bool) -> str:
+        buf = self._buf
+        # +1: a match ending right before the cut still needs its next char (\b, (?!\d))
+        safe = len(buf) if final else len(buf) - self.window - 1
+        if safe <= self._done:
+            return ""
+        out: List[str] = []
+        cur = start = self._done
+        found = detect_all(buf)
+        for det in _select(found):
+            if det["start"] < cur:
+                continue    # in the emitted context
+            if det["start"] >= safe:
+                break
+            if not final and det["end"] >= len(buf):
+                safe = det["start"]     # might still grow: hold it back
+                break
+            out.append(buf[cur:det["start"]])
+            out.append(_mask_value(det))
+            _add_tag_once(self.tags, det["type"])
+            cur = det["end"]
+        if cur < safe:
+            out.append(buf[cur:safe])
+            cur = safe
+        if self.types is not None:
+            self.types.update(d["type"] for d in found if start <= d["start"] < cur)
+        keep = max(0, cur - self.window)
+        self._buf = buf[keep:]
+        self._done = cur - keep
+        return "".join(out)
+
+
+# ========= CHUNKED REDACTION FOR LARGE BODIES =========
+
+CHUNK_CHARS = 64 * 1024
+# Overlap used for detectors without a max_len (default email/JWT/company)
+UNBOUNDED_MATCH = 4096
+# redact_text switches to the chunked path above this size
+CHUNKED_MIN_CHARS = 1 << 20
+
+
+def iter_redacted(
+    chunks: Iterable[str],
+    tags_out: List[str],
+    *,
+    window: Optional[int] = None,
+) -> Iterator[str]:
+    """
+    Redact text arriving as `chunks`, yielding output as soon as it's final.
+    The overlap between windows defaults to the longest possible match
+    (max_match_len), so for matches no longer than that the concatenated
+    output equals redact_text() of the whole text. Peak memory is about
+    one chunk plus a few windows, whatever the total size.
+
+    tags_out receives the same types, in the same order, as redact_text.
+    """
+    window = window or max_match_len(UNBOUNDED_MATCH)
+    types: set = set()
+    sr = StreamRedactor(window, max_pending=max(16 * window, 2 * CHUNK_CHARS), min_step=window, types=types)
+    try:
+        for chunk in chunks:
+            out = sr.feed(chunk)
+            if out:
+                yield out
+        out = sr.flush()
+        if out:
+            yield out
+    finally:
+        # redact_text lists tags in detector (scan) order
+        for d in detectors():
+            if d.name in types:
+                _add_tag_once(tags_out, d.name)
+
+
+def split_text(text: str, size: int = CHUNK_CHARS) -> Iterator[str]:
+    for i in range(0, len(text), size):
+        yield text[i:i + size]
+
+
+# ========= PER-STRING REDACTION MEMO =========
+
+class RedactMemo:
+    """
+    Bounded string -> (redacted, tags) memo for redact_text, used by
+    json_transform. A chat re-posts its whole history every turn, so most
+    strings in a long conversation body were already scanned last time.
+
+    LRU evicted past `max_bytes` (rough size: 2 bytes/char for the string and
+    its redaction). Strings shorter than `min_chars` aren't worth an entry,
+    longer than `max_chars` would crowd everything else out. Entries are
+    dropped when the detector config changes. One per process, thread-safe.
+
+    When pseudonymising, an entry also keeps the (token, value) pairs of its
+    redaction and gives them back to PSEUDONYMS on a hit: the vault may have
+    dropped them since, and nothing is minted for a hit.
+    """
+
+    def __init__(self, max_bytes: int = 32 << 20, *, min_chars: int = 16, max_chars: int = 256 * 1024):
+        self.max_bytes = max_bytes
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        # text -> (redacted or None if unchanged, tags, scan seconds, size, pseudonym pairs)
+        self._data: "OrderedDict[str, tuple[Optional[str], tuple, float, int, tuple]]" = OrderedDict()
+        self._bytes = 0
+        self._generation = config_generation()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = 0
+        self.saved_s = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def redact(self, text: str, tags_out: List[str]) -> str:
+        """Same result as redact_text(text, tags_out)."""
+        if not (self.min_chars <= len(text) <= self.max_chars) or not self.enabled:
+            return redact_text(text, tags_out)
+        with self._lock:
+            gen = config_generation()
+            if gen != self._generation:
+                self._generation = gen
+                self._data.clear()
+                self._bytes = 0
+            item = self._data.get(text)
+            if item is not None:
+                self._data.move_to_end(text)
+                self.hits += 1
+                self.saved_s += item[2]
+        if item is not None:
+            for t in item[1]:
+                _add_tag_once(tags_out, t)
+            if item[4]:
+                PSEUDONYMS.remember(item[4], pending=True)
+            return text if item[0] is None else item[0]
+
+        # scan outside the lock; budget errors propagate and store nothing
+        tags: List[str] = []
+        t0 = time.perf_counter()
+        new = redact_text(text, tags)
+        took = time.perf_counter() - t0
+        for t in tags:
+            _add_tag_once(tags_out, t)
+        pairs = tuple(PSEUDONYMS.pairs_in(new)) if PSEUDONYMS.enabled and new != text else ()
+        size = 2 * (len(text) + (len(new) if new != text else 0)) + 64 * (1 + len(tags) + len(pairs))
+        with self._lock:
+            self.misses += 1
+            if config_generation() == self._generation and text not in self._data:
+                self._data[text] = (new if new != text else None, tuple(tags), took, size, pairs)
+                self._bytes += size
+                while self._data and self._bytes > self.max_bytes:
+                    _, old = self._data.popitem(last=False)
+                    self._bytes -= old[3]
+                    self.evictions += 1
+        return new
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "saved_ms": round(self.saved_s * 1000, 1),
+        }
+
+
+REDACT_MEMO = RedactMemo()
+
+
+def configure_redact_memo(max_bytes: int) -> None:
+    """Resize (0 disables) the process-wide memo; existing entries are dropped."""
+    REDACT_MEMO.clear()
+    REDACT_MEMO.max_bytes = max_bytes
+
+
+# Sentinels for json_transform(parsed=...): "not decoded yet" vs. "not JSON"
+_UNPARSED = object()
+NOT_JSON = object()
+
+
+def parse_body(body_str: str) -> Any:
+    """Decode a body once; returns NOT_JSON if it isn't JSON."""
+    try:
+        return codec.loads(body_str)
+    except Exception:
+        return NOT_JSON
+
+
+def _collect_pairs(transform: Callable[[str, List[str]], str], pairs: list) -> Callable[[str, List[str]], str]:
+    # `transform` that also gathers the pseudonym pairs of what it returns
+    def run(s: str, tags_out: List[str]) -> str:
+        new = transform(s, tags_out)
+        if new is not s and new != s:
+            pairs.extend(PSEUDONYMS.pairs_in(new))
+        return new
+    return run
+
+
+def _transform_tree(
+    obj: Any,
+    transform: Callable[[str, List[str]], str],
+    skip: Optional[Callable[[str], bool]],
+    detections: List[str],
+    conv_key: Optional[tuple] = None,
+) -> tuple[Any, bool, bool]:
+    """
+    Apply `transform` to the eligible strings of a decoded JSON tree, in place.
+    Returns (obj, changed, portable): whether any string changed, and whether
+    every float prints the same under the fast codec.
+
+    With `conv_key`, top-level `messages[]` entries already seen in that
+    conversation are taken from CONVERSATIONS instead of being walked.
+    """
+    changed = False
+    portable = True
+
+    def visit(s: str, key: Optional[str]) -> str:
+        nonlocal changed
+        kn = _norm_key(key) if isinstance(key, str) else None
+        if (kn in _DENY_KEYS) or (skip and skip(s)):
+            return s
+        if kn is not None and kn not in _ALLOW_KEYS:
+            return s
+        new = transform(s, detections)
+        if new is not s and new != s:
+            changed = True
+        return new
+
+    def walk(x, key: Optional[str] = None):
+        # Strings are replaced by the parent container (in place)
+        nonlocal portable
+        if isinstance(x, list):
+            for i, v in enumerate(x):
+                if isinstance(v, str):
+                    x[i] = visit(v, None)
+                else:
+                    walk(v)
+        elif isinstance(x, dict):
+            for k, v in x.items():
+                if isinstance(v, str):
+                    x[k] = visit(v, k)
+                else:
+                    walk(v, k)
+        elif isinstance(x, float) and portable:
+            portable = codec.float_is_portable(x)
+
+    def walk_messages(msgs: list) -> None:
+        nonlocal changed, portable
+        for i, m in enumerate(msgs):
+            msg_id = m.get("id") if isinstance(m, dict) else None
+            if not isinstance(msg_id, str):
+                if isinstance(m, str):
+                    msgs[i] = visit(m, None)
+                else:
+                    walk(m)
+                continue
+            fp, size = fingerprint(m)
+            hit = CONVERSATIONS.lookup(conv_key, msg_id, fp)
+            if hit is not None:
+                msgs[i], tags, node_changed, pairs = hit
+                if pairs:
+                    PSEUDONYMS.remember(pairs, pending=True)
+            else:
+                # walk this message on its own so its share of the result can be kept
+                tags = []
+                pairs = []
+                node_transform = _collect_pairs(transform, pairs) if PSEUDONYMS.enabled else transform
+                _, node_changed, node_portable = _transform_tree(m, node_transform, skip, tags)
+                if node_portable:
+                    CONVERSATIONS.store(conv_key, msg_id, fp, size, m, tags, node_changed, dict(pairs).items())
+                else:
+                    portable = False
+            for t in tags:
+                _add_tag_once(detections, t)
+            changed = changed or node_changed
+
+    if isinstance(obj, str):
+        obj = visit(obj, None)
+    elif conv_key is not None and isinstance(obj, dict) and isinstance(obj.get("messages"), list):
+        for k, v in obj.items():
+            if isinstance(v, str):
+                obj[k] = visit(v, k)
+            elif k == "messages":
+                walk_messages(v)
+            else:
+                walk(v, k)
+    else:
+        walk(obj)
+    return obj, changed, portable
+
+
 def json_transform(
     body_str: str,
     transform: Callable[[str, List[str]], str],
     *,
-    skip: Optional[Callable[[str], bool]] = None
+    skip: Optional[Callable[[str], bool]] = None,
+    parsed: Any = _UNPARSED,
+    tab: Optional[Any] = None,
 ) -> tuple[str|None, list[str]]:
     """
     Walk strings in a JSON body and apply `transform` (e.g., redact_text).
     Returns (new_body_or_none, detections).
     If `body_str` is not JSON, treat it as plain text.
     You can pass `skip(s: str) -> bool` to preserve binary-like strings.
+
+    Pass `parsed` (from parse_body) when the caller already decoded the body;
+    the tree is then edited in place and only re-serialised if a string
+    actually changed.
+
+    With transform=redact_text, strings go through REDACT_MEMO, so repeated
+    ones (conversation history) are looked up instead of rescanned. Passing
+    the extension's `tab` id as well skips whole messages already inspected
+    in that tab's conversation (see proxy/conversations.py).
     """
     detections: list[str] = []
-    try:
-        obj = json.loads(body_str)
-    except Exception:
+    incremental = tab is not None and transform is redact_text and CONVERSATIONS.enabled
+    if transform is redact_text and REDACT_MEMO.enabled:
+        transform = REDACT_MEMO.redact
+    obj = parse_body(body_str) if parsed is _UNPARSED else parsed
+    if obj is NOT_JSON:
         # Not JSON, treat it as text (still avoid binary-like whole-body strings)
         if skip and skip(body_str):
             return None, detections
         new = transform(body_str, detections)
         return (new if new != body_str else None), detections
 
-    def walk(x, key: Optional[str] = None, path: tuple = ()):
-        # Strings
-        if isinstance(x, str):
-            kn = _norm_key(key) if isinstance(key, str) else None
-            if (kn in _DENY_KEYS) or (skip and skip(x)):
-                return x
-            if kn is not None and kn not in _ALLOW_KEYS:
-                return x
-            return transform(x, detections)
-
-
-
-        # Lists
-        if isinstance(x, list):
-            return [walk(v, None, path + (i,)) for i, v in enumerate(x)]
-
-        # Dicts
-        if isinstance(x, dict):
-            out = {}
-            for k, v in x.items():
-                out[k] = walk(v, k, path + (k,))
-            return out
+    conv_key = (str(tab), str(obj.get("conversation_id") or "")) if incremental and isinstance(obj, dict) else None
+    obj, changed, portable = _transform_tree(obj, transform, skip, detections, conv_key)
+    if changed and not portable and codec.BACKEND != "json":
+        # the fast decoder may have turned >64-bit ints into floats; redo the
+        # walk on an exact stdlib tree so the output matches byte for byte
+        detections.clear()
+        obj, changed, portable = _transform_tree(json.loads(body_str), transform, skip, detections)
 
-        # Other types
-        return x
-
-    obj2 = walk(obj)
-    if obj2 == obj:
+    if not changed:
         return None, detections
 
-    return json.dumps(obj2, ensure_ascii=False, separators=(",", ":")), detections
-
+    return codec.dumps_compact(obj, portable=portable), detections
@@ -0,0 +1,94 @@
+"""
+Shared upstream HTTP client for the relay.
+
+One httpx.AsyncClient per process, created in the app lifespan and closed on
+shutdown, so relayed requests reuse pooled keep-alive connections instead of
+paying a TCP+TLS handshake each time. HTTP/2 is used when asked for and the
+`h2` package is installed (pip install httpx[http2]); otherwise HTTP/1.1.
+
+relay() sends a request with stream=True and hands back the open response;
+stream_body() yields its bytes as they arrive and closes it at the end (or
+when the downstream client goes away), which returns the connection to the
+pool.
+"""
+
+from __future__ import annotations
+from typing import AsyncIterator, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401
+except ImportError:     # optional
+    h2 = None
+
+_STATE: dict = {"client": None, "config": {}}
+
+
+def start_client(
+    *,
+    http2: bool = False,
+    max_connections: int = 100,
+    max_keepalive: int = 20,
+    keepalive_s: float = 30.0,
+    timeout_s: float = 30.0,
+    connect_timeout_s: float = 10.0,
+) -> httpx.AsyncClient:
+    """Create the shared client (replacing one that is already running is not supported)."""
+    if _STATE["client"] is not None:
+        return _STATE["client"]
+    use_h2 = http2 and h2 is not None
+    _STATE["config"] = {
+        "http2": use_h2,
+        "http2_requested": http2,
+        "max_connections": max_connections,
+        "max_keepalive": max_keepalive,
+        "keepalive_s": keepalive_s,
+        "timeout_s": timeout_s,
+    }
+    _STATE["client"] = httpx.AsyncClient(
+        http2=use_h2,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_s,
+        ),
+        # read timeout applies per chunk, so long SSE streams are fine as long as they keep talking
+        timeout=httpx.Timeout(timeout_s, connect=connect_timeout_s),
+        follow_redirects=False,
+    )
+    return _STATE["client"]
+
+
+async def stop_client() -> None:
+    client, _STATE["client"] = _STATE["client"], None
+    if client is not None:
+        await client.aclose()
+
+
+def get_client() -> httpx.AsyncClient:
+    # lazily created with defaults if the lifespan didn't run (e.g. tests)
+    return _STATE["client"] or start_client()
+
+
+def client_config() -> dict:
+    return dict(_STATE["config"])
+
+
+async def relay(method: str, url: str, headers: dict, content: Optional[bytes]) -> httpx.Response:
+    """Send upstream and return as soon as the response headers are in."""
+    client = get_client()
+    req = client.build_request(method, url, headers=headers, content=content)
+    return await client.send(req, stream=True)
+
+
+async def stream_body(r: httpx.Response, *, decode: bool = False) -> AsyncIterator[bytes]:
+    """
+    Body chunks as they arrive: raw (still content-encoded) by default, or
+    decoded when the proxy needs to read them. Always closes `r`.
+    """
+    try:
+        async for chunk in (r.aiter_bytes() if decode else r.aiter_raw()):
+            yield chunk
+    finally:
+        await r.aclose()
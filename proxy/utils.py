@@ -1,25 +1,151 @@
-import os, json, time, secrets
+import os, time, secrets
+from typing import Optional
 from dotenv import load_dotenv
 
+# before anything that reads PP_* at import time (codec picks its backend then)
 load_dotenv()
 
+from . import codec
+from .eventlog import EventLogger
+from .shared import SharedStore
+
+# JSON backend: auto | orjson | msgspec | json. Set again here in case codec
+# was imported (and resolved it) before this module loaded .env
+JSON_CODEC = os.getenv("PP_JSON_CODEC", "auto")
+codec.set_backend(JSON_CODEC)
+
 PORT = int(os.getenv("PP_PORT", "8787"))
-UPSTREAM_CHATGPT = "https://chatgpt.com"
+UPSTREAM_CHATGPT = os.getenv("PP_UPSTREAM_CHATGPT", "https://chatgpt.com").rstrip("/")
+# Shared relay client: connection pool limits, HTTP/2 (needs `h2`), timeouts
+UPSTREAM_HTTP2 = os.getenv("PP_UPSTREAM_HTTP2", "0") == "1"
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("PP_UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("PP_UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_S = float(os.getenv("PP_UPSTREAM_KEEPALIVE_S", "30"))
+UPSTREAM_TIMEOUT_S = float(os.getenv("PP_UPSTREAM_TIMEOUT_S", "30"))
+# Per-string redaction memo inside json_transform (0 disables)
+REDACT_MEMO_BYTES = int(float(os.getenv("PP_REDACT_MEMO_MB", "32")) * 1024 * 1024)
+# Already-inspected messages per (tabId, conversation_id); idle ones dropped
+CONV_INDEX_BYTES = int(float(os.getenv("PP_CONV_INDEX_MB", "64")) * 1024 * 1024)
+CONV_MAX = int(os.getenv("PP_CONV_MAX", "1024"))
+CONV_IDLE_S = float(os.getenv("PP_CONV_IDLE_S", "1800"))
+# In-process counters/histograms served at /metrics
+METRICS = os.getenv("PP_METRICS", "1") == "1"
+# Max payloads per /inspect/batch request
+BATCH_MAX = int(os.getenv("PP_BATCH_MAX", "64"))
+# Decision cache for repeated /inspect bodies (see proxy/cache.py)
+DECISION_CACHE = os.getenv("PP_DECISION_CACHE", "1") == "1"
+CACHE_MAX_ENTRIES = int(os.getenv("PP_CACHE_MAX_ENTRIES", "4096"))
+CACHE_MAX_BYTES = int(float(os.getenv("PP_CACHE_MAX_MB", "64")) * 1024 * 1024)
+CACHE_TTL_S = float(os.getenv("PP_CACHE_TTL_S", "300"))
+# Redact text/event-stream responses on the relay; PII longer than the window may slip through
+RELAY_REDACT_SSE = os.getenv("PP_RELAY_REDACT_SSE", "1") == "1"
+SSE_WINDOW = int(os.getenv("PP_SSE_WINDOW", "256"))
 LOG_PATH = os.getenv("PP_LOG", os.path.join("proxy", "logs", "events.jsonl"))
+# Multi-worker mode (python -m proxy.serve): state shared through this SQLite file ("" = single process)
+SHARED_STATE = os.getenv("PP_SHARED_STATE", "")
+SHARED_REFRESH_S = float(os.getenv("PP_SHARED_REFRESH_S", "1"))
+SHARED_MAX_DECISIONS = int(os.getenv("PP_SHARED_MAX_DECISIONS", "65536"))
+# "mask" (placeholders like {{EMAIL}}) or "pseudonymise" (salted tokens like EMAIL_kfajpbncgdeo, see /reidentify)
+REDACTION_MODE = os.getenv("PP_REDACTION", "mask").lower()
+VAULT_MAX = int(os.getenv("PP_VAULT_MAX", "100000"))
+# Multi-worker only: also keep token -> value in the shared state file, so any worker can re-identify
+SHARED_VAULT = os.getenv("PP_SHARED_VAULT", "0") == "1"
+# Slow-request log (0 = off) and cProfile on every decide(); both switchable via /admin/profile
+SLOW_MS = float(os.getenv("PP_SLOW_MS", "0"))
+SLOW_LOG_PATH = os.getenv("PP_SLOW_LOG", os.path.join(os.path.dirname(LOG_PATH), "slow.jsonl"))
+PROFILE = os.getenv("PP_PROFILE", "0") == "1"
+# Optional JSON file with custom detectors (see transformers.load_detector_config)
+DETECTORS_PATH = os.getenv("PP_DETECTORS", "")
+# Linear-time detector patterns (Python 3.11+) and a per-request scan budget (0 = none)
+HARDENED = os.getenv("PP_HARDENED", "0") == "1"
+SCAN_BUDGET_MS = float(os.getenv("PP_SCAN_BUDGET_MS", "0"))
+# Where decide() runs: inline | thread | process (see proxy/workers.py)
+DECIDE_BACKEND = os.getenv("PP_DECIDE_BACKEND", "inline").lower()
+DECIDE_WORKERS = int(os.getenv("PP_DECIDE_WORKERS", str(os.cpu_count() or 2)))
+OFFLOAD_MIN_BYTES = int(os.getenv("PP_OFFLOAD_MIN_BYTES", "16384"))
+# Event log writer: async (background batches) | sync (append per event) | off
+LOG_MODE = os.getenv("PP_LOG_MODE", "async").lower()
+LOG_QUEUE_MAX = int(os.getenv("PP_LOG_QUEUE_MAX", "10000"))
+LOG_BATCH = int(os.getenv("PP_LOG_BATCH", "256"))
+LOG_FLUSH_S = float(os.getenv("PP_LOG_FLUSH_MS", "500")) / 1000
+LOG_DROP_POLICY = os.getenv("PP_LOG_DROP_POLICY", "drop_new")
+# Rotation of events.jsonl into compressed segments (0 = off) and retention
+LOG_ROTATE_BYTES = int(float(os.getenv("PP_LOG_ROTATE_MB", "64")) * 1024 * 1024)
+LOG_ROTATE_S = float(os.getenv("PP_LOG_ROTATE_HOURS", "0")) * 3600
+LOG_COMPRESS = os.getenv("PP_LOG_COMPRESS", "gzip").lower()
+LOG_RETAIN_SEGMENTS = int(os.getenv("PP_LOG_RETAIN_SEGMENTS", "0"))
+LOG_RETAIN_S = float(os.getenv("PP_LOG_RETAIN_DAYS", "0")) * 86400
+
+_STATE = {"salt": secrets.token_hex(8), "shared": None}
 
-_STATE = {"salt": secrets.token_hex(8)}
+def shared_store() -> Optional[SharedStore]:
+    # multi-worker mode: salt, decision cache and metrics shared through one file
+    if SHARED_STATE and _STATE["shared"] is None:
+        _STATE["shared"] = SharedStore(SHARED_STATE, refresh_s=SHARED_REFRESH_S,
+                                       max_decisions=SHARED_MAX_DECISIONS, max_vault=VAULT_MAX)
+    return _STATE["shared"]
 
 def get_salt() -> str:
-    return _STATE["salt"]
+    store = shared_store()
+    return store.salt()[0] if store is not None else _STATE["salt"]
+
+def salt_stale() -> bool:
+    # get_salt() would hit the shared store's file (async callers run it in a thread then)
+    store = shared_store()
+    return store is not None and store.salt_stale()
 
 def rotate_salt() -> str:
+    store = shared_store()
+    if store is not None:
+        return store.rotate_salt()[0]
     _STATE["salt"] = secrets.token_hex(8)
     return _STATE["salt"]
 
+_LOGGER: dict[str, Optional[EventLogger]] = {"logger": None}
+
+def start_logger() -> Optional[EventLogger]:
+    if LOG_MODE != "async":
+        return None
+    if _LOGGER["logger"] is None:
+        _LOGGER["logger"] = EventLogger(
+            LOG_PATH, max_queue=LOG_QUEUE_MAX, batch_size=LOG_BATCH,
+            flush_interval=LOG_FLUSH_S, drop_policy=LOG_DROP_POLICY,
+            rotate_bytes=LOG_ROTATE_BYTES, rotate_seconds=LOG_ROTATE_S, compress=LOG_COMPRESS,
+            retain_segments=LOG_RETAIN_SEGMENTS, retain_seconds=LOG_RETAIN_S,
+            shared=bool(SHARED_STATE),
+        ).start()
+    return _LOGGER["logger"]
+
+def stop_logger() -> None:
+    lg = _LOGGER["logger"]
+    _LOGGER["logger"] = None
+    if lg is not None:
+        lg.close()
+
+def logger_stats() -> dict:
+    lg = _LOGGER["logger"]
+    return lg.stats() if lg is not None else {"path": LOG_PATH, "mode": LOG_MODE}
+
 def log_event(obj: dict) -> None:
+    if LOG_MODE == "off":
+        return
+    if LOG_MODE == "async":
+        (_LOGGER["logger"] or start_logger()).log(obj)
+        return
+    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
+    with open(LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(codec.dumps_line(obj) + "\n")
+
+def log_events(objs: list[dict]) -> None:
+    # several events in one go (one queue item / one write)
+    if LOG_MODE == "off" or not objs:
+        return
+    if LOG_MODE == "async":
+        (_LOGGER["logger"] or start_logger()).log_many(objs)
+        return
     os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
     with open(LOG_PATH, "a", encoding="utf-8") as f:
-        f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+        f.write("".join(codec.dumps_line(o) + "\n" for o in objs))
 
 def now() -> float:
     return time.time()
@@ -0,0 +1,145 @@
+"""
+Where decide() runs: inline on the event loop, in a thread pool, or in a pool
+of warm worker processes.
+
+- "inline"  : old behaviour, no hand-off cost, blocks the loop while scanning
+- "thread"  : frees the loop for I/O, but regex/JSON work still shares the GIL
+- "process" : real parallelism; workers import and compile everything once
+
+Bodies smaller than `min_bytes` always run inline: for heartbeat-sized
+requests the hand-off costs more than the scan.
+"""
+
+from __future__ import annotations
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+from .detectors import detect_all, set_hardened
+from .policy import Decision, decide
+from .conversations import configure_conversations
+from .transformers import PSEUDONYMS, configure_pseudonyms, configure_redact_memo, load_detector_config
+
+BACKENDS = ("inline", "thread", "process")
+
+_STATE: dict = {"backend": "inline", "executor": None, "min_bytes": 0}
+
+
+def _warm_worker(detectors_path: str, hardened: bool, memo_bytes: int, conv_config: tuple,
+                 pseudonym_config: tuple) -> None:
+    # Process initializer: same detector setup as the parent, then one scan so
+    # the first real request doesn't pay for lazy regex/JIT-ish warmups.
+    if detectors_path:
+        load_detector_config(detectors_path)
+    if hardened:
+        set_hardened(True)
+    configure_redact_memo(memo_bytes)
+    configure_conversations(*conv_config)
+    # the salt comes with each call; new vault entries go back to the parent
+    mode, vault_max = pseudonym_config
+    configure_pseudonyms(mode, "", max_entries=vault_max, collect=True)
+    detect_all("warm up: a@b.co 0512341234 10.0.0.1 Acme Inc")
+
+
+def start_backend(
+    backend: str,
+    workers: int,
+    *,
+    min_bytes: int = 0,
+    detectors_path: str = "",
+    hardened: bool = False,
+    memo_bytes: int = 32 << 20,
+    conv_config: tuple = (64 << 20, 1024, 1800.0),
+    pseudonym_config: tuple = ("mask", 100_000),
+) -> None:
+    backend = (backend or "inline").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown decide backend {backend!r}, expected one of {BACKENDS}")
+    stop_backend()
+
+    executor: Optional[Executor] = None
+    if backend == "thread":
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pp-decide")
+    elif backend == "process":
+        # spawn (not fork): the server may already have threads running
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_warm_worker,
+            initargs=(detectors_path, hardened, memo_bytes, conv_config, pseudonym_config),
+        )
+        # start every worker now instead of on first use
+        for f in [executor.submit(len, "") for _ in range(workers)]:
+            f.result()
+
+    _STATE.update(backend=backend, executor=executor, min_bytes=min_bytes)
+
+
+def stop_backend() -> None:
+    executor = _STATE.get("executor")
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+    _STATE.update(backend="inline", executor=None)
+
+
+def backend_name() -> str:
+    return _STATE["backend"]
+
+
+async def run_decide(
+    mode: str,
+    kind: str,
+    url: str,
+    body: Optional[str | bytes],
+    *,
+    content_type: Optional[str] = None,
+    filename: Optional[str] = None,
+    budget_s: Optional[float] = None,
+    tab_id: Optional[object] = None,
+    stages: Optional[dict] = None,
+    trace: Optional[dict] = None,
+    profile: bool = False,
+) -> Decision:
+    """decide() on the configured backend; same arguments, same result."""
+    executor = _STATE["executor"]
+    size = len(body) if isinstance(body, (str, bytes, bytearray)) else 0
+    kwargs = dict(content_type=content_type, filename=filename, budget_s=budget_s, tab_id=tab_id)
+    if trace is not None:
+        kwargs.update(trace=trace, profile=profile)
+    if executor is None or size < _STATE["min_bytes"]:
+        return decide(mode, kind, url, body, stages=stages, **kwargs)
+    loop = asyncio.get_running_loop()
+    pseudo = PSEUDONYMS.enabled
+    if (stages is None and trace is None and not pseudo) or _STATE["backend"] != "process":
+        return await loop.run_in_executor(executor, partial(decide, mode, kind, url, body, stages=stages, **kwargs))
+    # a worker process can't fill our dicts or vault: it sends timings, trace
+    # and newly minted pseudonyms back (and gets the current salt each call)
+    kwargs.pop("trace", None)
+    decision, worker_stages, worker_trace, minted = await loop.run_in_executor(
+        executor, partial(_decide_with_stages, mode, kind, url, body, want_trace=trace is not None,
+                          salt=PSEUDONYMS.salt if pseudo else None, **kwargs))
+    if stages is not None:
+        stages.update(worker_stages)
+    if trace is not None:
+        trace.update(worker_trace)
+    if minted:
+        PSEUDONYMS.remember(minted, pending=True)
+    return decision
+
+
+def _decide_with_stages(*args, want_trace: bool = False, salt: Optional[str] = None,
+                        **kwargs) -> tuple[Decision, dict, dict, list]:
+    if salt is not None:
+        PSEUDONYMS.set_salt(salt)
+    stages: dict = {}
+    trace: Optional[dict] = {} if want_trace else None
+    decision = decide(*args, stages=stages, trace=trace, **kwargs)
+    minted = PSEUDONYMS.drain()
+    out = decision.get("body")
+    if salt is not None and isinstance(out, str):
+        # memo / conversation hits mint nothing here, but the server's vault may have
+        # dropped their tokens since: send every pair the output carries
+        minted = list(dict(minted + PSEUDONYMS.pairs_in(out)).items())
+    return decision, stages, trace or {}, minted
@@ -0,0 +1,83 @@
+"""
+Chunked redaction (iter_redacted over split_text) is byte-identical to one
+redact_text pass over the whole string, also for matches cut by a chunk
+boundary and around the CHUNKED_MIN_CHARS switch.
+"""
+
+import random
+
+import pytest
+
+from benchmarks.corpus import CORPORA, PII_SAMPLES, pii_dense, prose
+from proxy import transformers
+from proxy.detectors import HARDENED_PATTERNS, detect_all, max_match_len, set_hardened
+from proxy.transformers import (
+    CHUNK_CHARS, CHUNKED_MIN_CHARS, UNBOUNDED_MATCH, iter_redacted, redact_text, split_text,
+)
+
+
+def _whole(text: str, monkeypatch) -> tuple[str, list]:
+    # the plain single-pass path, whatever the size
+    with monkeypatch.context() as m:
+        m.setattr(transformers, "CHUNKED_MIN_CHARS", len(text) + 1)
+        tags: list[str] = []
+        return redact_text(text, tags), tags
+
+
+def _chunked(pieces) -> tuple[str, list]:
+    tags: list[str] = []
+    return "".join(iter_redacted(pieces, tags)), tags
+
+
+def _straddling(n_chunks: int) -> str:
+    # prose with a PII sample across every chunk boundary
+    text = list(prose(n_chunks * CHUNK_CHARS, seed=3)[:n_chunks * CHUNK_CHARS])
+    for k in range(1, n_chunks):
+        sample = PII_SAMPLES[k % len(PII_SAMPLES)]
+        at = k * CHUNK_CHARS - len(sample) // 2
+        text[at - 1:at + len(sample) + 1] = " " + sample + " "
+    return "".join(text)
+
+
+@pytest.fixture(params=[False, True], ids=["default", "hardened"])
+def hardened(request):
+    if request.param and not HARDENED_PATTERNS:
+        pytest.skip("hardened patterns need Python 3.11+")
+    set_hardened(request.param)
+    yield request.param
+    set_hardened(False)
+
+
+def test_matches_across_chunk_boundaries(hardened, monkeypatch):
+    text = _straddling(len(PII_SAMPLES) + 1)
+    ref, ref_tags = _whole(text, monkeypatch)
+    assert ref != text
+    for pieces in (split_text(text), split_text(text, 4096), split_text(text, 70_000)):
+        assert _chunked(pieces) == (ref, ref_tags)
+
+
+@pytest.mark.parametrize("delta", [-1, 0, 1])
+def test_around_chunked_min_chars(hardened, delta, monkeypatch):
+    n = CHUNKED_MIN_CHARS + delta
+    text = pii_dense(n + 1000, seed=5)[:n]
+    ref, ref_tags = _whole(text, monkeypatch)
+    tags: list[str] = []
+    assert redact_text(text, tags) == ref     # chunked only above the threshold
+    assert tags == ref_tags
+    assert _chunked(split_text(text)) == (ref, ref_tags)
+
+
+def test_random_chunking(hardened, monkeypatch):
+    # inputs with a match longer than the overlap are out of scope
+    rng = random.Random(0)
+    window = max_match_len(UNBOUNDED_MATCH)
+    for trial in range(60):
+        text = rng.choice(list(CORPORA.values()))(rng.randint(1_000, 40_000), seed=trial)
+        if any(d["end"] - d["start"] > window for d in detect_all(text)):
+            continue
+        pieces, i = [], 0
+        while i < len(text):
+            n = rng.choice((1, 13, 500, 4096, 70_000))
+            pieces.append(text[i:i + n])
+            i += n
+        assert _chunked(pieces) == _whole(text, monkeypatch), f"trial {trial}"
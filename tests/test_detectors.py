@@ -0,0 +1,60 @@
+"""
+Prechecks only skip detectors that cannot match: detect_all and redact_text
+give the same output with and without them, in default and hardened mode.
+"""
+
+import pytest
+
+from benchmarks.bench_detectors import EDGE_CASES
+from benchmarks.corpus import CORPORA, PII_SAMPLES
+from proxy.detectors import HARDENED_PATTERNS, detect_all, detectors, reset_detector_stats, set_hardened
+from proxy.transformers import redact_text
+
+
+def _texts() -> list[str]:
+    out = list(EDGE_CASES) + list(PII_SAMPLES)
+    for gen in CORPORA.values():
+        for seed in (1, 2):
+            text = gen(20_000, seed=seed)
+            out.append(text)
+            # short pieces too: on a whole corpus every precheck passes
+            out.extend(text[i:i + 120] for i in range(0, len(text), 120))
+    return out
+
+
+TEXTS = _texts()
+
+
+def _scan_all() -> list:
+    results = []
+    for t in TEXTS:
+        tags: list[str] = []
+        results.append((detect_all(t), redact_text(t, tags), tags))
+    return results
+
+
+@pytest.fixture(params=[False, True], ids=["default", "hardened"])
+def hardened(request):
+    if request.param and not HARDENED_PATTERNS:
+        pytest.skip("hardened patterns need Python 3.11+")
+    set_hardened(request.param)
+    yield request.param
+    set_hardened(False)
+
+
+def test_prechecks_do_not_change_output(hardened):
+    reset_detector_stats()
+    with_prechecks = _scan_all()
+    assert sum(d.skipped for d in detectors()) > 0
+
+    saved = {d.name: d.precheck for d in detectors()}
+    try:
+        for d in detectors():
+            d.precheck = None
+        without = _scan_all()
+    finally:
+        for d in detectors():
+            d.precheck = saved[d.name]
+
+    for t, a, b in zip(TEXTS, with_prechecks, without):
+        assert a == b, f"prechecks change the output on {t[:80]!r}"
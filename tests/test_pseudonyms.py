@@ -0,0 +1,75 @@
+"""
+Memo and conversation-index hits must keep reidentify() working after the
+vault has dropped their tokens (a hit mints nothing).
+"""
+
+import pytest
+
+from proxy import codec
+from proxy.conversations import CONVERSATIONS, configure_conversations
+from proxy.transformers import (
+    PSEUDONYMS, REDACT_MEMO, configure_pseudonyms, configure_redact_memo, json_transform, redact_text,
+)
+from proxy.workers import _decide_with_stages
+
+TEXT = "please forward this to alice.smith@example.com today"
+
+
+@pytest.fixture
+def small_vault():
+    configure_pseudonyms("pseudonymise", "test-salt", max_entries=2, collect=True)
+    configure_redact_memo(1 << 20)
+    configure_conversations(1 << 20, 16, 600.0)
+    PSEUDONYMS.clear()
+    yield
+    configure_pseudonyms("mask", "")
+    PSEUDONYMS.clear()
+    configure_redact_memo(32 << 20)
+    CONVERSATIONS.clear()
+
+
+def _evict_vault() -> None:
+    # two fresh values push everything older out of a 2-entry vault
+    for v in ("bob@example.org", "carol@example.net"):
+        redact_text(f"from {v}", [])
+    PSEUDONYMS.drain()
+
+
+def test_memo_hit_after_eviction(small_vault):
+    out = REDACT_MEMO.redact(TEXT, [])
+    assert out != TEXT and PSEUDONYMS.reidentify(out) == TEXT
+    tokens = [t for t, _ in PSEUDONYMS.pairs_in(out)]
+    _evict_vault()
+    assert PSEUDONYMS.lookup(tokens) == {}
+
+    hits = REDACT_MEMO.hits
+    assert REDACT_MEMO.redact(TEXT, []) == out
+    assert REDACT_MEMO.hits == hits + 1
+    assert PSEUDONYMS.reidentify(out) == TEXT
+    # ...and queued for the shared vault / the parent process
+    assert dict(PSEUDONYMS.drain()) == {tokens[0]: "alice.smith@example.com"}
+
+
+def test_conversation_hit_after_eviction(small_vault):
+    body = codec.dumps_line({"conversation_id": "c1", "messages": [
+        {"id": "m1", "content": {"parts": [TEXT]}},
+    ]})
+    out, _ = json_transform(body, redact_text, tab=7)
+    assert out is not None
+    _evict_vault()
+    configure_redact_memo(0)     # only the conversation index can answer now
+
+    hits = CONVERSATIONS.hits
+    again, _ = json_transform(body, redact_text, tab=7)
+    assert again == out
+    assert CONVERSATIONS.hits == hits + 1
+    assert PSEUDONYMS.reidentify(out) == codec.dumps_compact(codec.loads(body))
+
+
+def test_worker_sends_pairs_of_memo_hits(small_vault):
+    first, _, _, minted = _decide_with_stages("warn", "text", "", TEXT, salt="test-salt")
+    assert minted
+    # the second call is a memo hit: nothing new, but the pairs still go back
+    second, _, _, again = _decide_with_stages("warn", "text", "", TEXT, salt="test-salt")
+    assert second["body"] == first["body"]
+    assert dict(again) == dict(minted)